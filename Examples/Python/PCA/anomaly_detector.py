@@ -1,9 +1,16 @@
-import time
+import os
 import csv
+import glob
+import threading
+import asyncio
 
-from tw_integration import inspect_measure, TwMeasuresSubscriber
-from pca_detector import PcaAnomalyDetector
+from tw_integration import TwMeasuresSubscriber
+from sharded_subscriber import ShardedMeasuresSubscriber
+from tw_integration_async import inspect_many
+from detectors import create_detector
+from pca_detector import PcaAnomalyDetector, ModelCheckpointer
 from common_utils import run_until_key_press
+from profiling import timers
 from measure_sampler import MeasureSampler
 
 # These are the measures we want to subscribe to and monitor
@@ -17,9 +24,50 @@ PCA_BUFFER_SIZE = 100  # Number of samples to collect before training PCA
 ANOMALY_THRESHOLD_PERCENTILE = 99  # Percentile for anomaly threshold (e.g., 99 for top 1%)
 N_COMPONENTS = 2  # Number of principal components for PCA
 
+# Detector to use: "pca" or one of the cheaper streaming detectors "ewma", "mahalanobis" and "median_mad"
+# (see detectors.py). Streaming detectors are trained once (with PCA_BUFFER_SIZE samples) and then
+# they keep learning from each sample.
+DETECTOR = "pca"
+
+# The PCA model is saved (in background, at most every CHECKPOINT_INTERVAL_SEC) each time it's trained and it's loaded
+# at startup (if it has been trained for the same measures, with the same ranges): detection starts immediately.
+# Set MODEL_PATH to None to always start from scratch.
+MODEL_PATH = "pca_model.npz"
+CHECKPOINT_INTERVAL_SEC = 60.0
+
+# If there is not a saved model then the PCA detector is trained with the samples in these files (glob patterns),
+# for example archived copies of CSV_FILE_PATH. Files are read in chunks, they can be bigger than the memory.
+# See training_files.py for the supported formats (CSV, Parquet and .npy).
+TRAINING_FILES = []
+# With True a model trained with TRAINING_FILES is kept as it is, instead of being trained again every PCA_BUFFER_SIZE
+# live samples (like any other model). Once saved to MODEL_PATH and loaded again it's retrained as usual.
+KEEP_FILE_TRAINED_MODEL = False
+
 # Output configuration
 CSV_FILE_PATH = "measures.csv" # Path to the CSV log file
 SAMPLE_INTERVAL_SEC = 1.0 # Sample generation interval
+SAMPLE_AGGREGATION = "last" # How updates within an interval are summarized, see measure_sampler.AGGREGATIONS
+
+# Queues between the stages, when full the policy decides what to do (see bounded_queue.py). Pending updates are
+# coalesced (a new update replaces the pending one of the same measure), the oldest pending samples are dropped.
+UPDATE_QUEUE_SIZE = 10000
+UPDATE_QUEUE_POLICY = "coalesce"
+SAMPLE_QUEUE_SIZE = 100
+SAMPLE_QUEUE_POLICY = "drop_oldest"
+
+# With more than one shard the measures are partitioned across SUBSCRIPTION_SHARDS 'tw measures subscribe'
+# processes, each one restarted independently if it fails (see sharded_subscriber.py). Useful with many measures.
+SUBSCRIPTION_SHARDS = 1
+
+# The main loop sleeps until there are updates or samples to process, this is only how often stop_event is checked
+IDLE_WAIT_SEC = 0.2
+
+# Anomalies are also published as events (see anomaly_publisher.py) if we can reach the Discovery service,
+# set TINKWELL_DISCOVERY_SERVICE_ADDRESS (or TW_DISCOVERY_ADDRESS below) to enable it. Connections use TLS,
+# the certificate to trust is read from TINKWELL_CLIENT_CERT_PATH (or TW_CLIENT_CERT_PATH below), like the CLI.
+PUBLISH_ANOMALIES = True
+TW_DISCOVERY_ADDRESS = None
+TW_CLIENT_CERT_PATH = None
 
 class Measure:
     def __init__(self, name):
@@ -39,26 +87,50 @@ class Measure:
 
         return (value - self.min_val) / (self.max_val - self.min_val)
 
+def create_anomaly_publisher():
+    """Returns (factory, publisher) or (None, None) if anomalies are not published."""
+    if not PUBLISH_ANOMALIES:
+        return None, None
+
+    try:
+        from tw_client import TinkwellClientFactory
+        from anomaly_publisher import AnomalyPublisher
+
+        factory = TinkwellClientFactory(TW_DISCOVERY_ADDRESS, root_certificates_path=TW_CLIENT_CERT_PATH)
+        publisher = AnomalyPublisher(factory.events_gateway(), group=",".join(MEASURES_TO_SUBSCRIBE))
+        publisher.start()
+        return factory, publisher
+    except Exception as e:
+        print(f"Anomalies will not be published as events: {e}")
+        return None, None
+
 def main(stop_event):
     measures = {name: Measure(name) for name in MEASURES_TO_SUBSCRIBE}
 
     print("Initializing anomaly detection...")
 
     # We know which measures we want to subscribe to, now we need to know what their min/max ranges are.
+    # We inspect all of them concurrently, startup time does not grow with the number of measures.
+    try:
+        ranges = asyncio.run(inspect_many(MEASURES_TO_SUBSCRIBE))
+    except Exception as e:
+        print(f"Error inspecting measures: {e}")
+        return
+
     for measure_name, measure_obj in measures.items():
-        try:
-            min_val, max_val = inspect_measure(measure_name)
-            if min_val is not None and max_val is not None:
-                measure_obj.set_range(min_val, max_val)
-                print(f"  {measure_name}: Min={min_val}, Max={max_val}")
-            else:
-                print(f"  Could not determine range for {measure_name}. Will use raw values.")
-        except Exception as e:
-            print(f"Error inspecting measure {measure_name}: {e}")
-            return
+        min_val, max_val = ranges[measure_name]
+        if min_val is not None and max_val is not None:
+            measure_obj.set_range(min_val, max_val)
+            print(f"  {measure_name}: Min={min_val}, Max={max_val}")
+        else:
+            print(f"  Could not determine range for {measure_name}. Will use raw values.")
 
-    # Now we can subscribe to the measures
-    tw_process_manager = TwMeasuresSubscriber(MEASURES_TO_SUBSCRIBE)
+    # Now we can subscribe to the measures. Both the subscriber and the sampler set wakeup when they have something for us
+    wakeup = threading.Event()
+    if SUBSCRIPTION_SHARDS > 1:
+        tw_process_manager = ShardedMeasuresSubscriber(MEASURES_TO_SUBSCRIBE, SUBSCRIPTION_SHARDS, UPDATE_QUEUE_SIZE, UPDATE_QUEUE_POLICY, wakeup)
+    else:
+        tw_process_manager = TwMeasuresSubscriber(MEASURES_TO_SUBSCRIBE, UPDATE_QUEUE_SIZE, UPDATE_QUEUE_POLICY, wakeup)
     try:
         tw_process_manager.start_subscription()
     except Exception as e:
@@ -67,11 +139,40 @@ def main(stop_event):
 
     # Setup data sampler and PCA anomaly detector
     pca_buffer = []
-    pca_detector = PcaAnomalyDetector(N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+    pca_detector = create_detector(DETECTOR, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+    measure_ranges = [(measures[name].min_val, measures[name].max_val) for name in MEASURES_TO_SUBSCRIBE]
+
+    # See KEEP_FILE_TRAINED_MODEL, a model loaded from MODEL_PATH only lets detection start immediately
+    keep_model = False
+    checkpointer = None
+    if MODEL_PATH and isinstance(pca_detector, PcaAnomalyDetector):
+        if os.path.exists(MODEL_PATH):
+            try:
+                pca_detector = PcaAnomalyDetector.load(MODEL_PATH, MEASURES_TO_SUBSCRIBE, measure_ranges, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+                print(f"Loaded PCA model from {MODEL_PATH}. Anomaly Threshold (Reconstruction Error): {pca_detector.anomaly_threshold:.4f}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring the saved PCA model, it must be trained again: {e}")
+        checkpointer = ModelCheckpointer(MODEL_PATH, CHECKPOINT_INTERVAL_SEC)
+
+    training_files = [path for pattern in TRAINING_FILES for path in sorted(glob.glob(pattern))]
+    if training_files and isinstance(pca_detector, PcaAnomalyDetector) and not pca_detector.is_trained():
+        print(f"Training PCA model with the samples in {len(training_files)} files...")
+        try:
+            # No normalization: samples in the CSV files are the same values the detector sees live
+            anomaly_threshold = pca_detector.train_from_files(training_files, MEASURES_TO_SUBSCRIBE)
+            print(f"Detector trained. Anomaly Threshold: {anomaly_threshold:.4f}")
+            keep_model = KEEP_FILE_TRAINED_MODEL
+            if checkpointer:
+                checkpointer.submit(pca_detector, MEASURES_TO_SUBSCRIBE, measure_ranges)
+        except Exception as e:
+            print(f"Could not train the PCA model with the samples in {', '.join(training_files)}: {e}")
+            pca_detector = create_detector(DETECTOR, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
     
-    sampler = MeasureSampler(MEASURES_TO_SUBSCRIBE, SAMPLE_INTERVAL_SEC)
+    sampler = MeasureSampler(MEASURES_TO_SUBSCRIBE, SAMPLE_INTERVAL_SEC, SAMPLE_AGGREGATION, SAMPLE_QUEUE_SIZE, SAMPLE_QUEUE_POLICY, wakeup)
     sampler.start() # Start the sampling thread
 
+    client_factory, anomaly_publisher = create_anomaly_publisher()
+
     print("Monitoring for anomalies (press Enter to exit)...")
 
     csv_file = None
@@ -84,75 +185,81 @@ def main(stop_event):
         header = MEASURES_TO_SUBSCRIBE + ['anomaly']
         csv_writer.writerow(header)
         while not stop_event.is_set():
-            # First, process any incoming raw measure updates from tw
-            raw_measure_data = tw_process_manager.get_latest_output(timeout=0.01)
-            if raw_measure_data is not None:
-                name = list(raw_measure_data.keys())[0]
-                value = raw_measure_data[name]
-                sampler.update_measure(name, value)
-            elif not tw_process_manager.is_alive():
+            # Sleep until there is something to do: new updates from tw, a sample from the sampler or
+            # the subscription ended (the timeout is only to check stop_event).
+            wakeup.wait(timeout=IDLE_WAIT_SEC)
+            wakeup.clear()
+
+            # First, process all the pending raw measure updates from tw
+            with timers.timed("ingest"):
+                updates = tw_process_manager.get_pending_outputs()
+                if updates:
+                    sampler.update_measures(updates)
+            if not updates and not tw_process_manager.is_alive():
                 print("Subscription process ended unexpectedly.")
                 break
 
             # We cannot process a single measure at a time, we need to wait for the sampler to collect a full sample
             # This is to ensure we have a complete set of measures before processing (sample = all the measures we care about).
-            sample = sampler.get_next_sample(timeout=0.01)
-            if sample is None:
-                time.sleep(0.01)
-                continue
-
-            # At this point, 'sample' contains a complete, throttled set of measure values
-            current_measure_values = {MEASURES_TO_SUBSCRIBE[i]: sample[i] for i in range(len(MEASURES_TO_SUBSCRIBE))}
-
-            pca_buffer.append(sample)
-
-            is_anomaly = 0
-
-            # Perform PCA anomaly detection if the detector is trained
-            if pca_detector.is_trained():
-                try:
-                    is_anomaly, current_reconstruction_error, reconstructed_sample = pca_detector.detect(sample)
-
-                    if is_anomaly:
-                        print("ANOMALY DETECTED")
-                        print(f"  Reconstruction Error: {current_reconstruction_error:.4f} (Threshold: {pca_detector.anomaly_threshold:.4f})")
-                        print("  Current Raw Values:")
-                        for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
-                            print(f"    {name}: {current_measure_values[name]:f}")
-                        print("  Current Normalized Values:")
-                        for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
-                            print(f"    {name}: {sample[i]:.4n}")
-                        print("  Reconstructed Normalized Values:")
-                        for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
-                            print(f"    {name}: {reconstructed_sample[i]:.4f}")
-                        print("  Difference (Normalized):")
-                        for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
-                            print(f"    {name}: {(sample[i] - reconstructed_sample[i]):.4f}")
-                        print("\n")
-                except Exception as e:
-                    print(f"Error during anomaly detection: {e}")
-                    is_anomaly = 0
-
-            # Log to CSV
-            if csv_writer:
-                row = [f'{current_measure_values[name]:n}' for name in MEASURES_TO_SUBSCRIBE] + [str(int(is_anomaly))]
-                csv_writer.writerow(row)
-                csv_file.flush()
-
-            # Train PCA if buffer is full
-            if len(pca_buffer) >= PCA_BUFFER_SIZE:
-                print(f"Training PCA with {len(pca_buffer)} samples")
-                try:
-                    anomaly_threshold = pca_detector.train(pca_buffer)
-                    print(f"PCA trained. Anomaly Threshold (Reconstruction Error): {anomaly_threshold:.4f}")
-                    pca_buffer.clear() # Clear buffer after training, we keep up!
-                except Exception as e:
-                    print(f"Resetting detector because of an error during PCA training: {e}")
-                    pca_detector = PcaAnomalyDetector(N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
-                    pca_buffer.clear()
-
-            if stop_event.is_set():
-                break
+            for sample in sampler.get_ready_samples():
+                # At this point, 'sample' contains a complete, throttled set of measure values
+                current_measure_values = {MEASURES_TO_SUBSCRIBE[i]: sample[i] for i in range(len(MEASURES_TO_SUBSCRIBE))}
+
+                if not pca_detector.is_trained() or not (pca_detector.learns_online or keep_model):
+                    pca_buffer.append(sample)
+
+                is_anomaly = 0
+
+                # Perform PCA anomaly detection if the detector is trained
+                if pca_detector.is_trained():
+                    try:
+                        with timers.timed("detect"):
+                            is_anomaly, current_reconstruction_error, reconstructed_sample = pca_detector.detect(sample)
+
+                        if is_anomaly:
+                            if anomaly_publisher:
+                                anomaly_publisher.report(current_measure_values, current_reconstruction_error, pca_detector.anomaly_threshold)
+
+                            print("ANOMALY DETECTED")
+                            print(f"  Reconstruction Error: {current_reconstruction_error:.4f} (Threshold: {pca_detector.anomaly_threshold:.4f})")
+                            print("  Current Raw Values:")
+                            for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
+                                print(f"    {name}: {current_measure_values[name]:f}")
+                            print("  Current Normalized Values:")
+                            for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
+                                print(f"    {name}: {sample[i]:.4n}")
+                            print("  Reconstructed Normalized Values:")
+                            for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
+                                print(f"    {name}: {reconstructed_sample[i]:.4f}")
+                            print("  Difference (Normalized):")
+                            for i, name in enumerate(MEASURES_TO_SUBSCRIBE):
+                                print(f"    {name}: {(sample[i] - reconstructed_sample[i]):.4f}")
+                            print("\n")
+                    except Exception as e:
+                        print(f"Error during anomaly detection: {e}")
+                        is_anomaly = 0
+
+                # Log to CSV
+                if csv_writer:
+                    with timers.timed("csv"):
+                        row = [f'{current_measure_values[name]:n}' for name in MEASURES_TO_SUBSCRIBE] + [str(int(is_anomaly))]
+                        csv_writer.writerow(row)
+                        csv_file.flush()
+
+                # Train PCA if buffer is full
+                if len(pca_buffer) >= PCA_BUFFER_SIZE:
+                    print(f"Training {DETECTOR} detector with {len(pca_buffer)} samples")
+                    try:
+                        with timers.timed("train"):
+                            anomaly_threshold = pca_detector.train(pca_buffer)
+                        print(f"Detector trained. Anomaly Threshold: {anomaly_threshold:.4f}")
+                        pca_buffer.clear() # Clear buffer after training, we keep up!
+                        if checkpointer:
+                            checkpointer.submit(pca_detector, MEASURES_TO_SUBSCRIBE, measure_ranges)
+                    except Exception as e:
+                        print(f"Resetting detector because of an error during training: {e}")
+                        pca_detector = create_detector(DETECTOR, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+                        pca_buffer.clear()
 
     except KeyboardInterrupt:
         pass  # Allow graceful exit on Ctrl+C
@@ -163,5 +270,20 @@ def main(stop_event):
         sampler.stop()
         tw_process_manager.stop_subscription()
 
+        if checkpointer:
+            checkpointer.stop()
+
+        print(f"Updates queue: {tw_process_manager.queue_stats()}")
+        if isinstance(tw_process_manager, ShardedMeasuresSubscriber):
+            for shard_health in tw_process_manager.health():
+                print(f"  Shard {shard_health}")
+        print(f"Samples queue: {sampler.queue_stats()}")
+
+        if anomaly_publisher:
+            anomaly_publisher.stop()
+            print(f"Published {anomaly_publisher.published} events for {anomaly_publisher.reported} anomalies ({anomaly_publisher.dropped} dropped, {anomaly_publisher.failed} failed)")
+        if client_factory:
+            client_factory.close()
+
 if __name__ == "__main__":
     run_until_key_press(main)
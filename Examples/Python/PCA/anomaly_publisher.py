@@ -0,0 +1,157 @@
+import json
+import time
+import threading
+from collections import deque
+
+from google.protobuf import timestamp_pb2
+
+from tw_grpc import load_service
+
+# Publishes the anomalies as events (through EventsGateway.Publish()) in a background thread,
+# reporting an anomaly never blocks the detection loop.
+# Anomalies of the same group (usually the set of measures analyzed together) reported within
+# COALESCE_WINDOW_SEC are coalesced into a single event and each group publishes at most one event
+# every MIN_PUBLISH_INTERVAL_SEC: during an anomaly storm the following anomalies are accumulated and
+# published together with the next event. The payload (JSON) contains the number of anomalies, when
+# they occurred and (up to MAX_ANOMALIES_PER_EVENT) their details.
+# Example:
+#   publisher = AnomalyPublisher(factory.events_gateway(), group="voltage,current,power")
+#   publisher.start()
+#   publisher.report({"voltage": 231.0, ...}, error=0.8, threshold=0.5)
+#   publisher.stop()
+EVENT_TOPIC = "AnomalyDetected"
+EVENT_OBJECT = "pca_detector"
+COALESCE_WINDOW_SEC = 1.0
+MIN_PUBLISH_INTERVAL_SEC = 5.0
+MAX_ANOMALIES_PER_EVENT = 20
+MAX_PENDING_ANOMALIES = 10000
+PUBLISH_TIMEOUT_SEC = 5.0
+
+events_gateway_pb2, _ = load_service("events_gateway")
+
+class _PendingGroup:
+    def __init__(self):
+        self.anomalies = deque(maxlen=MAX_ANOMALIES_PER_EVENT) # Only the most recent ones are included in the event
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.max_error = None
+        self.first_reported = None # Monotonic time, to compute when the window closes
+
+class AnomalyPublisher:
+    def __init__(self, events_gateway, group, window_sec=COALESCE_WINDOW_SEC, min_interval_sec=MIN_PUBLISH_INTERVAL_SEC):
+        self._events_gateway = events_gateway
+        self._group = group
+        self._window_sec = window_sec
+        self._min_interval_sec = min_interval_sec
+        self._condition = threading.Condition()
+        self._pending = {} # group => _PendingGroup
+        self._pending_count = 0
+        self._last_published = {} # group => monotonic time of the last publish
+        self._thread = None
+        self._stopping = False
+        self.reported = 0
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._publishing_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self, flush=True, timeout=PUBLISH_TIMEOUT_SEC):
+        """Stops the publisher, pending anomalies are published immediately (if flush is True) or discarded."""
+        if self._thread is None:
+            return
+
+        with self._condition:
+            if not flush:
+                self.dropped += self._pending_count
+                self._pending.clear()
+                self._pending_count = 0
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def report(self, measures, error, threshold, group=None):
+        """Reports an anomaly (measures is a dictionary name => value), it returns immediately."""
+        now = time.time()
+        with self._condition:
+            self.reported += 1
+            if self._pending_count >= MAX_PENDING_ANOMALIES:
+                self.dropped += 1
+                return
+
+            pending = self._pending.setdefault(group or self._group, _PendingGroup())
+            if pending.count == 0:
+                pending.first_time = now
+                pending.first_reported = time.monotonic()
+            pending.count += 1
+            pending.last_time = now
+            pending.max_error = error if pending.max_error is None else max(pending.max_error, error)
+            pending.anomalies.append({"time": now, "error": error, "threshold": threshold, "measures": measures})
+            self._pending_count += 1
+            self._condition.notify()
+
+    def _due_time(self, group, pending):
+        last_published = self._last_published.get(group)
+        due = pending.first_reported + self._window_sec
+        if last_published is not None:
+            due = max(due, last_published + self._min_interval_sec)
+        return due
+
+    def _publishing_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    if self._stopping:
+                        ready = list(self._pending.items())
+                        break
+
+                    ready = [(group, pending) for group, pending in self._pending.items() if self._due_time(group, pending) <= now]
+                    if ready:
+                        break
+
+                    next_due = min((self._due_time(group, pending) for group, pending in self._pending.items()), default=None)
+                    self._condition.wait(None if next_due is None else next_due - now)
+
+                for group, pending in ready:
+                    del self._pending[group]
+                    self._pending_count -= pending.count
+                    self._last_published[group] = now
+                stopping = self._stopping
+
+            for group, pending in ready:
+                self._publish(group, pending)
+
+            if stopping:
+                return
+
+    def _publish(self, group, pending):
+        payload = {
+            "count": pending.count,
+            "first": pending.first_time,
+            "last": pending.last_time,
+            "max_error": pending.max_error,
+            "anomalies": list(pending.anomalies),
+        }
+        occurred_at = timestamp_pb2.Timestamp()
+        occurred_at.FromNanoseconds(int(pending.first_time * 1e9))
+        request = events_gateway_pb2.PublishEventsRequest(
+            topic=EVENT_TOPIC,
+            subject=group,
+            verb=events_gateway_pb2.DETECTED,
+            object=EVENT_OBJECT,
+            payload=json.dumps(payload),
+            occurred_at=occurred_at)
+
+        try:
+            self._events_gateway.Publish(request, timeout=PUBLISH_TIMEOUT_SEC)
+            self.published += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Could not publish {pending.count} anomalies for {group}: {e}")
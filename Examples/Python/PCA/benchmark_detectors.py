@@ -0,0 +1,96 @@
+import time
+import argparse
+
+import numpy as np
+
+from detectors import DETECTORS, create_detector
+
+# Compares accuracy and cost (µs per sample) of the anomaly detectors. Data is synthetic (voltage, current and
+# power like feed_synthetic_data.py, with outliers at known positions) or replayed from a CSV file with the
+# measures and a column with the reference labels (--label-column). The "anomaly" column of the files saved by
+# anomaly_detector.py is NOT ground truth, it's what the running detector decided: with it, precision and recall
+# only measure the agreement with that detector. Label the samples independently for a real comparison.
+# Example:
+#   python benchmark_detectors.py --samples 20000
+#   python benchmark_detectors.py --csv labeled_measures.csv --label-column label
+DETECTOR_ANOMALY_COLUMN = "anomaly" # Written by anomaly_detector.py, never used as a measure
+TRAINING_SAMPLES = 100
+ANOMALY_THRESHOLD_PERCENTILE = 99
+N_COMPONENTS = 2
+OUTLIER_PROBABILITY = 0.01
+NORMAL_VARIATION = 0.10
+OUTLIER_VARIATION = (0.20, 0.40) # Outliers are always outside the normal range
+
+def generate_synthetic_data(sample_count, seed):
+    """Returns (samples, labels), measures are normalized (0...1) voltage, current and power."""
+    rng = np.random.default_rng(seed)
+    labels = rng.random(sample_count) < OUTLIER_PROBABILITY
+    labels[:TRAINING_SAMPLES] = False
+    variations = np.where(labels, rng.choice([-1, 1], sample_count) * rng.uniform(*OUTLIER_VARIATION, sample_count),
+                          rng.uniform(-NORMAL_VARIATION, NORMAL_VARIATION, sample_count))
+    noise = rng.normal(0, 0.005, (sample_count, 3))
+    voltage = 0.5 * (1 + variations)
+    current = 0.5 * (1 - variations)
+    power = voltage * current * 2
+    return np.column_stack([voltage, current, power]) + noise, labels
+
+def load_csv(path, label_column):
+    import pandas as pd
+    data = pd.read_csv(path)
+    if label_column not in data.columns:
+        raise ValueError(f"{path} does not contain the label column '{label_column}'.")
+    labels = data.pop(label_column).to_numpy(dtype=bool)
+    data = data.drop(columns=[DETECTOR_ANOMALY_COLUMN], errors="ignore")
+    return data.to_numpy(dtype=np.float64), labels
+
+def evaluate(kind, samples, labels):
+    detector = create_detector(kind, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+    detector.train(list(samples[:TRAINING_SAMPLES]))
+    test_samples, test_labels = samples[TRAINING_SAMPLES:], labels[TRAINING_SAMPLES:]
+
+    start = time.perf_counter()
+    predictions = np.array([detector.detect(sample)[0] for sample in test_samples], dtype=bool)
+    per_sample_us = (time.perf_counter() - start) / len(test_samples) * 1e6
+
+    batch_detector = create_detector(kind, N_COMPONENTS, ANOMALY_THRESHOLD_PERCENTILE)
+    batch_detector.train(list(samples[:TRAINING_SAMPLES]))
+    start = time.perf_counter()
+    batch_detector.detect_many(test_samples)
+    batch_us = (time.perf_counter() - start) / len(test_samples) * 1e6
+
+    true_positives = np.sum(predictions & test_labels)
+    precision = true_positives / max(np.sum(predictions), 1)
+    recall = true_positives / max(np.sum(test_labels), 1)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "detect_us": per_sample_us, "detect_many_us": batch_us}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares accuracy and cost of the anomaly detectors.")
+    parser.add_argument("--csv", help="Replay the samples in a CSV file (like the ones saved by anomaly_detector.py) instead of using synthetic data.")
+    parser.add_argument("--label-column", default=DETECTOR_ANOMALY_COLUMN, help="Column of the CSV file with the reference labels (1 for anomalies).")
+    parser.add_argument("--samples", type=int, default=10000, help="Number of synthetic samples.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--detectors", nargs="+", default=list(DETECTORS.keys()), choices=list(DETECTORS.keys()))
+    args = parser.parse_args()
+
+    if args.csv:
+        samples, labels = load_csv(args.csv, args.label_column)
+        if args.label_column == DETECTOR_ANOMALY_COLUMN:
+            print(f"Warning: the '{DETECTOR_ANOMALY_COLUMN}' column contains the decisions of the detector that saved the file, "
+                  "not ground truth: results measure the agreement with it (use --label-column).\n")
+    else:
+        samples, labels = generate_synthetic_data(args.samples, args.seed)
+
+    if len(samples) <= TRAINING_SAMPLES:
+        print(f"At least {TRAINING_SAMPLES + 1} samples are required.")
+        return
+
+    print(f"{len(samples)} samples ({np.sum(labels)} anomalies), the first {TRAINING_SAMPLES} are used for training\n")
+    print(f"{'Detector':<12} {'Precision':>9} {'Recall':>9} {'F1':>9} {'detect() µs':>12} {'detect_many() µs':>17}")
+    for kind in args.detectors:
+        result = evaluate(kind, samples, labels)
+        print(f"{kind:<12} {result['precision']:>9.3f} {result['recall']:>9.3f} {result['f1']:>9.3f} "
+              f"{result['detect_us']:>12.1f} {result['detect_many_us']:>17.1f}")
+
+if __name__ == "__main__":
+    main()
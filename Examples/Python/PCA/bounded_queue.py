@@ -0,0 +1,161 @@
+import threading
+import time
+import queue
+from collections import deque
+
+# A bounded queue (same get()/put() as queue.Queue) with an explicit policy for when it's full:
+#   "block"        put() waits until there is space (backpressure on the producer).
+#   "drop_oldest"  The oldest item is discarded to make room for the new one.
+#   "coalesce"     When it's full, items with the same key (see key_function) are merged: the latest pending
+#                  item with that key is replaced with the new one (keeping its position). If there is none
+#                  then the oldest item is discarded. Below maxsize nothing is merged (or lost).
+# Counters (dropped and coalesced items) and the high-water mark are available with stats(), under
+# overload the pipeline degrades predictably instead of using more and more memory.
+# A consumer waiting for more than one source can pass the same notifier (a threading.Event) to all its
+# queues: it's set for each item added, wait on it and then drain all the queues with get_all().
+POLICIES = ("block", "drop_oldest", "coalesce")
+
+class BoundedQueue:
+    def __init__(self, maxsize, policy="block", key_function=None, notifier=None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than zero.")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', valid values are: {', '.join(POLICIES)}.")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        # Without a key function all the items have the same key (when full the newest pending item is replaced)
+        self._key_function = key_function or (lambda item: None)
+        # With "coalesce" items are stored as [key, item] with the latest pending entry for each key in _latest
+        self._items = deque()
+        self._latest = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._notifier = notifier
+        self.put_count = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water_mark = 0
+
+    def qsize(self):
+        with self._condition:
+            return len(self._items)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Wakes up all the producers waiting in put(), after this put() always returns False."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def put(self, item, timeout=None):
+        """Adds an item, returns False if it has not been added (queue closed or timeout with the "block" policy)."""
+        return self.put_many((item,), timeout) == 1
+
+    def put_many(self, items, timeout=None):
+        """
+        Adds all the items (acquiring the lock only once), returns how many have been added: less than len(items)
+        only if the queue has been closed or (with the "block" policy) it's still full after timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        added = 0
+        with self._condition:
+            for item in items:
+                if not self._put_locked(item, deadline):
+                    break
+                added += 1
+
+            if added:
+                self.put_count += added
+                self.high_water_mark = max(self.high_water_mark, len(self._items))
+                self._condition.notify_all()
+                if self._notifier is not None:
+                    self._notifier.set()
+            return added
+
+    def _put_locked(self, item, deadline):
+        if self._closed:
+            return False
+
+        if self.policy == "coalesce":
+            key = self._key_function(item)
+            if len(self._items) >= self.maxsize:
+                entry = self._latest.get(key)
+                if entry is not None:
+                    entry[1] = item
+                    self.coalesced += 1
+                    return True
+                self._forget(self._items.popleft())
+                self.dropped += 1
+            entry = [key, item]
+            self._items.append(entry)
+            self._latest[key] = entry
+        elif self.policy == "drop_oldest":
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+        else:
+            if len(self._items) >= self.maxsize:
+                # Let the consumer in while we wait (and see what we added so far)
+                self.high_water_mark = self.maxsize
+                self._condition.notify_all()
+                if self._notifier is not None:
+                    self._notifier.set()
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if not self._condition.wait_for(lambda: len(self._items) < self.maxsize or self._closed, timeout):
+                    return False
+                if self._closed:
+                    return False
+            self._items.append(item)
+        return True
+
+    def get(self, block=True, timeout=None):
+        """Removes and returns the oldest item, raises queue.Empty if there are no items (within the timeout)."""
+        with self._condition:
+            if block and not self._condition.wait_for(lambda: len(self._items) > 0, timeout):
+                raise queue.Empty
+            if not self._items:
+                raise queue.Empty
+
+            item = self._items.popleft()
+            if self.policy == "coalesce":
+                item = self._forget(item)
+            self._condition.notify_all()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_all(self):
+        """Removes and returns all the items (oldest first), without waiting."""
+        with self._condition:
+            items = [entry[1] for entry in self._items] if self.policy == "coalesce" else list(self._items)
+            self._items.clear()
+            self._latest.clear()
+            self._condition.notify_all()
+            return items
+
+    def _forget(self, entry):
+        # Returns the item of a removed entry, the key has no pending entries unless a newer one is there
+        if self._latest.get(entry[0]) is entry:
+            del self._latest[entry[0]]
+        return entry[1]
+
+    def stats(self):
+        with self._condition:
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "put": self.put_count,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "high_water_mark": self.high_water_mark,
+            }
@@ -1,7 +1,30 @@
+import os
+import sys
 import threading
 import time
+import argparse
+
+import profiling
+
+def parse_profile_arguments(argv=None):
+    """Returns (mode, output_path) from --profile and --profile-output, other arguments are ignored."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", choices=profiling.PROFILE_MODES)
+    parser.add_argument("--profile-output")
+    args, _ = parser.parse_known_args(argv)
+    if args.profile and not args.profile_output:
+        script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "profile"
+        args.profile_output = f"{script_name}.{'prof' if args.profile == 'cprofile' else 'collapsed'}"
+    return args.profile, args.profile_output
+
+def run_until_key_press(main_function, profile=None, profile_output=None):
+    """
+    Runs main_function(stop_event) until Enter is pressed. When profile (one of profiling.PROFILE_MODES) is not
+    specified it's read from the command line: --profile cprofile|sample [--profile-output PATH].
+    """
+    if profile is None:
+        profile, profile_output = parse_profile_arguments()
 
-def run_until_key_press(main_function):
     stop_event = threading.Event()
 
     def wait_for_input():
@@ -16,12 +39,20 @@ def run_until_key_press(main_function):
     input_thread.daemon = True
     input_thread.start()
 
+    if profiling.install_dump_signal():
+        print(f"Send {profiling.DUMP_SIGNAL.name} to process {os.getpid()} to print the timing counters.")
+
     try:
-        main_function(stop_event)
+        if profile:
+            profiling.run_profiled(lambda: main_function(stop_event), profile, profile_output)
+        else:
+            main_function(stop_event)
     except KeyboardInterrupt:
         pass # Handle Ctrl+C gracefully
     except Exception as e:
         print(f"An unexpected error occurred in main function: {e}")
     finally:
         stop_event.set()
+        if profile:
+            profiling.timers.dump()
         time.sleep(0.1)
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Reduces a series to about as many points as the pixels we have to draw it, plotting millions of points is slow
+# and most of them end up in the same pixel anyway:
+#   "minmax"  For each pixel (a bucket of consecutive samples) keeps the minimum and the maximum, spikes are never lost.
+#             It's the fastest (O(n), fully vectorized) and it's visually identical to the full series.
+#   "lttb"    Largest-Triangle-Three-Buckets (Steinarsson, 2013): one point for each bucket, the one that forms
+#             the largest triangle with the previous selected point and the average of the next bucket.
+#             Smoother, it keeps the shape of the series (and its spikes, usually) with half the points.
+# x must be sorted (ascending), the first and the last points are always kept.
+METHODS = ("minmax", "lttb")
+
+def visible_slice(x, x_min, x_max):
+    """Returns (start, end) of the points within [x_min, x_max], plus one on each side (lines reach the borders)."""
+    start = max(int(np.searchsorted(x, x_min, side="left")) - 1, 0)
+    end = min(int(np.searchsorted(x, x_max, side="right")) + 1, len(x))
+    return start, end
+
+def min_max_indexes(y, bucket_count):
+    """Indexes (sorted) of the minimum and the maximum of each one of the bucket_count buckets."""
+    n = len(y)
+    if n <= 2 * bucket_count or bucket_count < 1:
+        return np.arange(n)
+
+    starts = (np.arange(bucket_count) * n) // bucket_count
+    bucket_of = np.repeat(np.arange(bucket_count), np.diff(np.append(starts, n)))
+    # fmin/fmax ignore NaNs (missing values), a bucket has NaN extremes (and no points) only if they're all NaN
+    minimums = np.fmin.reduceat(y, starts)
+    maximums = np.fmax.reduceat(y, starts)
+
+    # The first sample of each bucket with its minimum (maximum) value
+    indexes = [np.array([0, n - 1])]
+    for extremes in (minimums, maximums):
+        candidates = np.flatnonzero(y == extremes[bucket_of])
+        _, first = np.unique(bucket_of[candidates], return_index=True)
+        indexes.append(candidates[first])
+    return np.unique(np.concatenate(indexes))
+
+def lttb_indexes(x, y, threshold):
+    """Indexes (sorted) of the threshold points selected with LTTB."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if end >= next_end:
+            average_x, average_y = x[n - 1], y[n - 1]
+        else:
+            average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        # Twice the area of the triangles (a, each point in the bucket, average of the next bucket)
+        areas = np.abs((x[a] - average_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def per_pixel(positions, x_min, x_max, pixel_count):
+    """Keeps only one of the positions (sorted) for each pixel, e.g. to draw anomaly markers."""
+    if len(positions) <= pixel_count or x_max <= x_min:
+        return positions
+    pixels = ((np.asarray(positions) - x_min) * (pixel_count / (x_max - x_min))).astype(np.int64)
+    _, first = np.unique(pixels, return_index=True)
+    return np.asarray(positions)[first]
+
+def decimate(x, y, pixel_count, method="minmax", keep_indexes=None):
+    """
+    Returns (x, y) with about pixel_count points (twice as many with "minmax"). Points in keep_indexes
+    (e.g. anomalies) are always kept, at most one for each pixel.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown decimation method '{method}', valid values are: {', '.join(METHODS)}.")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if method == "minmax":
+        indexes = min_max_indexes(y, pixel_count)
+    else:
+        indexes = lttb_indexes(x, y, pixel_count)
+
+    if keep_indexes is not None and len(keep_indexes) and len(indexes) < len(x):
+        keep_indexes = per_pixel(np.asarray(keep_indexes), 0, len(x), pixel_count)
+        indexes = np.union1d(indexes, keep_indexes)
+    return x[indexes], y[indexes]
@@ -0,0 +1,205 @@
+import numpy as np
+
+from pca_detector import PcaAnomalyDetector
+
+# Anomaly detectors. All of them have the same interface of PcaAnomalyDetector:
+#   train(samples) -> threshold              Initial fit with a buffer of (normalized) samples
+#   detect(sample) -> (is_anomaly, score, expected sample)
+#   detect_many(samples) -> (is_anomaly[], scores[], expected samples[])
+#   is_trained() -> bool
+#   anomaly_threshold                        The score above which a sample is an anomaly
+#   learns_online                            True if detect() also updates the model
+# The streaming detectors here cost O(1) per sample (they never need to be trained again, they learn from each
+# sample) and they're much cheaper than PCA when you have many small groups of measures.
+# Like PCA the threshold is the specified percentile of the scores of the training samples.
+# Anomalies update the model too, with a reduced weight (ANOMALY_UPDATE_WEIGHT): a single outlier barely moves
+# it but after a persistent change (e.g. a new operating point) the model follows instead of flagging everything.
+
+# Added to variances (and to the diagonal of the covariance matrix) to avoid divisions by zero with constant measures
+EPSILON = 1e-9
+
+# Weight of an anomaly when updating the model (a normal sample has weight 1)
+ANOMALY_UPDATE_WEIGHT = 0.1
+
+class EwmaZScoreDetector:
+    """
+    Exponentially weighted mean and variance for each measure, the score is the largest z-score.
+    It adapts to slow drifts (the memory is about 1/alpha samples) and it ignores correlations between measures.
+    """
+    learns_online = True
+
+    def __init__(self, anomaly_threshold_percentile, alpha=0.05, anomaly_weight=ANOMALY_UPDATE_WEIGHT):
+        self.anomaly_threshold_percentile = anomaly_threshold_percentile
+        self.alpha = alpha
+        self.anomaly_weight = anomaly_weight
+        self.mean = None
+        self.variance = None
+        self.anomaly_threshold = None
+
+    def train(self, data_buffer):
+        if not data_buffer:
+            raise ValueError("Data buffer cannot be empty for training.")
+
+        data = np.asarray(data_buffer, dtype=np.float64)
+        self.mean = data.mean(axis=0)
+        self.variance = data.var(axis=0) + EPSILON
+        scores = np.max(np.abs(data - self.mean) / np.sqrt(self.variance), axis=1)
+        self.anomaly_threshold = np.percentile(scores, self.anomaly_threshold_percentile)
+        return self.anomaly_threshold
+
+    def detect(self, sample):
+        if not self.is_trained():
+            raise RuntimeError("Detector not trained. Call train() first.")
+
+        x = np.asarray(sample, dtype=np.float64)
+        expected = self.mean
+        difference = x - expected
+        score = np.max(np.abs(difference) / np.sqrt(self.variance))
+        is_anomaly = score > self.anomaly_threshold
+        alpha = self.alpha * (self.anomaly_weight if is_anomaly else 1.0)
+        self.mean = expected + alpha * difference
+        self.variance = (1 - alpha) * (self.variance + alpha * difference * difference)
+        return is_anomaly, score, expected
+
+    def detect_many(self, samples):
+        return _detect_each(self, samples)
+
+    def is_trained(self):
+        return self.mean is not None and self.anomaly_threshold is not None
+
+class MahalanobisDetector:
+    """
+    Mean and covariance (weighted Welford's algorithm) of all the samples, the score is the Mahalanobis distance.
+    It takes into account the correlations between measures (like PCA). The inverse of the covariance
+    matrix is updated every INVERSE_REFRESH_INTERVAL samples, amortized cost is O(1) per sample.
+    """
+    learns_online = True
+    INVERSE_REFRESH_INTERVAL = 32
+
+    def __init__(self, anomaly_threshold_percentile, anomaly_weight=ANOMALY_UPDATE_WEIGHT):
+        self.anomaly_threshold_percentile = anomaly_threshold_percentile
+        self.anomaly_weight = anomaly_weight
+        self.count = 0 # Sum of the weights of the samples
+        self.mean = None
+        self._m2 = None
+        self._inverse_covariance = None
+        self._updates_since_refresh = 0
+        self.anomaly_threshold = None
+
+    def _refresh_inverse(self):
+        covariance = self._m2 / max(self.count - 1, 1) + EPSILON * np.eye(len(self.mean))
+        self._inverse_covariance = np.linalg.pinv(covariance)
+        self._updates_since_refresh = 0
+
+    def _scores(self, data):
+        differences = data - self.mean
+        return np.sqrt(np.maximum(np.einsum("ij,jk,ik->i", differences, self._inverse_covariance, differences), 0.0))
+
+    def train(self, data_buffer):
+        if not data_buffer:
+            raise ValueError("Data buffer cannot be empty for training.")
+
+        data = np.asarray(data_buffer, dtype=np.float64)
+        self.count = len(data)
+        self.mean = data.mean(axis=0)
+        centered = data - self.mean
+        self._m2 = centered.T @ centered
+        self._refresh_inverse()
+        self.anomaly_threshold = np.percentile(self._scores(data), self.anomaly_threshold_percentile)
+        return self.anomaly_threshold
+
+    def detect(self, sample):
+        if not self.is_trained():
+            raise RuntimeError("Detector not trained. Call train() first.")
+
+        x = np.asarray(sample, dtype=np.float64)
+        expected = self.mean
+        difference = x - expected
+        score = np.sqrt(max(difference @ self._inverse_covariance @ difference, 0.0))
+        is_anomaly = score > self.anomaly_threshold
+        weight = self.anomaly_weight if is_anomaly else 1.0
+        self.count += weight
+        self.mean = expected + difference * (weight / self.count)
+        self._m2 = self._m2 + weight * np.outer(difference, x - self.mean)
+        self._updates_since_refresh += 1
+        if self._updates_since_refresh >= self.INVERSE_REFRESH_INTERVAL:
+            self._refresh_inverse()
+        return is_anomaly, score, expected
+
+    def detect_many(self, samples):
+        return _detect_each(self, samples)
+
+    def is_trained(self):
+        return self.mean is not None and self.anomaly_threshold is not None
+
+class MedianMadDetector:
+    """
+    Robust z-score for each measure using median and MAD (median absolute deviation), the score is the largest one.
+    Outliers do not affect median and MAD (as they do with mean and variance). Both are tracked with a
+    stochastic approximation (each sample moves them by a small step towards itself) instead of keeping a window.
+    """
+    learns_online = True
+    MAD_TO_STANDARD_DEVIATION = 1.4826 # For normally distributed data
+
+    def __init__(self, anomaly_threshold_percentile, learning_rate=0.02, anomaly_weight=ANOMALY_UPDATE_WEIGHT):
+        self.anomaly_threshold_percentile = anomaly_threshold_percentile
+        self.learning_rate = learning_rate
+        self.anomaly_weight = anomaly_weight
+        self.median = None
+        self.mad = None
+        self.anomaly_threshold = None
+
+    def _scale(self):
+        return self.MAD_TO_STANDARD_DEVIATION * self.mad + EPSILON
+
+    def train(self, data_buffer):
+        if not data_buffer:
+            raise ValueError("Data buffer cannot be empty for training.")
+
+        data = np.asarray(data_buffer, dtype=np.float64)
+        self.median = np.median(data, axis=0)
+        self.mad = np.median(np.abs(data - self.median), axis=0)
+        scores = np.max(np.abs(data - self.median) / self._scale(), axis=1)
+        self.anomaly_threshold = np.percentile(scores, self.anomaly_threshold_percentile)
+        return self.anomaly_threshold
+
+    def detect(self, sample):
+        if not self.is_trained():
+            raise RuntimeError("Detector not trained. Call train() first.")
+
+        x = np.asarray(sample, dtype=np.float64)
+        expected = self.median
+        difference = x - expected
+        scale = self._scale()
+        score = np.max(np.abs(difference) / scale)
+        is_anomaly = score > self.anomaly_threshold
+        learning_rate = self.learning_rate * (self.anomaly_weight if is_anomaly else 1.0)
+        self.median = expected + learning_rate * scale * np.sign(difference)
+        self.mad = self.mad + learning_rate * (self.mad + EPSILON) * np.sign(np.abs(difference) - self.mad)
+        return is_anomaly, score, expected
+
+    def detect_many(self, samples):
+        return _detect_each(self, samples)
+
+    def is_trained(self):
+        return self.median is not None and self.anomaly_threshold is not None
+
+def _detect_each(detector, samples):
+    # Streaming detectors update their state after each sample, they cannot be vectorized
+    results = [detector.detect(sample) for sample in samples]
+    return (np.array([result[0] for result in results], dtype=bool),
+            np.array([result[1] for result in results]),
+            np.array([result[2] for result in results]))
+
+DETECTORS = {
+    "pca": lambda n_components, percentile: PcaAnomalyDetector(n_components, percentile),
+    "ewma": lambda n_components, percentile: EwmaZScoreDetector(percentile),
+    "mahalanobis": lambda n_components, percentile: MahalanobisDetector(percentile),
+    "median_mad": lambda n_components, percentile: MedianMadDetector(percentile),
+}
+
+def create_detector(kind, n_components, anomaly_threshold_percentile):
+    """Creates a detector by name (see DETECTORS), n_components is used only by PCA."""
+    if kind not in DETECTORS:
+        raise ValueError(f"Unknown detector '{kind}', valid values are: {', '.join(DETECTORS)}.")
+    return DETECTORS[kind](n_components, anomaly_threshold_percentile)
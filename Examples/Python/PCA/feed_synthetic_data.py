@@ -1,7 +1,9 @@
 import time
 import random
-from tw_integration import inspect_measure_value, write_measure
+import asyncio
+from tw_integration_async import inspect_many_values, write_many
 from common_utils import run_until_key_press
+from profiling import timers
 
 # These are the measures we want to generate synthetic data for. Because values cannot be simply random
 # we take a multi-step approach:
@@ -35,17 +37,19 @@ initial_measure_data = {}
 
 def main(stop_event):
     # Initialization to find our baseline and to setup the smoothing factors (points #1 and #4)
+    try:
+        initial_values = asyncio.run(inspect_many_values(MEASURES_TO_GENERATE))
+    except Exception as e:
+        print(f"Error during initial measure inspection: {e}")
+        return
+
     for measure_name in MEASURES_TO_GENERATE:
-        try:
-            value, unit = inspect_measure_value(measure_name)
-            if value is not None and unit is not None:
-                smoothing_factor = random.uniform(MIN_SMOOTHING_FACTOR, MAX_SMOOTHING_FACTOR)
-                initial_measure_data[measure_name] = {"value": value, "unit": unit, "current_smoothed_value": value, "smoothing_factor": smoothing_factor}
-            else:
-                print(f"Could not get initial value for {measure_name}.")
-                return
-        except Exception as e:
-            print(f"Error during initial measure inspection for {measure_name}: {e}")
+        value, unit = initial_values[measure_name]
+        if value is not None and unit is not None:
+            smoothing_factor = random.uniform(MIN_SMOOTHING_FACTOR, MAX_SMOOTHING_FACTOR)
+            initial_measure_data[measure_name] = {"value": value, "unit": unit, "current_smoothed_value": value, "smoothing_factor": smoothing_factor}
+        else:
+            print(f"Could not get initial value for {measure_name}.")
             return
 
     print("\nGenerating synthetic data (press Enter to exit)...")
@@ -74,7 +78,8 @@ def main(stop_event):
                 # Note that we append values, lambdas can access only values already generated
                 current_sample_random_variations.append(rnd_variation)
 
-            # Point #4, apply smoothing and write measures
+            # Point #4, apply smoothing and write measures (all of them concurrently, see write_many())
+            values_to_write = {}
             for i, measure_name in enumerate(MEASURES_TO_GENERATE):
                 data = initial_measure_data[measure_name]
                 unit = data["unit"]
@@ -96,14 +101,14 @@ def main(stop_event):
                 else:
                     format_string = "{:.2f}"
 
-                formatted_new_value = format_string.format(new_value)
+                values_to_write[measure_name] = (format_string.format(new_value), unit)
 
-                try:
-                    write_measure(measure_name, formatted_new_value, unit)
-                except Exception as e:
-                    print(f"Error writing measure {measure_name}: {e}")
-                    stop_event.set()
-                    break
+            try:
+                with timers.timed("write_many"):
+                    asyncio.run(write_many(values_to_write))
+            except Exception as e:
+                print(f"Error writing measures: {e}")
+                stop_event.set()
 
             if stop_event.is_set():
                 break
@@ -2,35 +2,124 @@ import threading
 import time
 import queue
 
+import numpy as np
+
+from bounded_queue import BoundedQueue
+
 # MeasureSampler collects individual measure updates and periodically emits complete samples.
-# A sample is emitted at a fixed interval, using the latest known value for each
-# measure. If a measure has not updated, its last known value is used.
+# A sample is emitted at a fixed interval, with a value for each measure which depends on the aggregation:
+#   "last"   The latest known value (if a measure has not updated, its last known value is used).
+#   "mean"   The time-weighted mean in the interval: each value counts for the time it has been the current one
+#            (from the timestamp of its update, when the subscriber read it, to the timestamp of the next one).
+#   "min"    The minimum value in the interval (including the value we had at the beginning).
+#   "max"    The maximum value in the interval (including the value we had at the beginning).
+#   "count"  The number of updates in the interval.
+# Statistics are updated incrementally (O(1) for each update) in parallel arrays (one item for each measure)
+# and reset at each emission, raw updates are never stored.
+AGGREGATIONS = ("last", "mean", "min", "max", "count")
+
+# Samples waiting to be processed, when the consumer falls behind the oldest ones are discarded (see bounded_queue.py)
+SAMPLE_QUEUE_SIZE = 100
+SAMPLE_QUEUE_POLICY = "drop_oldest"
 
 class MeasureSampler:
-    def __init__(self, measure_names, sample_interval_sec=1.0):
+    def __init__(self, measure_names, sample_interval_sec=1.0, aggregation="last", queue_size=SAMPLE_QUEUE_SIZE, queue_policy=SAMPLE_QUEUE_POLICY, notifier=None):
+        """
+        aggregation is one of AGGREGATIONS or a list with the aggregation to use for each measure.
+        notifier (a threading.Event) is set each time a sample is ready.
+        """
         self._measure_names = list(measure_names) # Keep order for consistent sample vectors
-        self._latest_values = {name: None for name in measure_names}
+        self._indexes = {name: i for i, name in enumerate(self._measure_names)}
+        self._aggregations = [aggregation] * len(self._measure_names) if isinstance(aggregation, str) else list(aggregation)
+        if len(self._aggregations) != len(self._measure_names) or any(a not in AGGREGATIONS for a in self._aggregations):
+            raise ValueError(f"Invalid aggregation, valid values are: {', '.join(AGGREGATIONS)}.")
+
+        measure_count = len(self._measure_names)
+        self._last = np.full(measure_count, np.nan)
+        self._last_time = np.zeros(measure_count)
+        self._weighted_sum = np.zeros(measure_count)
+        self._covered_time = np.zeros(measure_count)
+        self._min = np.full(measure_count, np.inf)
+        self._max = np.full(measure_count, -np.inf)
+        self._count = np.zeros(measure_count, dtype=np.int64)
+        self._interval_start = time.monotonic()
+
         self._sample_interval_sec = sample_interval_sec
-        self._sample_queue = queue.Queue() # Complete samples!
+        self._sample_queue = BoundedQueue(queue_size, queue_policy, notifier=notifier) # Complete samples!
         self._sampling_thread = None
         self._stop_sampling_event = threading.Event()
         self._lock = threading.Lock()
         self._all_measures_initialized = False
+        self.last_summary = None # All the statistics for the last emitted sample, {aggregation: [values]}
+
+    def update_measure(self, name, value, timestamp=None):
+        """timestamp (time.monotonic()) is when the value changed, now if omitted."""
+        self.update_measures([(name, value, timestamp)])
 
-    def update_measure(self, name, value):
+    def update_measures(self, updates):
+        """
+        Same as update_measure() for a list of (name, value) or (name, value, timestamp), oldest first
+        (the lock is acquired only once). Updates without a timestamp changed now.
+        """
         with self._lock:
-            if name not in self._measure_names:
-                return
+            now = time.monotonic()
+            for update in updates:
+                name, value = update[0], update[1]
+                i = self._indexes.get(name)
+                if i is None:
+                    continue
+
+                # An update read before the current interval started (but not ingested) is counted from its start
+                held_since = max(self._last_time[i], self._interval_start)
+                timestamp = update[2] if len(update) > 2 and update[2] is not None else now
+                timestamp = max(timestamp, held_since)
+                if not np.isnan(self._last[i]):
+                    # The previous value has been the current one until this update
+                    self._weighted_sum[i] += self._last[i] * (timestamp - held_since)
+                    self._covered_time[i] += timestamp - held_since
 
-            self._latest_values[name] = value
+                self._last[i] = value
+                self._last_time[i] = timestamp
+                self._count[i] += 1
+                if value < self._min[i]:
+                    self._min[i] = value
+                if value > self._max[i]:
+                    self._max[i] = value
 
             # Check if all measures have received an initial value. Note that tw measures subscribe
             # gives all the initial values at once but in this code we do not want to assume how measures are generated.
             if not self._all_measures_initialized:
-                if all(v is not None for v in self._latest_values.values()):
+                if not np.isnan(self._last).any():
                     self._all_measures_initialized = True
                     print("All measures initialized. Starting periodic sampling.")
 
+    def _close_interval(self, now):
+        """Computes the statistics for the interval ending now and starts a new one (call it with the lock)."""
+        held_since = np.maximum(self._last_time, self._interval_start)
+        held_for = np.maximum(now - held_since, 0) # An update can be more recent than now (taken before the lock)
+        weighted_sum = self._weighted_sum + self._last * held_for
+        covered_time = self._covered_time + held_for
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(covered_time > 0, weighted_sum / covered_time, self._last)
+
+        summary = {
+            "last": self._last.tolist(),
+            "mean": mean.tolist(),
+            "min": self._min.tolist(),
+            "max": self._max.tolist(),
+            "count": self._count.tolist(),
+        }
+
+        # The current value is held at the beginning of the next interval
+        self._weighted_sum[:] = 0
+        self._covered_time[:] = 0
+        initialized = ~np.isnan(self._last)
+        self._min[:] = np.where(initialized, self._last, np.inf)
+        self._max[:] = np.where(initialized, self._last, -np.inf)
+        self._count[:] = 0
+        self._interval_start = now
+        return summary
+
     def _sampling_loop(self):
         last_sample_time = time.monotonic()
 
@@ -39,15 +128,19 @@ class MeasureSampler:
             time_since_last_sample = current_time - last_sample_time
 
             if time_since_last_sample >= self._sample_interval_sec:
+                current_sample = None
                 with self._lock:
+                    summary = self._close_interval(current_time)
                     if self._all_measures_initialized:
-                        # Form the sample using the latest known values
-                        current_sample = [self._latest_values[name] for name in self._measure_names]
-                        self._sample_queue.put(current_sample)
-                        last_sample_time = current_time # Reset timer for next sample
-                    else:
-                        # If not all measures have been initialized, just reset timer and wait
-                        last_sample_time = current_time
+                        # Form the sample using the configured aggregation for each measure
+                        current_sample = [summary[aggregation][i] for i, aggregation in enumerate(self._aggregations)]
+                        self.last_summary = summary
+                    # If not all measures have been initialized, just reset timer and wait
+                    last_sample_time = current_time # Reset timer for next sample
+
+                # Outside the lock: with the "block" policy we may wait here and updates must not
+                if current_sample is not None:
+                    self._sample_queue.put(current_sample, timeout=self._sample_interval_sec)
 
             remaining_time = self._sample_interval_sec - (time.monotonic() - last_sample_time)
             if remaining_time > 0:
@@ -65,7 +158,7 @@ class MeasureSampler:
     def stop(self):
         if self._sampling_thread and self._sampling_thread.is_alive():
             self._stop_sampling_event.set()
-            self._sampling_thread.join(timeout=1.0)
+            self._sampling_thread.join(timeout=max(1.0, self._sample_interval_sec * 2))
 
     def get_next_sample(self, timeout=None):
         try:
@@ -73,6 +166,14 @@ class MeasureSampler:
         except queue.Empty:
             return None
 
+    def get_ready_samples(self):
+        """Retrieves (without waiting) all the samples ready to be processed, oldest first."""
+        return self._sample_queue.get_all()
+
+    def queue_stats(self):
+        """Statistics (dropped samples, high-water mark) of the queue of pending samples."""
+        return self._sample_queue.stats()
+
     def is_ready_for_sampling(self):
         with self._lock:
-            return self._all_measures_initialized
\ No newline at end of file
+            return self._all_measures_initialized
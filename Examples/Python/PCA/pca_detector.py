@@ -1,38 +1,221 @@
+import os
+import threading
 import numpy as np
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from training_files import TRAINING_CHUNK_SIZE, iter_chunks, normalize_chunk, StreamingQuantile
+
+# Version of the file format used by save()/load(), increase it when changing what's saved
+MODEL_FILE_VERSION = 1
 
 class PcaAnomalyDetector:
+    # The model is fitted only by train(), see detectors.py
+    learns_online = False
+
     def __init__(self, n_components, anomaly_threshold_percentile):
         self.n_components = n_components
         self.anomaly_threshold_percentile = anomaly_threshold_percentile
         self.pca_model = None
+        self.components = None
+        self.mean = None
         self.anomaly_threshold = None
 
+    def _reconstruct(self, samples):
+        # Same as pca_model.inverse_transform(pca_model.transform(samples)) but it works also
+        # when the model has been loaded from a file (and it's much faster for a single sample).
+        return (samples - self.mean) @ self.components.T @ self.components + self.mean
+
     def train(self, data_buffer):
         if not data_buffer:
             raise ValueError("Data buffer cannot be empty for training.")
 
         self.pca_model = PCA(n_components=self.n_components, svd_solver='randomized')
         self.pca_model.fit(np.array(data_buffer))
+        self.components = self.pca_model.components_
+        self.mean = self.pca_model.mean_
 
         # Calculate reconstruction errors for training data
-        reconstructed_data = self.pca_model.inverse_transform(self.pca_model.transform(np.array(data_buffer)))
+        reconstructed_data = self._reconstruct(np.array(data_buffer))
         reconstruction_errors = np.linalg.norm(np.array(data_buffer) - reconstructed_data, axis=1)
 
         self.anomaly_threshold = np.percentile(reconstruction_errors, self.anomaly_threshold_percentile)
         return self.anomaly_threshold
 
+    def train_from_files(self, paths, measure_names, ranges=None, chunk_size=TRAINING_CHUNK_SIZE, exclude_anomalies=True):
+        """
+        Trains the model with the samples in archives too big to be loaded at once (see training_files.py),
+        the memory used depends only on chunk_size. If ranges (a (min, max) for each measure) is specified then
+        samples are normalized. The model is fitted one chunk at a time (incremental SVD) and then the
+        threshold is calculated (with a streaming quantile) reading the files again.
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+
+        def chunks():
+            for path in paths:
+                for chunk in iter_chunks(path, measure_names, chunk_size, exclude_anomalies):
+                    yield normalize_chunk(chunk, ranges)
+
+        # Each call to partial_fit() needs at least n_components samples: a chunk is fitted only when we read the
+        # next one, a smaller chunk (e.g. the last one of a file) is merged with the previous one.
+        model = IncrementalPCA(n_components=self.n_components)
+        held_samples = None
+        for chunk in chunks():
+            if held_samples is not None and (len(held_samples) < self.n_components or len(chunk) < self.n_components):
+                held_samples = np.vstack([held_samples, chunk])
+                continue
+            if held_samples is not None:
+                model.partial_fit(held_samples)
+            held_samples = chunk
+
+        if held_samples is None or len(held_samples) < self.n_components:
+            raise ValueError(f"At least {self.n_components} samples are required for training.")
+        model.partial_fit(held_samples)
+
+        components = model.components_
+        mean = model.mean_
+        errors = StreamingQuantile()
+        for chunk in chunks():
+            reconstructed_chunk = (chunk - mean) @ components.T @ components + mean
+            errors.add(np.linalg.norm(chunk - reconstructed_chunk, axis=1))
+
+        self.pca_model = model
+        self.components = components
+        self.mean = mean
+        self.anomaly_threshold = errors.quantile(self.anomaly_threshold_percentile / 100)
+        return self.anomaly_threshold
+
     def detect(self, sample):
-        if self.pca_model is None or self.anomaly_threshold is None:
+        if not self.is_trained():
             raise RuntimeError("PCA model not trained. Call train() first.")
 
-        current_sample_np = np.array([sample])
-        transformed_sample = self.pca_model.transform(current_sample_np)
-        reconstructed_sample = self.pca_model.inverse_transform(transformed_sample)
+        current_sample_np = np.asarray(sample, dtype=np.float64)
+        reconstructed_sample = self._reconstruct(current_sample_np)
         current_reconstruction_error = np.linalg.norm(current_sample_np - reconstructed_sample)
 
         is_anomaly = current_reconstruction_error > self.anomaly_threshold
-        return is_anomaly, current_reconstruction_error, reconstructed_sample[0]
+        return is_anomaly, current_reconstruction_error, reconstructed_sample
+
+    def detect_many(self, samples):
+        if not self.is_trained():
+            raise RuntimeError("PCA model not trained. Call train() first.")
+
+        samples_np = np.asarray(samples, dtype=np.float64)
+        reconstructed_samples = self._reconstruct(samples_np)
+        reconstruction_errors = np.linalg.norm(samples_np - reconstructed_samples, axis=1)
+        return reconstruction_errors > self.anomaly_threshold, reconstruction_errors, reconstructed_samples
 
     def is_trained(self):
-        return self.pca_model is not None and self.anomaly_threshold is not None
+        return self.components is not None and self.anomaly_threshold is not None
+
+    def save(self, path, measure_names, ranges):
+        """
+        Saves the fitted model (components, mean and threshold) together with the measures it has been trained
+        for (names, in order, and their normalization ranges as (min, max) or (None, None)).
+        """
+        if not self.is_trained():
+            raise RuntimeError("PCA model not trained. Call train() first.")
+        _write_model(path, _model_arrays(self, measure_names, ranges))
+
+    @classmethod
+    def load(cls, path, measure_names, ranges, n_components=None, anomaly_threshold_percentile=None):
+        """
+        Loads a model saved with save(), it raises ValueError if the file is not valid or if it has been trained
+        for different measures (or with different normalization ranges): in that case the model must be trained again.
+        """
+        with np.load(path, allow_pickle=False) as model:
+            if int(model["version"]) != MODEL_FILE_VERSION:
+                raise ValueError(f"Unsupported model version {int(model['version'])}.")
+            if [str(name) for name in model["measure_names"]] != list(measure_names):
+                raise ValueError("The model has been trained for different measures.")
+            if not np.array_equal(model["ranges"], _ranges_to_array(ranges), equal_nan=True):
+                raise ValueError("The model has been trained with different normalization ranges.")
+
+            components = np.array(model["components"], dtype=np.float64)
+            mean = np.array(model["mean"], dtype=np.float64)
+            threshold = float(model["threshold"])
+            percentile = float(model["threshold_percentile"])
+
+        if components.ndim != 2 or components.shape[1] != len(measure_names) or mean.shape != (len(measure_names),):
+            raise ValueError("The model file is corrupted (unexpected shape).")
+        if not (np.all(np.isfinite(components)) and np.all(np.isfinite(mean)) and np.isfinite(threshold)):
+            raise ValueError("The model file is corrupted (invalid values).")
+        if n_components is not None and n_components != components.shape[0]:
+            raise ValueError("The model has been trained with a different number of components.")
+        if anomaly_threshold_percentile is not None and anomaly_threshold_percentile != percentile:
+            raise ValueError("The model has been trained with a different threshold percentile.")
+
+        detector = cls(components.shape[0], percentile)
+        detector.components = components
+        detector.mean = mean
+        detector.anomaly_threshold = threshold
+        return detector
+
+class ModelCheckpointer:
+    """
+    Saves the model in a background thread, at most once every interval_sec (and only if it changed):
+    detection never waits for the disk. Call submit() each time the model is trained.
+    """
+    def __init__(self, path, interval_sec):
+        self._path = path
+        self._interval_sec = interval_sec
+        self._condition = threading.Condition()
+        self._pending = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._saving_loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, detector, measure_names, ranges):
+        # Arrays are copied now, the detector can be trained again before we save it
+        arrays = _model_arrays(detector, measure_names, ranges)
+        with self._condition:
+            self._pending = arrays
+            self._condition.notify()
+
+    def stop(self):
+        """Stops the thread, saving the last model (if not saved yet)."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _saving_loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                arrays, self._pending = self._pending, None
+                stopping = self._stopping
+
+            if arrays is not None:
+                try:
+                    _write_model(self._path, arrays)
+                except OSError as e:
+                    print(f"Could not save the model to {self._path}: {e}")
+
+            if stopping:
+                return
+
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopping, timeout=self._interval_sec)
+
+def _ranges_to_array(ranges):
+    return np.array([[np.nan if value is None else value for value in pair] for pair in ranges], dtype=np.float64)
+
+def _model_arrays(detector, measure_names, ranges):
+    return {
+        "version": np.array(MODEL_FILE_VERSION),
+        "measure_names": np.array(list(measure_names)),
+        "ranges": _ranges_to_array(ranges),
+        "components": np.array(detector.components, dtype=np.float64),
+        "mean": np.array(detector.mean, dtype=np.float64),
+        "threshold": np.array(detector.anomaly_threshold, dtype=np.float64),
+        "threshold_percentile": np.array(detector.anomaly_threshold_percentile, dtype=np.float64),
+    }
+
+def _write_model(path, arrays):
+    # Write and rename: a crash while saving never leaves a truncated model
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, path)
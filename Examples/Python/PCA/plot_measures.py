@@ -1,16 +1,94 @@
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+import numpy as np
 import pandas as pd
 import sys
 import os
 import locale
 from tw_integration import inspect_measure
+from decimation import decimate, visible_slice, per_pixel
 
 CSV_FILE_PATH = "measures.csv" # Path to the CSV log file generated by anomaly_detector.py
 REFRESH_INTERVAL_SEC = 5 # How often to check for file changes and refresh the plot
-MAX_SAMPLES_TO_PLOT = 500 # Maximum number of latest samples to display
+MAX_SAMPLES_TO_PLOT = None # Maximum number of latest samples to display (None for the whole history)
+DECIMATION = "minmax" # "minmax" or "lttb" (see decimation.py) to draw about one point per pixel, None to draw all the samples
+MIN_PIXEL_WIDTH = 100 # Used when the width of the plot is not known yet
 AXIS_PADDING_PERCENT = 0.10 # 10% padding for y-axis limits
 MAX_MEASURES_FOR_SINGLE_PLOT = 5 # Max measures to show on a single plot, otherwise stack vertically
 
+class DecimatedPlot:
+    """
+    Lines (one for each measure) and anomaly markers drawn with about one point for each pixel, with millions
+    of samples too. When the visible range changes (zoom or pan) it's decimated again, to show all the details.
+    """
+    def __init__(self, x, anomaly_indexes):
+        self._x = x
+        self._anomaly_indexes = anomaly_indexes
+        self._lines = [] # (ax, line, y)
+        self._markers = [] # (ax, collection)
+        self._connections = [] # (ax, callback id)
+        self._visible_xlim = None # Range of the last update()
+
+    def plot(self, ax, y, label):
+        line, = ax.plot(*self._points(ax, y, 0, len(self._x)), label=label)
+        self._lines.append((ax, line, y))
+
+    def mark_anomalies(self, ax):
+        """Marks anomalies with vertical lines (at most one for each pixel)."""
+        if len(self._anomaly_indexes) == 0:
+            return
+
+        # x in data coordinates and y in axes coordinates (0...1): they span the whole height and do not change the y-axis limits
+        markers = LineCollection(self._marker_segments(ax, 0, len(self._x)), transform=ax.get_xaxis_transform(),
+                                 colors='red', linestyles='-', linewidths=1, label='Anomaly')
+        ax.add_collection(markers, autolim=False)
+        self._markers.append((ax, markers))
+
+    def connect(self, axes):
+        for ax in axes:
+            self._connections.append((ax, ax.callbacks.connect('xlim_changed', self.update)))
+
+    def disconnect(self):
+        for ax, connection_id in self._connections:
+            ax.callbacks.disconnect(connection_id)
+        self._connections = []
+
+    def _points(self, ax, y, start, end):
+        x, y = self._x[start:end], y[start:end]
+        if DECIMATION is None:
+            return x, y
+
+        # Points marked as anomalies are always drawn
+        anomaly_indexes = self._anomaly_indexes
+        anomaly_indexes = anomaly_indexes[(anomaly_indexes >= start) & (anomaly_indexes < end)] - start
+        return decimate(x, y, pixel_width(ax), DECIMATION, anomaly_indexes)
+
+    def _marker_segments(self, ax, start, end):
+        anomaly_indexes = self._anomaly_indexes
+        positions = self._x[anomaly_indexes[(anomaly_indexes >= start) & (anomaly_indexes < end)]]
+        if DECIMATION is not None and end > start:
+            positions = per_pixel(positions, self._x[start], self._x[end - 1], pixel_width(ax))
+        return [[(position, 0), (position, 1)] for position in positions]
+
+    def update(self, changed_ax):
+        """Decimates again the range visible in changed_ax (called when it changes)."""
+        # Axes are shared, when one of them changes we update all of them: the callback is then called
+        # once for each axis with the same limits, only the first one does the work.
+        xlim = tuple(changed_ax.get_xlim())
+        if xlim == self._visible_xlim:
+            return
+        self._visible_xlim = xlim
+
+        start, end = visible_slice(self._x, *xlim)
+        for ax, line, y in self._lines:
+            line.set_data(*self._points(ax, y, start, end))
+        for ax, markers in self._markers:
+            markers.set_segments(self._marker_segments(ax, start, end))
+        changed_ax.figure.canvas.draw_idle()
+
+def pixel_width(ax):
+    return max(int(ax.get_window_extent().width), MIN_PIXEL_WIDTH)
+
 def main():
     locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
 
@@ -19,6 +97,7 @@ def main():
     axes = None
     measure_ranges = {}
     measure_columns = []
+    plot = None
 
     print(f"Monitoring {CSV_FILE_PATH} for changes. Auto-refresh every {REFRESH_INTERVAL_SEC} seconds.")
     print("Close the plot window to exit.")
@@ -83,7 +162,7 @@ def main():
                 continue
 
             # We display the latest MAX_SAMPLES_TO_PLOT samples
-            if len(df) > MAX_SAMPLES_TO_PLOT:
+            if MAX_SAMPLES_TO_PLOT is not None and len(df) > MAX_SAMPLES_TO_PLOT:
                 df = df.tail(MAX_SAMPLES_TO_PLOT)
 
             # Assuming the last column is 'anomaly'
@@ -96,6 +175,12 @@ def main():
 
             # Create a "time index" using  original index values
             df['time'] = df.index
+            x = df['time'].to_numpy(dtype=np.float64)
+
+            # Stop re-decimating the previous data, we're going to clear the axes
+            if plot:
+                plot.disconnect()
+            plot = DecimatedPlot(x, np.flatnonzero(df[anomaly_column].to_numpy() == 1))
 
             # Determine plotting style: single plot or stacked subplots. When there are
             # few measures it's easier to read them in a single plot, but when there are many
@@ -113,13 +198,10 @@ def main():
                     ax.clear()
 
                 for measure in measure_columns:
-                    ax.plot(df['time'], df[measure], label=measure)
+                    plot.plot(ax, df[measure].to_numpy(dtype=np.float64), measure)
                 
                 # Mark anomalies with vertical lines
-                anomalies = df[df[anomaly_column] == 1]
-                if not anomalies.empty:
-                    for x_pos in anomalies['time']:
-                        ax.axvline(x=x_pos, color='red', linestyle='-', linewidth=1, label='Anomaly' if x_pos == anomalies['time'].iloc[0] else "")
+                plot.mark_anomalies(ax)
 
                 ax.set_ylabel('Value')
                 ax.legend()
@@ -141,13 +223,10 @@ def main():
 
                 for i, measure in enumerate(measure_columns):
                     ax = axes[i]
-                    ax.plot(df['time'], df[measure], label=measure)
+                    plot.plot(ax, df[measure].to_numpy(dtype=np.float64), measure)
                     
                     # Mark anomalies with vertical lines
-                    anomalies = df[df[anomaly_column] == 1]
-                    if not anomalies.empty:
-                        for x_pos in anomalies['time']:
-                            ax.axvline(x=x_pos, color='red', linestyle='-', linewidth=1, label='Anomaly' if x_pos == anomalies['time'].iloc[0] else "")
+                    plot.mark_anomalies(ax)
 
                     ax.set_ylabel(measure)
                     ax.legend()
@@ -177,6 +256,10 @@ def main():
 
             fig.suptitle('Values and Anomalies', fontsize=16)
             plt.tight_layout(rect=[0, 0.03, 1, 0.96]) # Otherwise they overlap a little
+
+            # From now on zoom and pan decimate again the visible range (with the final width of the axes)
+            plot.connect(axes)
+            plot.update(axes[-1])
             plt.draw()
             plt.pause(0.1)
         
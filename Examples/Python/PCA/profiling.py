@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import signal
+import threading
+import cProfile
+import pstats
+from collections import Counter
+from contextlib import contextmanager
+
+# Tools to see where time goes without editing the code, see common_utils.run_until_key_press() and --profile:
+#   "cprofile"  Runs main under cProfile, stats are saved (and the top functions printed) on exit.
+#               Accurate but it slows down everything, use it to find out what's slow.
+#   "sample"    A background thread takes the stack of each thread every SAMPLE_INTERVAL_SEC and, on exit,
+#               writes them as collapsed stacks ("frame;frame;frame count"), ready for flamegraph.pl or speedscope.
+#               The overhead is low, it can be used in production.
+# Independently from that, hot paths measure themselves with timers.timed("name"): totals can be printed
+# at any time sending DUMP_SIGNAL to the process (kill -USR1 <pid>, where signals are supported) and on exit.
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL_SEC = 0.005
+TOP_FUNCTIONS_TO_PRINT = 20
+DUMP_SIGNAL = getattr(signal, "SIGUSR1", None) # Not available on Windows
+
+class TimingCounters:
+    """Named counters with how many times a block of code ran and for how long (in total and at most)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {} # name: [count, total_sec, max_sec]
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, elapsed_sec, count=1):
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                self._counters[name] = [count, elapsed_sec, elapsed_sec]
+            else:
+                counter[0] += count
+                counter[1] += elapsed_sec
+                if elapsed_sec > counter[2]:
+                    counter[2] = elapsed_sec
+
+    def snapshot(self):
+        """Returns {name: (count, total_sec, max_sec)}."""
+        with self._lock:
+            return {name: tuple(counter) for name, counter in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+    def dump(self, file=None):
+        file = file or sys.stdout
+        counters = self.snapshot()
+        if not counters:
+            print("No timing counters.", file=file)
+            return
+
+        print(f"{'Counter':<24} {'Count':>10} {'Total (s)':>10} {'Mean (µs)':>10} {'Max (µs)':>10}", file=file)
+        for name, (count, total_sec, max_sec) in sorted(counters.items(), key=lambda item: -item[1][1]):
+            print(f"{name:<24} {count:>10} {total_sec:>10.3f} {total_sec / max(count, 1) * 1e6:>10.1f} {max_sec * 1e6:>10.1f}", file=file)
+        file.flush()
+
+# Shared by all the modules, hot paths use timers.timed("name")
+timers = TimingCounters()
+
+def install_dump_signal(counters=timers):
+    """Prints the counters when the process receives DUMP_SIGNAL, returns False if signals are not supported."""
+    if DUMP_SIGNAL is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    # The handler runs in the main thread, possibly while it holds the lock of the counters (dumping from
+    # there would deadlock): it only wakes up a helper thread.
+    dump_requested = threading.Event()
+
+    def dump_when_requested():
+        while True:
+            dump_requested.wait()
+            dump_requested.clear()
+            counters.dump()
+
+    threading.Thread(target=dump_when_requested, name="timers-dump", daemon=True).start()
+    signal.signal(DUMP_SIGNAL, lambda signum, frame: dump_requested.set())
+    return True
+
+class StackSampler:
+    """Periodically samples the stacks of all the threads (but itself), see write_collapsed()."""
+    def __init__(self, interval_sec=SAMPLE_INTERVAL_SEC):
+        self._interval_sec = interval_sec
+        self._stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.sample_count = 0
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sampling_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _sampling_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self._interval_sec):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self._stacks[_collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.sample_count += 1
+
+    def write_collapsed(self, path):
+        """Writes one line for each distinct stack: "thread;outer frame;...;inner frame count"."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _collapse(thread_name, frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    # Semicolons separate the frames in the collapsed format (and the count is after the last space)
+    return ";".join(name.replace(";", ":") for name in reversed(frames))
+
+def run_profiled(function, mode, output_path):
+    """Runs function() with the specified profiler (one of PROFILE_MODES) and saves the results to output_path."""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', valid values are: {', '.join(PROFILE_MODES)}.")
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function)
+        finally:
+            profiler.dump_stats(output_path)
+            print(f"Profile saved to {output_path} (open it with pstats or snakeviz), top functions:")
+            pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS_TO_PRINT)
+
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        return function()
+    finally:
+        sampler.stop()
+        sampler.write_collapsed(output_path)
+        print(f"{sampler.sample_count} stack samples saved to {output_path} (collapsed stacks, e.g. flamegraph.pl {output_path} > profile.svg)")
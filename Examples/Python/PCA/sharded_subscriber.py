@@ -0,0 +1,184 @@
+import time
+import threading
+
+from tw_integration import TwMeasuresSubscriber, OUTPUT_QUEUE_SIZE, OUTPUT_QUEUE_POLICY
+
+# ShardedMeasuresSubscriber has the same interface of TwMeasuresSubscriber but it partitions the measures
+# across shard_count independent 'tw measures subscribe' processes (each one with its reader thread and queue),
+# when one stream is not enough to carry all the updates. Each measure belongs to exactly one shard
+# then its updates are always in order but get_pending_outputs() returns the updates of one shard after
+# the other: only the order of the updates of the same measure is kept, not the order across measures.
+# Sharding helps when a single process (or its pipe) cannot keep up, it does not scale linearly with the
+# number of shards: all the reader threads parse their output in this process, and they share the GIL.
+# A background thread checks the health of each shard and restarts it (independently from the others)
+# when its process ends, waiting SHARD_RESTART_DELAY_SEC (doubled after each consecutive failure, up to
+# SHARD_MAX_RESTART_DELAY_SEC). After SHARD_MAX_RESTARTS consecutive failures the shard is given up.
+HEALTH_CHECK_INTERVAL_SEC = 0.5
+SHARD_RESTART_DELAY_SEC = 1.0
+SHARD_MAX_RESTART_DELAY_SEC = 30.0
+SHARD_MAX_RESTARTS = 5
+SHARD_STABLE_AFTER_SEC = 60.0 # A shard running for this long is healthy again (consecutive failures are reset)
+
+class _Shard:
+    def __init__(self, index, measures, subscriber):
+        self.index = index
+        self.measures = measures
+        self.subscriber = subscriber
+        self.started_at = None
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.next_restart_at = 0.0
+        self.failed = False
+        self.previous_stats = {"put": 0, "dropped": 0, "coalesced": 0} # Queues before the last restart
+
+    def queue_stats(self):
+        # Restarting a subscriber creates a new queue, counters are for the whole life of the shard
+        stats = self.subscriber.queue_stats()
+        return {**stats, **{key: stats[key] + value for key, value in self.previous_stats.items()}}
+
+class ShardedMeasuresSubscriber:
+    def __init__(self, measures_to_subscribe, shard_count, queue_size=OUTPUT_QUEUE_SIZE, queue_policy=OUTPUT_QUEUE_POLICY, notifier=None):
+        """queue_size is for each shard, notifier (a threading.Event) is shared by all of them."""
+        measures_to_subscribe = list(measures_to_subscribe)
+        shard_count = max(1, min(shard_count, len(measures_to_subscribe)))
+
+        # Round-robin, shards have the same number of measures (plus or minus one)
+        self._shards = []
+        for i in range(shard_count):
+            measures = measures_to_subscribe[i::shard_count]
+            self._shards.append(_Shard(i, measures, TwMeasuresSubscriber(measures, queue_size, queue_policy, notifier)))
+
+        self._lock = threading.Lock()
+        self._recovered_updates = [] # Pending updates of shards we restarted, not retrieved yet
+        self._next_shard = 0
+        self._supervisor_thread = None
+        self._stop_event = threading.Event()
+        self._is_running = False
+
+    def start_subscription(self):
+        """Starts all the shards, if one of them cannot be started then none is."""
+        if self._is_running:
+            return
+
+        try:
+            for shard in self._shards:
+                shard.subscriber.start_subscription()
+                shard.started_at = time.monotonic()
+        except Exception:
+            for shard in self._shards:
+                shard.subscriber.stop_subscription()
+            raise
+
+        self._is_running = True
+        self._stop_event.clear()
+        self._supervisor_thread = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor_thread.start()
+        print(f"Subscribed to {sum(len(shard.measures) for shard in self._shards)} measures with {len(self._shards)} shards.")
+
+    def stop_subscription(self):
+        self._stop_event.set()
+        if self._supervisor_thread:
+            self._supervisor_thread.join()
+            self._supervisor_thread = None
+
+        for shard in self._shards:
+            shard.subscriber.stop_subscription()
+        self._is_running = False
+
+    def get_pending_outputs(self):
+        """Retrieves (without waiting) all the pending updates of all the shards as a list of (name, value, timestamp)."""
+        if not self._is_running:
+            return []
+
+        # The lock is held also when reading from the subscribers, the supervisor might be restarting one of them
+        with self._lock:
+            updates, self._recovered_updates = self._recovered_updates, []
+            for shard in self._shards:
+                updates.extend(shard.subscriber.get_pending_outputs())
+        return updates
+
+    def get_latest_output(self, timeout=0.1):
+        """Retrieves a single update as {name: value} (like TwMeasuresSubscriber), prefer get_pending_outputs()."""
+        deadline = time.monotonic() + (timeout or 0)
+        while self._is_running:
+            with self._lock:
+                if self._recovered_updates:
+                    name, value, _ = self._recovered_updates.pop(0)
+                    return {name: value}
+
+                # Round-robin, a busy shard does not starve the others
+                for _ in range(len(self._shards)):
+                    shard = self._shards[self._next_shard]
+                    self._next_shard = (self._next_shard + 1) % len(self._shards)
+                    if shard.subscriber.is_alive():
+                        output = shard.subscriber.get_latest_output(timeout=0)
+                        if output is not None:
+                            return output
+
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.005)
+        return None
+
+    def is_alive(self):
+        """True until stopped, unless all the shards have been given up."""
+        return self._is_running and not all(shard.failed for shard in self._shards)
+
+    def queue_stats(self):
+        """Statistics of the queues of all the shards (sums, and the highest high-water mark)."""
+        stats = [shard.queue_stats() for shard in self._shards]
+        total = {key: sum(s[key] for s in stats) for key in ("size", "maxsize", "put", "dropped", "coalesced")}
+        total["policy"] = stats[0]["policy"]
+        total["high_water_mark"] = max(s["high_water_mark"] for s in stats)
+        total["shards"] = len(stats)
+        return total
+
+    def health(self):
+        """Returns the state of each shard as a list of dictionaries."""
+        return [{
+            "shard": shard.index,
+            "measures": len(shard.measures),
+            "alive": shard.subscriber.is_alive(),
+            "failed": shard.failed,
+            "restarts": shard.restarts,
+            "consecutive_failures": shard.consecutive_failures,
+            "updates": shard.queue_stats()["put"],
+        } for shard in self._shards]
+
+    def _supervise(self):
+        while not self._stop_event.wait(HEALTH_CHECK_INTERVAL_SEC):
+            now = time.monotonic()
+            for shard in self._shards:
+                with self._lock: # Consumers do not read from a shard while we restart it
+                    self._check(shard, now)
+
+    def _check(self, shard, now):
+        if shard.failed:
+            return
+        if shard.subscriber.is_alive():
+            if shard.consecutive_failures and now - shard.started_at >= SHARD_STABLE_AFTER_SEC:
+                shard.consecutive_failures = 0
+            return
+        if now >= shard.next_restart_at:
+            self._restart(shard, now)
+
+    def _restart(self, shard, now):
+        # Called with self._lock held, updates read before the process ended are not lost
+        self._recovered_updates.extend(shard.subscriber.get_pending_outputs())
+
+        shard.subscriber.stop_subscription()
+        if shard.consecutive_failures >= SHARD_MAX_RESTARTS:
+            shard.failed = True
+            print(f"Subscription shard {shard.index} failed {shard.consecutive_failures} times, giving up.")
+            return
+
+        shard.consecutive_failures += 1
+        shard.next_restart_at = now + min(SHARD_RESTART_DELAY_SEC * 2 ** (shard.consecutive_failures - 1), SHARD_MAX_RESTART_DELAY_SEC)
+        print(f"Subscription shard {shard.index} ended unexpectedly, restarting it (attempt {shard.consecutive_failures}).")
+        try:
+            shard.previous_stats = {key: value for key, value in shard.queue_stats().items() if key in shard.previous_stats}
+            shard.subscriber.start_subscription() # It creates a new queue
+            shard.started_at = time.monotonic()
+            shard.restarts += 1
+        except Exception as e:
+            print(f"Could not restart subscription shard {shard.index}: {e}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The example is a flat set of modules (run from its own directory), make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import time
+
+from bounded_queue import BoundedQueue
+from measure_sampler import MeasureSampler
+from tw_integration import TwMeasuresSubscriber, parse_subscription_lines
+
+def test_coalesce_keeps_all_the_items_below_maxsize():
+    items = [(0, 1.0), (0, 9.0), (0, 2.0), (1, 5.0), (0, 3.0)]
+    q = BoundedQueue(10, "coalesce", key_function=lambda update: update[0])
+    assert q.put_many(items) == len(items)
+    assert q.get_all() == items
+    assert q.stats()["coalesced"] == 0
+
+def test_coalesce_merges_the_latest_pending_item_when_full():
+    q = BoundedQueue(3, "coalesce", key_function=lambda update: update[0])
+    q.put_many([(0, 1.0), (1, 5.0), (0, 2.0)])
+    q.put((0, 3.0)) # Replaces (0, 2.0)
+    q.put((2, 7.0)) # No pending item for 2, the oldest one is dropped
+    assert q.get_all() == [(1, 5.0), (0, 3.0), (2, 7.0)]
+    assert q.stats()["coalesced"] == 1
+    assert q.stats()["dropped"] == 1
+
+def test_coalesce_forgets_keys_of_removed_items():
+    q = BoundedQueue(2, "coalesce", key_function=lambda update: update[0])
+    q.put_many([(0, 1.0), (1, 2.0)])
+    assert q.get() == (0, 1.0)
+    q.put((1, 3.0))
+    q.put((0, 4.0)) # Full: 0 has no pending items anymore, (1, 2.0) is dropped
+    assert q.get_all() == [(1, 3.0), (0, 4.0)]
+
+def test_burst_through_the_subscriber_preserves_min_max_and_count():
+    subscriber = TwMeasuresSubscriber(["A", "B"])
+    subscriber._is_running = True # The reader thread is not needed, updates are queued as it does
+    lines = [b"A=1.0", b"A=9.0", b"A=2.0", b"B=5.0", b"A=3.0"]
+    subscriber._output_queue.put_many(parse_subscription_lines(lines, subscriber._indexes, subscriber._intern))
+
+    sampler = MeasureSampler(["A", "B"], aggregation="max")
+    sampler.update_measures(subscriber.get_pending_outputs())
+    summary = sampler._close_interval(time.monotonic())
+    assert summary["max"] == [9.0, 5.0]
+    assert summary["min"] == [1.0, 5.0]
+    assert summary["count"] == [4, 1]
+    assert summary["last"] == [3.0, 5.0]
@@ -0,0 +1,27 @@
+import numpy as np
+
+from decimation import min_max_indexes, decimate
+
+def test_min_max_keeps_the_extremes_of_each_bucket():
+    y = np.zeros(1000)
+    y[123] = 5.0
+    y[456] = -5.0
+    indexes = min_max_indexes(y, 10)
+    assert 123 in indexes and 456 in indexes
+    assert indexes[0] == 0 and indexes[-1] == len(y) - 1
+
+def test_min_max_ignores_missing_values():
+    y = np.linspace(0, 1, 1000)
+    y[::7] = np.nan
+    y[500] = 10.0
+    indexes = min_max_indexes(y, 10)
+    assert 500 in indexes
+    # Each bucket (100 samples) still contributes its minimum and its maximum
+    assert len(indexes) >= 2 * 10
+
+def test_decimate_keeps_anomalies():
+    x = np.arange(100000, dtype=np.float64)
+    y = np.sin(x / 1000)
+    decimated_x, _ = decimate(x, y, 100, "minmax", keep_indexes=[54321])
+    assert len(decimated_x) <= 300
+    assert 54321.0 in decimated_x
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from detectors import EwmaZScoreDetector, MahalanobisDetector, MedianMadDetector
+
+@pytest.mark.parametrize("detector_class", [EwmaZScoreDetector, MahalanobisDetector, MedianMadDetector])
+def test_streaming_detectors_follow_a_persistent_change(detector_class):
+    rng = np.random.default_rng(1)
+    detector = detector_class(99)
+    detector.train(list(rng.normal(0.5, 0.01, (200, 2))))
+
+    # A new operating point: at the beginning it's an anomaly, eventually it's the normal behavior
+    shifted = rng.normal(0.6, 0.01, (20000, 2))
+    is_anomaly, _, _ = detector.detect_many(shifted)
+    assert is_anomaly[:10].all()
+    assert is_anomaly[-1000:].mean() < 0.1
+
+def test_a_single_outlier_barely_moves_the_model():
+    detector = EwmaZScoreDetector(99)
+    detector.train(list(np.random.default_rng(1).normal(0.5, 0.01, (200, 2))))
+    mean = detector.mean.copy()
+    assert detector.detect([5.0, 5.0])[0]
+    assert np.all(np.abs(detector.mean - mean) <= 0.01 * (5.0 - mean))
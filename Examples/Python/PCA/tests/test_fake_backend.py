@@ -0,0 +1,48 @@
+import grpc
+import pytest
+
+from tw_fake_backend import FakeTinkwellBackend, store_pb2, store_pb2_grpc, discovery_pb2, discovery_pb2_grpc
+
+@pytest.fixture
+def backend():
+    with FakeTinkwellBackend() as backend:
+        backend.register_measure("voltage", quantity_type="ElectricPotential", unit="Volt", minimum=0, maximum=250, value=230)
+        backend.register_measure("current", quantity_type="ElectricCurrent", unit="Ampere", value=2)
+        yield backend
+
+def test_read_many(backend):
+    with grpc.insecure_channel(backend.address) as channel:
+        reply = store_pb2_grpc.StoreStub(channel).ReadMany(store_pb2.StoreReadManyRequest(names=["voltage", "current"]))
+    assert {item.name: item.value.number_value for item in reply.items} == {"voltage": 230, "current": 2}
+
+def test_find(backend):
+    with grpc.insecure_channel(backend.address) as channel:
+        store = store_pb2_grpc.StoreStub(channel)
+        measure = store.Find(store_pb2.StoreFindRequest(name="voltage"))
+        assert measure.definition.unit == "Volt"
+        assert measure.value.number_value == 230
+
+        with pytest.raises(grpc.RpcError) as error:
+            store.Find(store_pb2.StoreFindRequest(name="power"))
+        assert error.value.code() == grpc.StatusCode.NOT_FOUND
+
+def test_subscribe_many(backend):
+    with grpc.insecure_channel(backend.address) as channel:
+        changes = store_pb2_grpc.StoreStub(channel).SubscribeMany(store_pb2.SubscribeManyRequest(names=["voltage"]))
+        first = next(changes) # The current value, sent after the subscription has been registered
+        assert (first.name, first.new_value.number_value) == ("voltage", 230)
+
+        backend.store.update("voltage", store_pb2.StoreValue(number_value=231))
+        change = next(changes)
+        assert (change.name, change.new_value.number_value, change.old_value.number_value) == ("voltage", 231, 230)
+        changes.cancel()
+
+def test_restart(backend):
+    backend.stop()
+    backend.start()
+    with grpc.insecure_channel(backend.address) as channel:
+        reply = discovery_pb2_grpc.DiscoveryStub(channel).Find(discovery_pb2.DiscoveryFindRequest(name="Store"))
+        assert reply.host == backend.url
+
+    with pytest.raises(RuntimeError):
+        backend.start()
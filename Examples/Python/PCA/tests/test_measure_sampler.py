@@ -0,0 +1,57 @@
+import pytest
+
+from measure_sampler import MeasureSampler
+
+def _sampler(aggregation="mean", interval_start=100.0):
+    sampler = MeasureSampler(["A", "B"], aggregation=aggregation)
+    sampler._interval_start = interval_start
+    return sampler
+
+def test_mean_weights_each_update_of_a_batch():
+    sampler = _sampler()
+    # Ingested all together, each update counts from the time it was read
+    sampler.update_measures([("A", 1.0, 100.0), ("B", 5.0, 100.0), ("A", 3.0, 101.0), ("A", 7.0, 103.0)])
+    summary = sampler._close_interval(104.0)
+    assert summary["mean"] == [pytest.approx((1.0 * 1 + 3.0 * 2 + 7.0 * 1) / 4), 5.0]
+    assert summary["count"] == [3, 1]
+    assert summary["min"] == [1.0, 5.0]
+    assert summary["max"] == [7.0, 5.0]
+    assert summary["last"] == [7.0, 5.0]
+
+def test_mean_holds_the_value_across_intervals():
+    sampler = _sampler()
+    sampler.update_measures([("A", 2.0, 99.0), ("B", 4.0, 100.0)])
+    sampler._close_interval(101.0)
+
+    # No updates: the value held from the previous interval
+    summary = sampler._close_interval(102.0)
+    assert summary["mean"] == [2.0, 4.0]
+    assert summary["count"] == [0, 0]
+
+    sampler.update_measures([("A", 4.0, 103.0)])
+    summary = sampler._close_interval(104.0)
+    assert summary["mean"] == [pytest.approx(3.0), 4.0]
+    assert summary["min"] == [2.0, 4.0] # Including the value at the beginning
+
+def test_update_read_before_the_interval_counts_from_its_start():
+    sampler = _sampler()
+    sampler.update_measures([("A", 1.0, 100.0), ("B", 1.0, 100.0)])
+    sampler._close_interval(102.0)
+
+    # Read at 101.5 (before the interval closed) but ingested after
+    sampler.update_measures([("A", 3.0, 101.5)])
+    summary = sampler._close_interval(104.0)
+    assert summary["mean"] == [pytest.approx(3.0), 1.0]
+
+def test_update_without_timestamp_is_now():
+    sampler = _sampler(["mean", "last"], interval_start=0.0)
+    sampler.update_measures([("A", 1.0), ("B", 2.0)])
+    sampler.update_measure("A", 5.0)
+    assert sampler._last.tolist() == [5.0, 2.0]
+    assert sampler._last_time[0] > 0
+
+def test_invalid_aggregation():
+    with pytest.raises(ValueError):
+        MeasureSampler(["A"], aggregation="median")
+    with pytest.raises(ValueError):
+        MeasureSampler(["A", "B"], aggregation=["mean"])
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from pca_detector import PcaAnomalyDetector
+
+def test_train_from_files_fits_a_small_final_chunk(tmp_path):
+    rng = np.random.default_rng(1)
+    samples = rng.normal(0.5, 0.1, (21, 3))
+    path = tmp_path / "samples.npy"
+    np.save(path, samples)
+
+    # Chunks of 10, 10 and 1 samples: the last one is smaller than n_components
+    detector = PcaAnomalyDetector(2, 99)
+    detector.train_from_files([str(path)], ["a", "b", "c"], chunk_size=10)
+    assert detector.pca_model.n_samples_seen_ == len(samples)
+
+def test_train_from_files_needs_n_components_samples(tmp_path):
+    path = tmp_path / "samples.npy"
+    np.save(path, np.ones((1, 3)))
+    with pytest.raises(ValueError):
+        PcaAnomalyDetector(2, 99).train_from_files([str(path)], ["a", "b", "c"])
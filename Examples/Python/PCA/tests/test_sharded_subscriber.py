@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+
+import pytest
+
+import sharded_subscriber
+import tw_integration
+from sharded_subscriber import ShardedMeasuresSubscriber
+from tw_fake_backend import FakeTinkwellBackend, store_pb2
+
+# Stands in for 'tw measures subscribe', it prints the changes streamed by the fake backend as "Name=Value"
+FAKE_TW = """
+import sys
+import grpc
+from tw_fake_backend import store_pb2, store_pb2_grpc
+
+with grpc.insecure_channel(sys.argv[1]) as channel:
+    changes = store_pb2_grpc.StoreStub(channel).SubscribeMany(store_pb2.SubscribeManyRequest(names=sys.argv[4:]))
+    for change in changes:
+        print(f"{change.name}={change.new_value.number_value}", flush=True)
+"""
+
+class _DeadSubscriber:
+    """A subscriber whose process always ends immediately."""
+    def __init__(self, pending_updates=()):
+        self.pending_updates = list(pending_updates)
+        self.starts = 0
+
+    def is_alive(self):
+        return False
+
+    def start_subscription(self):
+        self.starts += 1
+
+    def stop_subscription(self):
+        pass
+
+    def get_pending_outputs(self):
+        updates, self.pending_updates = self.pending_updates, []
+        return updates
+
+    def queue_stats(self):
+        return {"size": 0, "maxsize": 10, "put": 1, "dropped": 0, "coalesced": 0, "policy": "coalesce", "high_water_mark": 1}
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+@pytest.fixture
+def backoff(monkeypatch):
+    monkeypatch.setattr(sharded_subscriber, "SHARD_RESTART_DELAY_SEC", 1.0)
+    monkeypatch.setattr(sharded_subscriber, "SHARD_MAX_RESTART_DELAY_SEC", 4.0)
+    monkeypatch.setattr(sharded_subscriber, "SHARD_MAX_RESTARTS", 4)
+
+def test_restart_backoff(backoff):
+    subscriber = ShardedMeasuresSubscriber(["a", "b"], 2)
+    shard = subscriber._shards[0]
+    shard.subscriber = dead = _DeadSubscriber([("a", 1.0, 0.0)])
+
+    # Delays are 1, 2, 4 and then capped at 4
+    for now, next_restart_at in ((100.0, 101.0), (101.0, 103.0), (103.0, 107.0), (107.0, 111.0)):
+        subscriber._check(shard, now)
+        assert shard.next_restart_at == next_restart_at
+        subscriber._check(shard, now + 0.5) # Not yet
+        assert shard.next_restart_at == next_restart_at
+
+    assert (dead.starts, shard.restarts, shard.consecutive_failures, shard.failed) == (4, 4, 4, False)
+    assert shard.queue_stats()["put"] == 5 # Counters of the previous queues are kept
+    assert subscriber._recovered_updates == [("a", 1.0, 0.0)]
+
+    subscriber._check(shard, 111.0)
+    assert shard.failed and dead.starts == 4
+    subscriber._check(shard, 200.0) # Given up
+    assert dead.starts == 4
+
+def test_stable_shard_resets_failures(backoff):
+    subscriber = ShardedMeasuresSubscriber(["a"], 1)
+    shard = subscriber._shards[0]
+    shard.subscriber = _DeadSubscriber()
+    subscriber._check(shard, 100.0)
+    assert shard.consecutive_failures == 1
+
+    shard.subscriber.is_alive = lambda: True
+    shard.started_at = 100.0
+    subscriber._check(shard, 100.0 + sharded_subscriber.SHARD_STABLE_AFTER_SEC - 1)
+    assert shard.consecutive_failures == 1
+    subscriber._check(shard, 100.0 + sharded_subscriber.SHARD_STABLE_AFTER_SEC)
+    assert shard.consecutive_failures == 0
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake 'tw' is a script with a shebang")
+def test_shard_restarted_after_its_process_ends(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_subscriber, "HEALTH_CHECK_INTERVAL_SEC", 0.05)
+    monkeypatch.setattr(sharded_subscriber, "SHARD_RESTART_DELAY_SEC", 0.05)
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(sys.path))
+
+    with FakeTinkwellBackend() as backend:
+        for name in ("a", "b", "c", "d"):
+            backend.register_measure(name, value=1)
+
+        # 'tw measures subscribe a c' runs 'fake_tw <address> measures subscribe a c'
+        fake_tw = tmp_path / "fake_tw"
+        fake_tw.write_text(f"#!/bin/sh\nexec '{sys.executable}' '{tmp_path / 'fake_tw.py'}' {backend.address} \"$@\"\n")
+        fake_tw.chmod(0o755)
+        (tmp_path / "fake_tw.py").write_text(FAKE_TW)
+        monkeypatch.setattr(tw_integration, "TW_PATH", str(fake_tw))
+
+        subscriber = ShardedMeasuresSubscriber(["a", "b", "c", "d"], 2)
+        received = {}
+        def receive():
+            received.update((name, value) for name, value, _ in subscriber.get_pending_outputs())
+        try:
+            subscriber.start_subscription()
+            assert _wait_for(lambda: receive() or len(received) == 4)
+
+            # The first shard (a and c) crashes, the other one is not affected
+            subscriber._shards[0].subscriber._process.kill()
+            assert _wait_for(lambda: subscriber.health()[0]["restarts"] == 1 and subscriber.health()[0]["alive"])
+            assert subscriber.health()[1]["restarts"] == 0
+
+            for name in ("a", "b", "c", "d"):
+                backend.store.update(name, store_pb2.StoreValue(number_value=2))
+            assert _wait_for(lambda: receive() or received == {"a": 2, "b": 2, "c": 2, "d": 2})
+            assert subscriber.is_alive()
+        finally:
+            subscriber.stop_subscription()
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+import tw_client
+from tw_client import TinkwellClientFactory, ServiceNotFoundError
+from tw_fake_backend import FakeTinkwellBackend, discovery_pb2
+
+@pytest.fixture
+def backend():
+    with FakeTinkwellBackend() as backend:
+        yield backend
+
+def _move_store(backend, host):
+    backend.discovery.unregister("Tinkwell.Store")
+    backend.discovery.register(discovery_pb2.ServiceDescription(name="Tinkwell.Store", family_name="Store", host=host))
+
+def test_resolved_services_are_cached_until_they_expire(backend):
+    with TinkwellClientFactory(backend.url, ttl=0.3) as factory:
+        assert factory.resolve("Tinkwell.Store") == backend.url
+
+        _move_store(backend, "http://127.0.0.1:1")
+        assert factory.resolve("Tinkwell.Store") == backend.url # Still cached
+
+        time.sleep(0.4)
+        assert factory.resolve("Tinkwell.Store") == "http://127.0.0.1:1"
+
+def test_invalidate_resolves_again(backend):
+    with TinkwellClientFactory(backend.url, ttl=60) as factory:
+        factory.resolve("Tinkwell.Store")
+        _move_store(backend, "http://127.0.0.1:1")
+        factory.invalidate("Tinkwell.Store")
+        assert factory.resolve("Tinkwell.Store") == "http://127.0.0.1:1"
+
+def test_unknown_services_are_not_found(backend):
+    with TinkwellClientFactory(backend.url) as factory:
+        with pytest.raises(ServiceNotFoundError):
+            factory.resolve("Tinkwell.Unknown")
+
+def test_trusted_certificate_is_read_like_the_cli(tmp_path, monkeypatch):
+    certificate_path = tmp_path / "tinkwell-cert.pem"
+    certificate_path.write_bytes(b"-----BEGIN CERTIFICATE-----\n-----END CERTIFICATE-----\n")
+    monkeypatch.setattr(tw_client, "CLIENT_CERT_PATH", str(certificate_path))
+    assert TinkwellClientFactory("https://localhost:5000")._credentials is not None
+
+    monkeypatch.setattr(tw_client, "CLIENT_CERT_PATH", None)
+    assert TinkwellClientFactory("https://localhost:5000")._credentials is None
@@ -0,0 +1,70 @@
+import grpc
+import numpy as np
+
+from tw_fake_backend import FakeTinkwellBackend
+from watchdog_collector import RunnerSeries, RingBuffer, WatchdogCollector, FIELDS, load_snapshot, watchdog_pb2_grpc
+
+# Raw samples, averages of 3 raw samples and averages of 2 of them (6 raw samples)
+LEVELS = [(1, 4), (3, 4), (6, 2)]
+
+def _append(series, first, count):
+    for t in range(first, first + count):
+        series.append(float(t), np.full(len(FIELDS), t))
+
+def test_rollup_waits_for_complete_groups():
+    series = RunnerSeries(LEVELS)
+    _append(series, 0, 2)
+    assert [len(level) for level in series.levels] == [2, 0, 0]
+
+    _append(series, 2, 1) # The third sample completes the first rollup
+    assert [len(level) for level in series.levels] == [3, 1, 0]
+    times, values = series.levels[1].to_arrays()
+    assert times.tolist() == [0.0] # The time of the first sample of the group
+    assert values[0].tolist() == [1.0] * len(FIELDS)
+
+    _append(series, 3, 2)
+    assert [len(level) for level in series.levels] == [4, 1, 0]
+    _append(series, 5, 1) # Second rollup, and the first one of the third level
+    assert [len(level) for level in series.levels] == [4, 2, 1]
+
+def test_rollup_averages_and_wraps():
+    series = RunnerSeries(LEVELS)
+    _append(series, 0, 30)
+
+    times, values = series.levels[0].to_arrays()
+    assert times.tolist() == [26.0, 27.0, 28.0, 29.0]
+
+    times, values = series.levels[1].to_arrays()
+    assert times.tolist() == [18.0, 21.0, 24.0, 27.0] # The 10 rollups do not fit, the oldest are overwritten
+    assert values[:, 0].tolist() == [19.0, 22.0, 25.0, 28.0]
+
+    times, values = series.levels[2].to_arrays()
+    assert times.tolist() == [18.0, 24.0]
+    assert values[:, 0].tolist() == [20.5, 26.5]
+
+def test_ring_buffer_returns_copies():
+    buffer = RingBuffer(2, 1)
+    buffer.append(1.0, [1.0])
+    times, _ = buffer.to_arrays()
+    times[0] = 99.0
+    assert buffer.to_arrays()[0].tolist() == [1.0]
+
+def test_collector_with_fake_backend(tmp_path):
+    with FakeTinkwellBackend() as backend:
+        backend.watchdog.set_runner("orchestrator", cpu_utilization=10.0, memory_usage=100.0, thread_count=8)
+        backend.watchdog.set_runner("store", cpu_utilization=5.0, memory_usage=50.0, thread_count=4)
+        with grpc.insecure_channel(backend.address) as channel:
+            collector = WatchdogCollector(watchdog_pb2_grpc.WatchdogStub(channel), interval=1.0, levels=LEVELS)
+            for _ in range(3):
+                collector.poll_once()
+
+        path = tmp_path / "watchdog.npz"
+        collector.export(str(path))
+
+    runners, fields = load_snapshot(str(path))
+    assert fields == list(FIELDS)
+    assert sorted(runners) == ["orchestrator", "store"]
+    raw_times, raw_values = runners["store"][0]
+    assert len(raw_times) == 3
+    assert raw_values[0].tolist() == [5.0, 50.0, 50.0, 4.0, 0.0]
+    assert len(runners["store"][1][0]) == 1 and len(runners["store"][2][0]) == 0
@@ -0,0 +1,156 @@
+import os
+import math
+
+import numpy as np
+
+# Reads archives of samples (too big to be loaded at once) in chunks of at most chunk_size samples, for
+# PcaAnomalyDetector.train_from_files(). Supported formats:
+#   .csv      Files saved by anomaly_detector.py (a column for each measure, plus "anomaly").
+#   .parquet  Same columns of the CSV files, it needs pyarrow (pip install pyarrow).
+#   .npy      A 2D array with a column for each measure (in the same order of measure_names), or a structured
+#             array with a field for each measure. Only the current chunk is loaded.
+# Samples with missing values and (if exclude_anomalies) samples marked as anomalies are skipped.
+TRAINING_CHUNK_SIZE = 50000
+ANOMALY_COLUMN = "anomaly"
+
+def iter_chunks(path, measure_names, chunk_size=TRAINING_CHUNK_SIZE, exclude_anomalies=True):
+    """Yields 2D float64 arrays (samples x measures) with at most chunk_size samples."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        chunks = _iter_csv(path, measure_names, chunk_size, exclude_anomalies)
+    elif extension == ".parquet":
+        chunks = _iter_parquet(path, measure_names, chunk_size, exclude_anomalies)
+    elif extension == ".npy":
+        chunks = _iter_npy(path, measure_names, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file format '{extension}' ({path}), use .csv, .parquet or .npy.")
+
+    for chunk in chunks:
+        chunk = chunk[~np.isnan(chunk).any(axis=1)]
+        if len(chunk):
+            yield chunk
+
+def normalize_chunk(chunk, ranges):
+    """
+    Vectorized version of Measure.normalize() in anomaly_detector.py: ranges is a list of (min, max) for each measure,
+    measures without a range (None or min == max) are not normalized. The chunk is normalized in place.
+    """
+    if ranges is None:
+        return chunk
+
+    minimums = np.array([np.nan if r[0] is None else r[0] for r in ranges], dtype=np.float64)
+    maximums = np.array([np.nan if r[1] is None else r[1] for r in ranges], dtype=np.float64)
+    spans = maximums - minimums
+    valid = np.isfinite(spans) & (spans != 0)
+    chunk[:, valid] = (chunk[:, valid] - minimums[valid]) / spans[valid]
+    return chunk
+
+def _iter_csv(path, measure_names, chunk_size, exclude_anomalies):
+    import pandas as pd
+
+    columns = list(measure_names)
+    header = pd.read_csv(path, nrows=0).columns
+    missing_columns = [name for name in columns if name not in header]
+    if missing_columns:
+        raise ValueError(f"{path} does not contain the measures: {', '.join(missing_columns)}.")
+
+    use_anomalies = exclude_anomalies and ANOMALY_COLUMN in header
+    usecols = columns + [ANOMALY_COLUMN] if use_anomalies else columns
+    for frame in pd.read_csv(path, usecols=usecols, chunksize=chunk_size):
+        if use_anomalies:
+            frame = frame[frame[ANOMALY_COLUMN] != 1]
+        yield frame[columns].to_numpy(dtype=np.float64)
+
+def _iter_parquet(path, measure_names, chunk_size, exclude_anomalies):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow).")
+
+    columns = list(measure_names)
+    parquet_file = pq.ParquetFile(path)
+    missing_columns = [name for name in columns if name not in parquet_file.schema_arrow.names]
+    if missing_columns:
+        raise ValueError(f"{path} does not contain the measures: {', '.join(missing_columns)}.")
+
+    use_anomalies = exclude_anomalies and ANOMALY_COLUMN in parquet_file.schema_arrow.names
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns + [ANOMALY_COLUMN] if use_anomalies else columns):
+        chunk = np.column_stack([batch.column(name).to_numpy(zero_copy_only=False).astype(np.float64) for name in columns])
+        if use_anomalies:
+            chunk = chunk[batch.column(ANOMALY_COLUMN).to_numpy(zero_copy_only=False) != 1]
+        yield chunk
+
+def _iter_npy(path, measure_names, chunk_size):
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.names:
+            missing_columns = [name for name in measure_names if name not in dtype.names]
+            if missing_columns:
+                raise ValueError(f"{path} does not contain the measures: {', '.join(missing_columns)}.")
+            row_shape = ()
+        elif len(shape) != 2 or shape[1] != len(measure_names):
+            raise ValueError(f"{path} must contain a 2D array with {len(measure_names)} columns (one for each measure).")
+        else:
+            row_shape = (shape[1],)
+        if fortran_order and row_shape:
+            raise ValueError(f"{path} is saved in Fortran order, it cannot be read in chunks.")
+        if dtype.hasobject:
+            raise ValueError(f"{path} contains Python objects.")
+
+        # Read (and not memory map) one chunk at a time: memory does not grow with the size of the file
+        row_size = dtype.itemsize * (row_shape[0] if row_shape else 1)
+        for start in range(0, shape[0], chunk_size):
+            row_count = min(chunk_size, shape[0] - start)
+            rows = np.frombuffer(f.read(row_count * row_size), dtype=dtype).reshape((row_count,) + row_shape)
+            if dtype.names:
+                yield np.column_stack([rows[name].astype(np.float64) for name in measure_names])
+            else:
+                yield rows.astype(np.float64)
+
+class StreamingQuantile:
+    """
+    Approximate quantiles of a stream of non negative values (e.g. reconstruction errors) in constant memory:
+    values are counted in logarithmic buckets (like DDSketch), quantile() is within relative_accuracy of the
+    exact value (values smaller than min_value count as zero, the ones greater than max_value as max_value).
+    """
+    def __init__(self, relative_accuracy=0.001, min_value=1e-12, max_value=1e12):
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._min_value = min_value
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        bucket_count = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self._counts = np.zeros(bucket_count + 1, dtype=np.int64) # Bucket 0 is for zeros
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+
+        with np.errstate(divide="ignore"):
+            buckets = np.ceil(np.log(np.maximum(values, self._min_value)) / self._log_gamma) - self._offset
+        buckets = np.where(values < self._min_value, 0, np.clip(buckets, 1, len(self._counts) - 1)).astype(np.int64)
+        self._counts += np.bincount(buckets, minlength=len(self._counts))
+        self.count += len(values)
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    def quantile(self, q):
+        """Returns the q-th quantile (0...1) of all the values added so far."""
+        if self.count == 0:
+            raise ValueError("No values.")
+
+        rank = q * (self.count - 1)
+        bucket = int(np.searchsorted(np.cumsum(self._counts), rank, side="right"))
+        if bucket == 0:
+            value = 0.0
+        else:
+            # The middle of the bucket (in relative terms), it's within relative_accuracy of any value in it
+            value = 2 * self._gamma ** (bucket + self._offset) / (self._gamma + 1)
+        return min(max(value, self.minimum), self.maximum)
@@ -0,0 +1,216 @@
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+
+import grpc
+
+from tw_grpc import load_service
+
+# Native gRPC client for Tinkwell services. Services are resolved with Discovery.Find()/FindAll() and the
+# result is cached for SERVICE_CACHE_TTL_SEC: a service is resolved again only when the cached entry
+# expires or when a call fails with UNAVAILABLE (the service might have been moved to another host).
+# There is one channel (kept alive and reused by all the stubs) for each host.
+# Tinkwell serves gRPC over TLS, usually with a self-signed certificate: like the Tinkwell CLI the factory reads
+# the (PEM) certificate to trust from TINKWELL_CLIENT_CERT_PATH, unless you pass it explicitly.
+# Example:
+#   with TinkwellClientFactory("https://localhost:5000") as factory:
+#       store = factory.store()
+#       measure = store.Find(store_pb2.StoreFindRequest(name="voltage"))
+# The address of the Discovery service is in TINKWELL_DISCOVERY_SERVICE_ADDRESS for services started by
+# Tinkwell, otherwise you can find it with 'tw supervisor roles query discovery'.
+DISCOVERY_ADDRESS = os.environ.get("TINKWELL_DISCOVERY_SERVICE_ADDRESS")
+CLIENT_CERT_PATH = os.environ.get("TINKWELL_CLIENT_CERT_PATH")
+SERVICE_CACHE_TTL_SEC = 60.0
+
+STORE_SERVICE_NAME = "Tinkwell.Store"
+EVENTS_GATEWAY_SERVICE_NAME = "Tinkwell.EventsGateway"
+HEALTH_CHECK_SERVICE_NAME = "Tinkwell.HealthCheck"
+
+# Pings keep idle connections open (and detect broken ones) without waiting for the next call
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+discovery_pb2, discovery_pb2_grpc = load_service("discovery")
+store_pb2, store_pb2_grpc = load_service("store")
+events_gateway_pb2, events_gateway_pb2_grpc = load_service("events_gateway")
+health_check_pb2, health_check_pb2_grpc = load_service("health_check")
+
+class ServiceNotFoundError(LookupError):
+    pass
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _split_host(host):
+    """Returns (target, is_secure) for a host URL returned by Discovery (for example "https://localhost:5000")."""
+    parts = urlsplit(host if "://" in host else f"https://{host}")
+    return parts.netloc, parts.scheme != "http"
+
+class _ResilientStub:
+    """
+    Wraps a stub for a service resolved through Discovery: if a (unary) call fails with UNAVAILABLE
+    then the service is resolved again and the call is retried once.
+    Streaming calls are not retried, errors are raised while iterating the responses (and they do not
+    invalidate the cache), call factory.invalidate() before starting them again.
+    """
+    def __init__(self, factory, service_name, stub_class):
+        self._factory = factory
+        self._service_name = service_name
+        self._stub_class = stub_class
+
+    def __getattr__(self, method_name):
+        def invoke(request, *args, **kwargs):
+            method = getattr(self._factory._stub_for(self._service_name, self._stub_class), method_name)
+            if not isinstance(method, grpc.UnaryUnaryMultiCallable):
+                return method(request, *args, **kwargs)
+
+            try:
+                return method(request, *args, **kwargs)
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+                self._factory.invalidate(self._service_name)
+                method = getattr(self._factory._stub_for(self._service_name, self._stub_class), method_name)
+                return method(request, *args, **kwargs)
+        return invoke
+
+class TinkwellClientFactory:
+    """
+    Creates stubs for Tinkwell services, caching the resolved addresses and reusing one channel per host.
+    For TLS pass the (PEM) certificate of the server as root_certificates or its path as root_certificates_path
+    (by default TINKWELL_CLIENT_CERT_PATH, when it's set), target_name_override if the name in the certificate
+    does not match the host name and private_key/certificate_chain (or their paths) if the server requires
+    a client certificate. Both Discovery and the services it resolves use the same credentials.
+    """
+    def __init__(self, discovery_address=None, ttl=SERVICE_CACHE_TTL_SEC, root_certificates=None,
+                 private_key=None, certificate_chain=None, target_name_override=None,
+                 root_certificates_path=None, private_key_path=None, certificate_chain_path=None):
+        self._discovery_address = discovery_address or DISCOVERY_ADDRESS
+        if not self._discovery_address:
+            raise ValueError("The address of the Discovery service is required (or set TINKWELL_DISCOVERY_SERVICE_ADDRESS).")
+
+        root_certificates_path = root_certificates_path or CLIENT_CERT_PATH
+        if root_certificates is None and root_certificates_path:
+            root_certificates = _read_file(root_certificates_path)
+        if private_key is None and private_key_path:
+            private_key = _read_file(private_key_path)
+        if certificate_chain is None and certificate_chain_path:
+            certificate_chain = _read_file(certificate_chain_path)
+
+        self._ttl = ttl
+        self._credentials = None
+        if root_certificates is not None or private_key is not None:
+            self._credentials = grpc.ssl_channel_credentials(root_certificates, private_key, certificate_chain)
+        self._channel_options = list(CHANNEL_OPTIONS)
+        if target_name_override:
+            self._channel_options.append(("grpc.ssl_target_name_override", target_name_override))
+
+        self._lock = threading.Lock()
+        self._channels = {} # host => channel
+        self._stubs = {} # (host, stub class) => stub
+        self._resolved = {} # service name => (host, expiration)
+        self._resolved_families = {} # family name => (hosts, expiration)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            channels = list(self._channels.values())
+            self._channels.clear()
+            self._stubs.clear()
+        for channel in channels:
+            channel.close()
+
+    def channel(self, host):
+        """Returns the (shared) channel for the specified host, creating it if needed."""
+        with self._lock:
+            channel = self._channels.get(host)
+            if channel is None:
+                target, is_secure = _split_host(host)
+                if is_secure:
+                    credentials = self._credentials or grpc.ssl_channel_credentials()
+                    channel = grpc.secure_channel(target, credentials, options=self._channel_options)
+                else:
+                    channel = grpc.insecure_channel(target, options=self._channel_options)
+                self._channels[host] = channel
+            return channel
+
+    def _stub_for_host(self, host, stub_class):
+        channel = self.channel(host)
+        with self._lock:
+            stub = self._stubs.get((host, stub_class))
+            if stub is None:
+                stub = stub_class(channel)
+                self._stubs[(host, stub_class)] = stub
+            return stub
+
+    def _stub_for(self, service_name, stub_class):
+        return self._stub_for_host(self.resolve(service_name), stub_class)
+
+    def _discovery_stub(self):
+        return self._stub_for_host(self._discovery_address, discovery_pb2_grpc.DiscoveryStub)
+
+    def resolve(self, service_name):
+        """Returns the host of the specified service (see Discovery.Find()), raises ServiceNotFoundError if it does not exist."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._resolved.get(service_name)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        reply = self._discovery_stub().Find(discovery_pb2.DiscoveryFindRequest(name=service_name))
+        if not reply.HasField("host"):
+            raise ServiceNotFoundError(f"Cannot find service '{service_name}'.")
+
+        with self._lock:
+            self._resolved[service_name] = (reply.host, now + self._ttl)
+        return reply.host
+
+    def resolve_all(self, family_name):
+        """Returns the hosts of all the services with the specified family name (see Discovery.FindAll())."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._resolved_families.get(family_name)
+        if cached is not None and cached[1] > now:
+            return list(cached[0])
+
+        hosts = list(self._discovery_stub().FindAll(discovery_pb2.DiscoveryFindAllRequest(family_name=family_name)).hosts)
+        with self._lock:
+            self._resolved_families[family_name] = (hosts, now + self._ttl)
+        return list(hosts)
+
+    def invalidate(self, service_name=None):
+        """Removes a service (or all of them if service_name is None) from the cache, it's resolved again when used."""
+        with self._lock:
+            if service_name is None:
+                self._resolved.clear()
+                self._resolved_families.clear()
+            else:
+                self._resolved.pop(service_name, None)
+                self._resolved_families.pop(service_name, None)
+
+    def stub(self, service_name, stub_class):
+        """Returns a stub (of type stub_class) for the specified service, see _ResilientStub."""
+        return _ResilientStub(self, service_name, stub_class)
+
+    def discovery(self):
+        return self._discovery_stub()
+
+    def store(self):
+        return self.stub(STORE_SERVICE_NAME, store_pb2_grpc.StoreStub)
+
+    def events_gateway(self):
+        return self.stub(EVENTS_GATEWAY_SERVICE_NAME, events_gateway_pb2_grpc.EventsGatewayStub)
+
+    def health_check(self, service_name=HEALTH_CHECK_SERVICE_NAME):
+        return self.stub(service_name, health_check_pb2_grpc.HealthCheckStub)
@@ -0,0 +1,502 @@
+import threading
+import queue
+import fnmatch
+import re
+import uuid
+from concurrent import futures
+
+import grpc
+from google.protobuf import empty_pb2
+
+from tw_grpc import load_service
+
+# A lightweight, in-process, fake Tinkwell backend implementing Store, Discovery, HealthCheck, EventsGateway and Watchdog
+# with in-memory state. It starts in a few milliseconds on a random local port (without TLS) and it's meant to
+# test and benchmark Python clients without a running Tinkwell instance.
+# Example:
+#   with FakeTinkwellBackend() as backend:
+#       backend.register_measure("voltage", quantity_type="ElectricPotential", unit="Volt", minimum=0, maximum=250)
+#       channel = grpc.insecure_channel(backend.address)
+#       ...
+# It's not a full implementation: measures have no TTL, string values are not validated, units are not converted
+# and there is no access control. Subscriptions first receive the current value of each (already set) measure.
+
+store_pb2, store_pb2_grpc = load_service("store")
+discovery_pb2, discovery_pb2_grpc = load_service("discovery")
+health_check_pb2, health_check_pb2_grpc = load_service("health_check")
+events_gateway_pb2, events_gateway_pb2_grpc = load_service("events_gateway")
+watchdog_pb2, watchdog_pb2_grpc = load_service("watchdog")
+
+# Streaming calls hold a worker thread for all their lifetime
+MAX_WORKERS = 64
+
+# How often streaming calls check if the client is still connected
+STREAM_POLL_INTERVAL_SEC = 0.2
+
+def _wildcard_match(pattern, text):
+    # Tinkwell wildcards use [^...] for negated groups, fnmatch uses [!...]
+    return fnmatch.fnmatchcase(text, pattern.replace("[^", "[!"))
+
+def _copy(message):
+    copy = type(message)()
+    copy.CopyFrom(message)
+    return copy
+
+def _drain_stream(context, subscriber_queue, unsubscribe):
+    try:
+        while context.is_active():
+            try:
+                yield subscriber_queue.get(timeout=STREAM_POLL_INTERVAL_SEC)
+            except queue.Empty:
+                continue
+    finally:
+        unsubscribe()
+
+class _Subscribers:
+    """Thread-safe list of (filter, queue) for streaming calls."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def add(self, accept):
+        entry = (accept, queue.Queue())
+        with self._lock:
+            self._subscribers.append(entry)
+        return entry[1], lambda: self._remove(entry)
+
+    def _remove(self, entry):
+        with self._lock:
+            if entry in self._subscribers:
+                self._subscribers.remove(entry)
+
+    def publish(self, item, transform=lambda item, result: item):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for accept, subscriber_queue in subscribers:
+            result = accept(item)
+            if result:
+                subscriber_queue.put(transform(item, result))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+class FakeStore(store_pb2_grpc.StoreServicer):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._measures = {} # name => StoreMeasure
+        self._subscribers = _Subscribers()
+
+    def register(self, definition, metadata=None):
+        with self._lock:
+            if definition.name in self._measures:
+                raise ValueError(f"A measure named '{definition.name}' already exists.")
+            measure = store_pb2.StoreMeasure(definition=definition)
+            measure.metadata.created_at.GetCurrentTime()
+            if metadata is not None:
+                measure.metadata.tags.extend(metadata.tags)
+                if metadata.HasField("category"):
+                    measure.metadata.category = metadata.category
+                if metadata.HasField("description"):
+                    measure.metadata.description = metadata.description
+            self._measures[definition.name] = measure
+
+    def update(self, name, value):
+        with self._lock:
+            measure = self._measures.get(name)
+            if measure is None:
+                raise KeyError(name)
+
+            definition = measure.definition
+            if value.HasField("number_value"):
+                if definition.type == store_pb2.StoreDefinition.STRING:
+                    raise ValueError(f"Measure '{name}' does not accept numeric values.")
+                if definition.HasField("minimum") and value.number_value < definition.minimum:
+                    raise OverflowError(f"Value {value.number_value} is below the minimum for '{name}'.")
+                if definition.HasField("maximum") and value.number_value > definition.maximum:
+                    raise OverflowError(f"Value {value.number_value} is above the maximum for '{name}'.")
+            elif value.HasField("string_value") and definition.type == store_pb2.StoreDefinition.NUMBER:
+                raise ValueError(f"Measure '{name}' does not accept string values.")
+
+            new_value = store_pb2.StoreValue()
+            new_value.CopyFrom(value)
+            if not new_value.HasField("timestamp"):
+                new_value.timestamp.GetCurrentTime()
+
+            change = store_pb2.StoreValueChange(name=name, new_value=new_value)
+            if measure.HasField("value"):
+                change.old_value.CopyFrom(measure.value)
+            measure.value.CopyFrom(new_value)
+
+        self._subscribers.publish(change)
+
+    def find(self, name):
+        """Returns a copy of the measure with the specified name, None if it does not exist."""
+        with self._lock:
+            measure = self._measures.get(name)
+            return None if measure is None else _copy(measure)
+
+    def _select(self, names):
+        with self._lock:
+            if not names:
+                return [_copy(measure) for measure in self._measures.values()]
+            return [_copy(self._measures[name]) for name in names if name in self._measures]
+
+    def _abort(self, context, error):
+        if isinstance(error, KeyError):
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Cannot find a measure named '{error.args[0]}'.")
+        elif isinstance(error, OverflowError):
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, str(error))
+        else:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(error))
+
+    def Register(self, request, context):
+        try:
+            self.register(request.definition, request.metadata)
+        except ValueError as e:
+            self._abort(context, e)
+        return empty_pb2.Empty()
+
+    def RegisterMany(self, request, context):
+        for item in request.items:
+            self.Register(item, context)
+        return empty_pb2.Empty()
+
+    def Update(self, request, context):
+        try:
+            self.update(request.name, request.value)
+        except (KeyError, ValueError, OverflowError) as e:
+            self._abort(context, e)
+        return empty_pb2.Empty()
+
+    def UpdateMany(self, request, context):
+        for item in request.items:
+            self.Update(item, context)
+        return empty_pb2.Empty()
+
+    def SetMeasureValue(self, request, context):
+        # Values are in the form "5.5 V" (unit is ignored, we do not convert units) or plain strings
+        with self._lock:
+            measure = self._measures.get(request.name)
+        if measure is None:
+            self._abort(context, KeyError(request.name))
+
+        value = store_pb2.StoreValue()
+        if request.HasField("timestamp"):
+            value.timestamp.CopyFrom(request.timestamp)
+        if measure.definition.type == store_pb2.StoreDefinition.STRING:
+            value.string_value = request.value_string
+        else:
+            match = re.match(r"\s*([+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?)", request.value_string)
+            if match is None:
+                if measure.definition.type == store_pb2.StoreDefinition.NUMBER:
+                    self._abort(context, ValueError(f"'{request.value_string}' is not a valid value for '{request.name}'."))
+                value.string_value = request.value_string
+            else:
+                value.number_value = float(match.group(1))
+
+        try:
+            self.update(request.name, value)
+        except (KeyError, ValueError, OverflowError) as e:
+            self._abort(context, e)
+        return empty_pb2.Empty()
+
+    def Find(self, request, context):
+        measure = self.find(request.name)
+        if measure is None:
+            self._abort(context, KeyError(request.name))
+        return measure
+
+    def FindAll(self, request, context):
+        for measure in self._select(request.names):
+            yield measure
+
+    def FindAllDefinitions(self, request, context):
+        for measure in self._select(request.names):
+            yield measure.definition
+
+    def Search(self, request, context):
+        query = request.query.lower() if request.HasField("query") else None
+        for measure in self._select([]):
+            if query and query not in measure.definition.name.lower():
+                continue
+            if request.tags and not set(request.tags).issubset(measure.metadata.tags):
+                continue
+            if request.HasField("category") and measure.metadata.category != request.category:
+                continue
+
+            if request.include_values:
+                yield store_pb2.SearchResponse(measure=measure)
+            else:
+                yield store_pb2.SearchResponse(info=store_pb2.StoreMeasureInfo(definition=measure.definition, metadata=measure.metadata))
+
+    def ReadMany(self, request, context):
+        reply = store_pb2.StoreValueList()
+        for measure in self._select(request.names):
+            reply.items.add(name=measure.definition.name, value=measure.value)
+        return reply
+
+    def _subscribe(self, context, accept):
+        subscriber_queue, unsubscribe = self._subscribers.add(lambda change: accept(change.name))
+
+        # Current values first (registered after we started listening, we might send a value twice but we never lose one)
+        for measure in self._select([]):
+            if accept(measure.definition.name) and measure.HasField("value"):
+                subscriber_queue.put(store_pb2.StoreValueChange(name=measure.definition.name, new_value=measure.value))
+
+        return _drain_stream(context, subscriber_queue, unsubscribe)
+
+    def Subscribe(self, request, context):
+        return self._subscribe(context, lambda name: name == request.name)
+
+    def SubscribeMany(self, request, context):
+        names = set(request.names)
+        return self._subscribe(context, lambda name: name in names)
+
+    def SubscribeManyMatching(self, request, context):
+        return self._subscribe(context, lambda name: _wildcard_match(request.pattern, name))
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+class FakeDiscovery(discovery_pb2_grpc.DiscoveryServicer):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = []
+
+    def register(self, service):
+        with self._lock:
+            if any(existing.name == service.name for existing in self._services):
+                raise ValueError(f"A service named '{service.name}' already exists.")
+            self._services.append(service)
+
+    def unregister(self, name):
+        with self._lock:
+            self._services = [service for service in self._services if service.name != name]
+
+    def List(self, request, context):
+        query = request.query.lower() if request.HasField("query") else None
+        with self._lock:
+            services = list(self._services)
+
+        def matches(service):
+            texts = [service.name, service.friendly_name, service.family_name] + list(service.aliases)
+            return any(query in text.lower() for text in texts)
+
+        return discovery_pb2.DiscoveryListReply(services=[service for service in services if query is None or matches(service)])
+
+    def Find(self, request, context):
+        with self._lock:
+            services = list(self._services)
+
+        # Same precedence used by Tinkwell: name, then aliases and then family name
+        for accept in (lambda s: s.name == request.name, lambda s: request.name in s.aliases, lambda s: s.family_name == request.name):
+            for service in services:
+                if accept(service):
+                    return discovery_pb2.DiscoveryFindReply(host=service.host, url=service.url)
+        return discovery_pb2.DiscoveryFindReply()
+
+    def FindAll(self, request, context):
+        with self._lock:
+            hosts = [service.host for service in self._services if service.family_name == request.family_name]
+        return discovery_pb2.DiscoveryFindAllReply(hosts=hosts)
+
+    def Register(self, request, context):
+        try:
+            self.register(request.service)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.ALREADY_EXISTS, str(e))
+        return discovery_pb2.DiscoveryRegisterReply()
+
+class FakeHealthCheck(health_check_pb2_grpc.HealthCheckServicer):
+    def __init__(self, name):
+        self.name = name
+        self.status = health_check_pb2.HealthCheckResponse.SERVING
+        self.message = None
+
+    def Check(self, request, context):
+        reply = health_check_pb2.HealthCheckResponse(name=self.name, status=self.status)
+        if self.message is not None:
+            reply.message = self.message
+        return reply
+
+class FakeEventsGateway(events_gateway_pb2_grpc.EventsGatewayServicer):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = _Subscribers()
+        self.published_events = [] # SubscribeEventsResponse, in the order they have been published
+
+    def Publish(self, request, context):
+        event = events_gateway_pb2.SubscribeEventsResponse(
+            id=str(uuid.uuid4()),
+            topic=request.topic,
+            subject=request.subject,
+            verb=request.verb,
+            object=request.object,
+            correlation_id=request.correlation_id if request.HasField("correlation_id") else str(uuid.uuid4()),
+            occurred_at=request.occurred_at)
+        if request.HasField("payload"):
+            event.payload = request.payload
+
+        with self._lock:
+            self.published_events.append(event)
+
+        self._subscribers.publish(event, self._with_match_id)
+        return events_gateway_pb2.PublishEventsResponse(id=event.id, correlation_id=event.correlation_id)
+
+    @staticmethod
+    def _with_match_id(event, match_id):
+        if match_id is True:
+            return event
+        copy = _copy(event)
+        copy.match_id = match_id
+        return copy
+
+    @staticmethod
+    def _matches(match, event):
+        verb = events_gateway_pb2.Verb.Name(event.verb)
+        for field, value in (("topic", event.topic), ("subject", event.subject), ("verb", verb), ("object", event.object)):
+            if match.HasField(field) and not _wildcard_match(getattr(match, field), value):
+                return False
+        return True
+
+    def SubscribeTo(self, request, context):
+        subscriber_queue, unsubscribe = self._subscribers.add(lambda event: event.topic == request.topic)
+        return _drain_stream(context, subscriber_queue, unsubscribe)
+
+    def SubscribeToMatching(self, request, context):
+        subscriber_queue, unsubscribe = self._subscribers.add(lambda event: self._matches(request, event))
+        return _drain_stream(context, subscriber_queue, unsubscribe)
+
+    def SubscribeToMatchingMany(self, request, context):
+        def accept(event):
+            for match in request.matches:
+                if self._matches(match, event):
+                    return match.match_id or True
+            return None
+
+        subscriber_queue, unsubscribe = self._subscribers.add(accept)
+        return _drain_stream(context, subscriber_queue, unsubscribe)
+
+class FakeWatchdog(watchdog_pb2_grpc.WatchdogServicer):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runners = {} # name => RunnerHealthStatus
+
+    def set_runner(self, name, cpu_utilization=0.0, memory_usage=0.0, peak_memory_usage=None, thread_count=0, handle_count=0,
+                   status=watchdog_pb2.SERVING, quality=watchdog_pb2.GOOD):
+        """Sets the status reported for a runner (adding it if it does not exist), the timestamp is the current time."""
+        runner = watchdog_pb2.RunnerHealthStatus(name=name, quality=quality, status=status)
+        runner.timestamp.GetCurrentTime()
+        runner.resources.cpu_utilization = cpu_utilization
+        runner.resources.memory_usage = memory_usage
+        runner.resources.peak_memory_usage = memory_usage if peak_memory_usage is None else peak_memory_usage
+        runner.resources.thread_count = thread_count
+        runner.resources.handle_count = handle_count
+        with self._lock:
+            self._runners[name] = runner
+
+    def remove_runner(self, name):
+        with self._lock:
+            self._runners.pop(name, None)
+
+    def List(self, request, context):
+        query = request.query.lower() if request.HasField("query") else None
+        with self._lock:
+            runners = [runner for name, runner in self._runners.items() if query is None or query in name.lower()]
+        return watchdog_pb2.WatchdogListReply(runners=runners)
+
+    def Assess(self, request, context):
+        with self._lock:
+            statuses = [runner.status for runner in self._runners.values()]
+        reply = watchdog_pb2.WatchdogAssessReply(status_quality=watchdog_pb2.GOOD, anomaly_quality=watchdog_pb2.POOR)
+        reply.timestamp.GetCurrentTime()
+        reply.status = max(statuses, default=watchdog_pb2.SERVING) # CRASHED > DEGRADED > SERVING
+        return reply
+
+class FakeTinkwellBackend:
+    """
+    Hosts the fake services on a local port. Use it as a context manager or call start() and stop().
+    """
+    def __init__(self, host="127.0.0.1", port=0):
+        self._host = host
+        self._requested_port = port
+        self._server = None
+        self.port = None
+        self.store = FakeStore()
+        self.discovery = FakeDiscovery()
+        self.health_check = FakeHealthCheck("Tinkwell.Fake")
+        self.events_gateway = FakeEventsGateway()
+        self.watchdog = FakeWatchdog()
+
+    @property
+    def address(self):
+        """Address to use with grpc.insecure_channel()."""
+        return f"{self._host}:{self.port}"
+
+    @property
+    def url(self):
+        """Host URL, as returned by Discovery."""
+        return f"http://{self._host}:{self.port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # Services registered in Discovery by start(), as (name, family name)
+    SERVICES = (("Tinkwell.Store", "Store"), ("Tinkwell.Discovery", "Discovery"), ("Tinkwell.HealthCheck", "HealthCheck"),
+                ("Tinkwell.EventsGateway", "EventsGateway"), ("Tinkwell.Watchdog", "Watchdog"))
+
+    def start(self):
+        """Starts a new server (it can be started again after stop(), state is preserved)."""
+        if self._server is not None:
+            raise RuntimeError("The fake backend is already running.")
+
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS))
+        store_pb2_grpc.add_StoreServicer_to_server(self.store, self._server)
+        discovery_pb2_grpc.add_DiscoveryServicer_to_server(self.discovery, self._server)
+        health_check_pb2_grpc.add_HealthCheckServicer_to_server(self.health_check, self._server)
+        events_gateway_pb2_grpc.add_EventsGatewayServicer_to_server(self.events_gateway, self._server)
+        watchdog_pb2_grpc.add_WatchdogServicer_to_server(self.watchdog, self._server)
+        self.port = self._server.add_insecure_port(f"{self._host}:{self._requested_port}")
+        self._server.start()
+
+        for name, family_name in self.SERVICES:
+            self.discovery.register(discovery_pb2.ServiceDescription(name=name, family_name=family_name, host=self.url, url=f"{self.url}/{name}"))
+
+    def stop(self, grace=None):
+        if self._server is not None:
+            self._server.stop(grace).wait()
+            self._server = None
+            # After a restart the port (then the URL) might be different
+            for name, _ in self.SERVICES:
+                self.discovery.unregister(name)
+
+    def register_measure(self, name, quantity_type=None, unit=None, minimum=None, maximum=None, value=None):
+        """Shortcut to register (and optionally set) a numeric measure."""
+        definition = store_pb2.StoreDefinition(name=name, type=store_pb2.StoreDefinition.NUMBER)
+        if quantity_type is not None:
+            definition.quantity_type = quantity_type
+        if unit is not None:
+            definition.unit = unit
+        if minimum is not None:
+            definition.minimum = minimum
+        if maximum is not None:
+            definition.maximum = maximum
+        self.store.register(definition)
+        if value is not None:
+            self.store.update(name, store_pb2.StoreValue(number_value=value))
+
+if __name__ == "__main__":
+    import time
+    with FakeTinkwellBackend() as backend:
+        print(f"Fake Tinkwell backend listening on {backend.address} (press Ctrl+C to exit)...")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
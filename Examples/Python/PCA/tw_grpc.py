@@ -0,0 +1,85 @@
+import os
+import re
+import sys
+import shutil
+import hashlib
+import importlib
+
+# Python stubs for the Tinkwell gRPC services, generated (with grpcio-tools) from the .proto files
+# in the Protos/ directory of the repository. Set TINKWELL_PROTOS_PATH if you moved this example somewhere else.
+# Stubs are generated the first time they're needed and cached, they're regenerated only when a .proto file changes.
+# Example:
+#   store_pb2, store_pb2_grpc = load_service("store")
+#   stub = store_pb2_grpc.StoreStub(channel)
+PROTOS_PATH = os.environ.get("TINKWELL_PROTOS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Protos"))
+GENERATED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "tw_grpc")
+
+# HTTP annotations (for the JSON transcoding) are not needed by Python clients and they
+# depend on googleapis protos which are not included with grpcio-tools: we strip them.
+_ANNOTATIONS_IMPORT = re.compile(r'^\s*import\s+"google/api/annotations\.proto";\s*$', re.MULTILINE)
+_HTTP_OPTION = re.compile(r'\{\s*option\s+\(google\.api\.http\)\s*=\s*\{[^}]*\};\s*\}')
+
+_loaded_modules = {}
+
+def _module_name(proto_file_name):
+    # "tinkwell.store.proto" => "tinkwell_store" (protoc would map dots to packages)
+    return proto_file_name[:-len(".proto")].replace(".", "_")
+
+def _generate(output_path):
+    from grpc_tools import protoc
+    import grpc_tools
+
+    source_path = os.path.join(output_path, "src")
+    os.makedirs(source_path, exist_ok=True)
+
+    proto_files = []
+    for file_name in sorted(os.listdir(PROTOS_PATH)):
+        if not file_name.endswith(".proto"):
+            continue
+
+        with open(os.path.join(PROTOS_PATH, file_name), "r", encoding="utf-8-sig") as f:
+            content = f.read()
+        content = _ANNOTATIONS_IMPORT.sub("", content)
+        content = _HTTP_OPTION.sub(";", content)
+
+        target_file_name = _module_name(file_name) + ".proto"
+        with open(os.path.join(source_path, target_file_name), "w", encoding="utf-8") as f:
+            f.write(content)
+        proto_files.append(target_file_name)
+
+    well_known_protos = os.path.join(os.path.dirname(grpc_tools.__file__), "_proto")
+    result = protoc.main(["grpc_tools.protoc", f"-I{source_path}", f"-I{well_known_protos}",
+                          f"--python_out={output_path}", f"--grpc_python_out={output_path}"] + proto_files)
+    if result != 0:
+        raise RuntimeError(f"Cannot generate the gRPC stubs from {PROTOS_PATH} (protoc exit code {result}).")
+
+def _ensure_generated():
+    digest = hashlib.sha1()
+    for file_name in sorted(os.listdir(PROTOS_PATH)):
+        if file_name.endswith(".proto"):
+            with open(os.path.join(PROTOS_PATH, file_name), "rb") as f:
+                digest.update(file_name.encode("utf-8") + f.read())
+
+    output_path = os.path.join(GENERATED_PATH, digest.hexdigest()[:12])
+    if not os.path.isdir(output_path):
+        # Generate them in a separate directory, another process might be doing the same
+        building_path = f"{output_path}.{os.getpid()}"
+        _generate(building_path)
+        try:
+            os.rename(building_path, output_path)
+        except OSError:
+            shutil.rmtree(building_path, ignore_errors=True)
+
+    if output_path not in sys.path:
+        sys.path.insert(0, output_path)
+
+def load_service(name):
+    """
+    Returns the tuple (messages module, services module) for the specified proto file,
+    for example load_service("store") loads the stubs for Protos/tinkwell.store.proto.
+    """
+    if name not in _loaded_modules:
+        _ensure_generated()
+        module_name = _module_name(f"tinkwell.{name}.proto")
+        _loaded_modules[name] = (importlib.import_module(f"{module_name}_pb2"), importlib.import_module(f"{module_name}_pb2_grpc"))
+    return _loaded_modules[name]
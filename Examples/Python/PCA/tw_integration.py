@@ -2,27 +2,81 @@ import subprocess
 import threading
 import queue
 import re
+import time
+from tw_units import split_value
+from bounded_queue import BoundedQueue
+from profiling import timers
 
 # Default path to the 'tw' executable. Use absolute path if necessary.
 # If 'tw' is in your PATH, you can leave this as is.
 TW_PATH = "tw"  
 
+# Updates read from 'tw measures subscribe' waiting to be processed, see bounded_queue.py for the policies.
+# With "coalesce", when the queue is full, a new update replaces the pending one of the same measure.
+# Below the limit all the updates are kept (min/max/count aggregations see every value).
+OUTPUT_QUEUE_SIZE = 10000
+OUTPUT_QUEUE_POLICY = "coalesce"
+
+# The output of 'tw measures subscribe' is read in binary chunks (up to this size) and all the complete
+# lines in a chunk are parsed and queued together.
+READ_CHUNK_SIZE = 64 * 1024
+
+# "Value=5.5 V" in the output of 'tw measures inspect --value', see tw_units.split_value() for the value itself
+_VALUE_LINE = re.compile(r"Value=(.+)")
+
 class TwMeasuresSubscriber:
     """Manages the lifecycle of a 'tw measures subscribe' subprocess."""
-    def __init__(self, measures_to_subscribe):
+    def __init__(self, measures_to_subscribe, queue_size=OUTPUT_QUEUE_SIZE, queue_policy=OUTPUT_QUEUE_POLICY, notifier=None):
+        """notifier (a threading.Event) is set when there are new updates and when the subscription ends."""
         self._measures_to_subscribe = measures_to_subscribe
         self._process = None
-        self._output_queue = queue.Queue()
+        self._queue_size = queue_size
+        self._queue_policy = queue_policy
+        self._notifier = notifier
+        # Measure names are interned: queued updates are (index, value, timestamp) and name is self._names[index].
+        # timestamp (time.monotonic()) is when the update has been read, all the updates of a chunk share it.
+        self._names = list(measures_to_subscribe)
+        self._indexes = {name.encode(): i for i, name in enumerate(self._names)}
+        self._output_queue = self._create_queue()
         self._stdout_thread = None
         self._is_running = False
 
+    def _create_queue(self):
+        # When full, updates are coalesced by measure
+        return BoundedQueue(self._queue_size, self._queue_policy, key_function=lambda update: update[0], notifier=self._notifier)
+
+    def _intern(self, name):
+        # Called only by the reader thread, a measure we did not expect (it should not happen) gets a new index
+        index = self._indexes.get(name)
+        if index is None:
+            index = len(self._names)
+            self._names.append(name.decode(errors="replace"))
+            self._indexes[name] = index
+        return index
+
     def _read_stdout(self):
-        """Reads stdout from the subprocess and puts lines into a queue."""
-        for line in iter(self._process.stdout.readline, ''):
-            if not line:
+        """Reads stdout from the subprocess in chunks and puts all the updates of each chunk into the queue."""
+        stdout, output_queue = self._process.stdout, self._output_queue
+        remainder = b""
+        while True:
+            chunk = stdout.read1(READ_CHUNK_SIZE)
+            if not chunk:
                 break
-            self._output_queue.put(line.strip())
-        self._process.stdout.close()
+
+            timestamp = time.monotonic()
+            lines = (remainder + chunk).split(b"\n")
+            remainder = lines.pop() # Incomplete line, the rest is in the next chunk
+            start = time.perf_counter()
+            updates = parse_subscription_lines(lines, self._indexes, self._intern, timestamp)
+            timers.add("parse_subscription", time.perf_counter() - start, len(updates))
+            if updates and output_queue.put_many(updates) < len(updates):
+                break # Queue closed, we are stopping
+
+        if remainder:
+            output_queue.put_many(parse_subscription_lines([remainder], self._indexes, self._intern, time.monotonic()))
+        stdout.close()
+        if self._notifier is not None:
+            self._notifier.set() # Wake up the consumer, the process ended
 
     def start_subscription(self):
         """Starts the 'tw measures subscribe' subprocess."""
@@ -30,14 +84,13 @@ class TwMeasuresSubscriber:
             return
 
         subscribe_command = [TW_PATH, "measures", "subscribe"] + self._measures_to_subscribe
+        if self._output_queue.closed:
+            self._output_queue = self._create_queue() # Restarted after stop_subscription()
         try:
             self._process = subprocess.Popen(
                 subscribe_command,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                stderr=subprocess.PIPE
             )
             self._is_running = True
             self._stdout_thread = threading.Thread(target=self._read_stdout)
@@ -58,54 +111,96 @@ class TwMeasuresSubscriber:
         if not self._is_running:
             return None
         
-        # The output is expected to be in the format "MeasureName=Value"
-        # where Value is a float.
-        # If the unit of measure is needed then the caller can call inspect_measure_value()
-        # to obtain it separately.
-        # Example:
-        #   Temperature=23.5
         try:
-            line = self._output_queue.get(timeout=timeout)
-            parts = line.split('=')
-            if len(parts) == 2:
-                name, value_str = parts[0], parts[1]
-                try:
-                    value = float(value_str)
-                    return {name: value}
-                except ValueError:
-                    print(f"Warning: Could not parse value '{value_str}' from line '{line}'")
-                    return None
-            else:
-                print(f"Warning: Unrecognized line format: '{line}'")
-                return None
+            index, value, _ = self._output_queue.get(timeout=timeout)
+            return {self._names[index]: value}
         except queue.Empty:
-            if self._process and self._process.poll() is not None:
+            process = self._process
+            if process and process.poll() is not None:
                 print("Subscription process ended unexpectedly.")
                 self.stop_subscription()
             return None
 
+    def get_pending_outputs(self):
+        """Retrieves (without waiting) all the pending updates as a list of (name, value, timestamp), oldest first."""
+        if not self._is_running:
+            return []
+
+        names = self._names
+        return [(names[index], value, timestamp) for index, value, timestamp in self._output_queue.get_all()]
+
     def stop_subscription(self):
         """Terminates the 'tw measures subscribe' subprocess."""
-        if self._process and self._process.poll() is None:
-            self._process.terminate()
+        process = self._process
+        if process and process.poll() is None:
+            process.terminate()
             try:
-                self._process.wait(timeout=5)
+                process.wait(timeout=5)
             except subprocess.TimeoutExpired:
-                self._process.kill()
+                process.kill()
+        self._output_queue.close() # Do not leave the reader thread blocked in put()
         self._is_running = False
         self._process = None
         self._stdout_thread = None
 
+    def queue_stats(self):
+        """Statistics (dropped and coalesced updates, high-water mark) of the queue of pending updates."""
+        return self._output_queue.stats()
+
     def is_alive(self):
         """Checks if the subscribed process is still running."""
-        return self._is_running and (self._process and self._process.poll() is None)
+        # Read once, another thread (see ShardedMeasuresSubscriber) might be stopping the subscription
+        process = self._process
+        return self._is_running and process is not None and process.poll() is None
 
-def inspect_measure(measure_name):
-    """Executes 'tw measures inspect' to get min/max for a measure."""
-    command = [TW_PATH, "measures", "inspect", measure_name]
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
-    output = result.stdout.strip().split('\n')
+def parse_subscription_line(line):
+    """Parses a line printed by 'tw measures subscribe', returns {name: value} or None if it's not valid."""
+    # The output is expected to be in the format "MeasureName=Value"
+    # where Value is a float.
+    # If the unit of measure is needed then the caller can call inspect_measure_value()
+    # to obtain it separately.
+    # Example:
+    #   Temperature=23.5
+    parts = line.split('=')
+    if len(parts) == 2:
+        name, value_str = parts[0], parts[1]
+        try:
+            value = float(value_str)
+            return {name: value}
+        except ValueError:
+            print(f"Warning: Could not parse value '{value_str}' from line '{line}'")
+            return None
+    else:
+        print(f"Warning: Unrecognized line format: '{line}'")
+        return None
+
+def parse_subscription_lines(lines, indexes, intern=None, timestamp=None):
+    """
+    Parses the complete lines (bytes) printed by 'tw measures subscribe', returns a list of (index, value, timestamp)
+    where index is indexes[name] (name is bytes). Lines for other measures are ignored, or intern(name) gives their index.
+    """
+    updates = []
+    for line in lines:
+        name, separator, value_str = line.partition(b"=")
+        name = name.strip()
+        index = indexes.get(name)
+        if index is None:
+            if not separator:
+                if line.strip():
+                    print(f"Warning: Unrecognized line format: '{line.decode(errors='replace').strip()}'")
+                continue
+            if intern is None:
+                continue
+            index = intern(name)
+
+        try:
+            updates.append((index, float(value_str), timestamp))
+        except ValueError:
+            print(f"Warning: Could not parse value '{value_str.decode(errors='replace').strip()}' from line '{line.decode(errors='replace').strip()}'")
+    return updates
 
+def parse_measure_range(output):
+    """Parses the output lines of 'tw measures inspect', returns (min, max)."""
     min_val = None
     max_val = None
 
@@ -130,35 +225,34 @@ def inspect_measure(measure_name):
                     max_val = None
     return min_val, max_val
 
-def inspect_measure_value(measure_name):
-    """Executes 'tw measures inspect MEASURE_NAME --value' to get current value and unit."""
-    command = [TW_PATH, "measures", "inspect", measure_name, "--value"]
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
-    output = result.stdout.strip().split('\n')
-
+def parse_measure_value(output):
+    """Parses the output lines of 'tw measures inspect --value', returns (value, unit)."""
     # The output is a set of properties in the form "Property=Value"
     # We need to find "Value" which contains the current value and unit. We need to
     # know both the value and unit, so we will parse it accordingly. For example:
     #   Value=5.5 V
     for line in output:
-        match = re.match(r"Value=(.+)", line)
+        match = _VALUE_LINE.match(line)
         if match:
-            full_value_str = match.group(1).strip()
-            value_match = re.match(r"([+-]?\d*\.?\d+)\s*(.*)", full_value_str)
-            if value_match:
-                value = float(value_match.group(1))
-                unit = value_match.group(2).strip()
-                return value, unit
-            else:
-                try:
-                    value = float(full_value_str)
-                    return value, ""
-                except ValueError:
-                    return None, None
+            return split_value(match.group(1))
     return None, None
 
+def write_measure_command(measure_name, value, unit):
+    value_with_unit = f"{value}" if not unit else f"{value} {unit}"
+    return [TW_PATH, "measures", "write", measure_name, value_with_unit]
+
+def inspect_measure(measure_name):
+    """Executes 'tw measures inspect' to get min/max for a measure."""
+    command = [TW_PATH, "measures", "inspect", measure_name]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return parse_measure_range(result.stdout.strip().split('\n'))
+
+def inspect_measure_value(measure_name):
+    """Executes 'tw measures inspect MEASURE_NAME --value' to get current value and unit."""
+    command = [TW_PATH, "measures", "inspect", measure_name, "--value"]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return parse_measure_value(result.stdout.strip().split('\n'))
+
 def write_measure(measure_name, value, unit):
     """Writes a measure value using 'tw measures write'."""
-    value_with_unit = f"{value}" if not unit else f"{value} {unit}"
-    command = [TW_PATH, "measures", "write", measure_name, value_with_unit]
-    subprocess.run(command, check=True, capture_output=True)
+    subprocess.run(write_measure_command(measure_name, value, unit), check=True, capture_output=True)
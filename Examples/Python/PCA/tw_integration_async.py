@@ -0,0 +1,112 @@
+import asyncio
+import subprocess
+
+import tw_integration
+from tw_integration import parse_subscription_line, parse_measure_range, parse_measure_value, write_measure_command
+
+# asyncio flavour of tw_integration: commands run concurrently (each one is a separate 'tw' process)
+# but never more than MAX_CONCURRENT_COMMANDS at the same time, use set_concurrency_limit() to change it.
+# Cancelling a task kills the 'tw' process it started.
+# Example:
+#   ranges = await inspect_many(["voltage", "current"])  # {"voltage": (0.0, 250.0), ...}
+#   async for update in subscribe(["voltage"]):          # {"voltage": 230.0}
+#       ...
+MAX_CONCURRENT_COMMANDS = 16
+
+# A semaphore is bound to its event loop, we need a new one if the caller uses asyncio.run() multiple times
+_limiter = None
+_limiter_loop = None
+
+def set_concurrency_limit(max_concurrent_commands):
+    """Sets the maximum number of 'tw' commands running at the same time, call it before using the module."""
+    global MAX_CONCURRENT_COMMANDS, _limiter
+    MAX_CONCURRENT_COMMANDS = max_concurrent_commands
+    _limiter = None
+
+def _get_limiter():
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        _limiter = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
+        _limiter_loop = loop
+    return _limiter
+
+async def _terminate(process):
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+async def _run(command):
+    """Runs a 'tw' command and returns its output lines, raises CalledProcessError if it fails."""
+    async with _get_limiter():
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            await _terminate(process)
+            raise
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return stdout.decode("utf-8", errors="replace").strip().split('\n')
+
+async def _gather(coroutines):
+    """Like asyncio.gather() but if one of them fails then all the others are cancelled."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def inspect_measure(measure_name):
+    """Executes 'tw measures inspect' to get min/max for a measure."""
+    return parse_measure_range(await _run([tw_integration.TW_PATH, "measures", "inspect", measure_name]))
+
+async def inspect_measure_value(measure_name):
+    """Executes 'tw measures inspect MEASURE_NAME --value' to get current value and unit."""
+    return parse_measure_value(await _run([tw_integration.TW_PATH, "measures", "inspect", measure_name, "--value"]))
+
+async def write_measure(measure_name, value, unit):
+    """Writes a measure value using 'tw measures write'."""
+    await _run(write_measure_command(measure_name, value, unit))
+
+async def inspect_many(measure_names):
+    """Returns {name: (min, max)} for all the specified measures, see inspect_measure()."""
+    measure_names = list(measure_names)
+    ranges = await _gather(inspect_measure(name) for name in measure_names)
+    return dict(zip(measure_names, ranges))
+
+async def inspect_many_values(measure_names):
+    """Returns {name: (value, unit)} for all the specified measures, see inspect_measure_value()."""
+    measure_names = list(measure_names)
+    values = await _gather(inspect_measure_value(name) for name in measure_names)
+    return dict(zip(measure_names, values))
+
+async def write_many(values):
+    """Writes all the values, specified as {name: (value, unit)}, see write_measure()."""
+    await _gather(write_measure(name, value, unit) for name, (value, unit) in values.items())
+
+async def subscribe(measures_to_subscribe):
+    """
+    Starts 'tw measures subscribe' and yields an {name: value} dictionary for each update.
+    The process is terminated when the iteration stops (or it's cancelled).
+    """
+    command = [tw_integration.TW_PATH, "measures", "subscribe"] + list(measures_to_subscribe)
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+
+            update = parse_subscription_line(line.decode("utf-8", errors="replace").strip())
+            if update is not None:
+                yield update
+    finally:
+        await _terminate(process)
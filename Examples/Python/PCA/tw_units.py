@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import math
+import pickle
+import functools
+
+# Lookup of quantities, units and abbreviations generated by Tools/generate_units_doc.py (Units.index.json
+# and Units.index.pickle), it lets you validate values and convert units without asking the server.
+# Set TINKWELL_UNITS_INDEX to the path of Units.index.json if you generated it somewhere else.
+# Example:
+#   units = load_unit_index()
+#   value, quantity, unit = units.parse_value("5.5 V")   # => (5.5, "ElectricPotential", "Volt")
+#   units.convert(value, quantity, unit, "Millivolt")     # => 5500.0
+UNITS_INDEX_PATH = os.environ.get("TINKWELL_UNITS_INDEX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Tools", "Units.index.json"))
+
+# Values are printed (and accepted) by tw as "<number> <abbreviation>", for example "5.5 V" or "-1.2E-05 A"
+_VALUE_WITH_UNIT = re.compile(r"^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(.*?)\s*$")
+
+# Conversion functions in the UnitsNet definitions are C# expressions (for example "{x} * 0.3048" or
+# "{x} * 180 / Math.PI"): we compile only those made of numbers, arithmetic operators and a few Math functions.
+_EXPRESSION_TOKEN = re.compile(r"\s*(?:(\{x\})|(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)[mMdD]?|(Math\.[A-Za-z0-9]+)|([-+*/(),]))")
+_MATH_FUNCTIONS = {
+    "Math.PI": "math.pi",
+    "Math.E": "math.e",
+    "Math.Pow": "math.pow",
+    "Math.Sqrt": "math.sqrt",
+    "Math.Log10": "math.log10",
+    "Math.Log": "math.log",
+    "Math.Exp": "math.exp",
+}
+
+@functools.lru_cache(maxsize=4096)
+def split_value(text):
+    """
+    Splits a value printed by tw into (float, unit string), the unit is an empty string if not present.
+    Returns (None, None) if the text does not start with a number.
+    """
+    match = _VALUE_WITH_UNIT.match(text)
+    if match is None:
+        try:
+            return float(text), "" # NaN and Infinity
+        except ValueError:
+            return None, None
+    return float(match.group(1)), match.group(2)
+
+def _compile_expression(expression):
+    """Returns a function for the C# expression, None if it's not supported."""
+    if not expression:
+        return None
+
+    python_tokens = []
+    position = 0
+    while position < len(expression):
+        match = _EXPRESSION_TOKEN.match(expression, position)
+        if match is None:
+            return None
+        variable, number, function, operator = match.groups()
+        if variable:
+            python_tokens.append("x")
+        elif number:
+            python_tokens.append(number)
+        elif function:
+            if function not in _MATH_FUNCTIONS:
+                return None
+            python_tokens.append(_MATH_FUNCTIONS[function])
+        else:
+            python_tokens.append(operator)
+        position = match.end()
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+
+    try:
+        return eval(f"lambda x: {' '.join(python_tokens)}", {"__builtins__": {}, "math": math})
+    except SyntaxError:
+        return None
+
+class UnitIndex:
+    """Lookup of quantities and units by name or (en-US) abbreviation."""
+    def __init__(self, index):
+        self._quantities = index["quantities"]
+        self._abbreviations = {abbr: [tuple(entry) for entry in entries] for abbr, entries in index["abbreviations"].items()}
+        self._converters = {}
+        self._found_units = {} # (unit, quantity): result of find_unit(), per instance (lru_cache would keep self alive)
+
+    @property
+    def quantities(self):
+        return list(self._quantities.keys())
+
+    def units_of(self, quantity):
+        """Returns the names of the units of the specified quantity, raises KeyError if it does not exist."""
+        return list(self._quantities[quantity]["units"].keys())
+
+    def is_valid_unit(self, quantity, unit):
+        quantity_def = self._quantities.get(quantity)
+        return quantity_def is not None and unit in quantity_def["units"]
+
+    def find_unit(self, unit, quantity=None):
+        """
+        Returns (quantity, unit name) for an abbreviation (for example "V") or a unit name (for example "Volt").
+        The same abbreviation can be used for units of different quantities, use quantity to choose
+        the one you want (otherwise the first one, in alphabetical order, is used).
+        Returns None if there are no matching units.
+        """
+        key = (unit, quantity)
+        if key not in self._found_units:
+            self._found_units[key] = self._find_unit(unit, quantity)
+        return self._found_units[key]
+
+    def _find_unit(self, unit, quantity):
+        if quantity is not None and self.is_valid_unit(quantity, unit):
+            return quantity, unit
+
+        for candidate_quantity, candidate_unit in self._abbreviations.get(unit, ()):
+            if quantity is None or candidate_quantity == quantity:
+                return candidate_quantity, candidate_unit
+
+        if quantity is None:
+            for candidate_quantity, quantity_def in self._quantities.items():
+                if unit in quantity_def["units"]:
+                    return candidate_quantity, unit
+        return None
+
+    def parse_value(self, text, quantity=None):
+        """
+        Parses a value printed by tw (for example "5.5 V") and returns (float, quantity, unit name).
+        A value without unit is a Scalar with unit "Amount". Raises ValueError if the value or the unit are not valid.
+        """
+        value, unit = split_value(text)
+        if value is None:
+            raise ValueError(f"'{text}' is not a valid value.")
+        if not unit:
+            return value, quantity or "Scalar", "Amount"
+
+        found = self.find_unit(unit, quantity)
+        if found is None:
+            raise ValueError(f"Unknown unit '{unit}' in '{text}'.")
+        return value, found[0], found[1]
+
+    def parse_values(self, texts, quantity=None):
+        """Parses a sequence of values, see parse_value()."""
+        return [self.parse_value(text, quantity) for text in texts]
+
+    def _converter(self, quantity, unit):
+        key = (quantity, unit)
+        if key not in self._converters:
+            unit_def = self._quantities[quantity]["units"][unit]
+            self._converters[key] = (_compile_expression(unit_def["to_base"]), _compile_expression(unit_def["from_base"]))
+        return self._converters[key]
+
+    def _conversion(self, quantity, from_unit, to_unit):
+        to_base, _ = self._converter(quantity, from_unit)
+        _, from_base = self._converter(quantity, to_unit)
+        if to_base is None or from_base is None:
+            raise ValueError(f"Cannot convert {quantity} from {from_unit} to {to_unit}.")
+        return to_base, from_base
+
+    def convert(self, value, quantity, from_unit, to_unit):
+        """
+        Converts a value between two units of the same quantity.
+        Raises KeyError if a unit does not exist and ValueError if the conversion is not supported.
+        """
+        if from_unit == to_unit:
+            return value
+
+        to_base, from_base = self._conversion(quantity, from_unit, to_unit)
+        return from_base(to_base(value))
+
+    def convert_many(self, values, quantity, from_unit, to_unit):
+        """Converts a sequence of values between two units of the same quantity, see convert()."""
+        if from_unit == to_unit:
+            return list(values)
+
+        to_base, from_base = self._conversion(quantity, from_unit, to_unit)
+        return [from_base(to_base(value)) for value in values]
+
+@functools.lru_cache(maxsize=None)
+def load_unit_index(path=None):
+    """
+    Loads the index generated by Tools/generate_units_doc.py. The pickle (if present and
+    not older than the JSON file) is preferred because it's faster to load.
+    """
+    path = path or UNITS_INDEX_PATH
+    pickle_path = os.path.splitext(path)[0] + ".pickle"
+    if os.path.exists(pickle_path) and (not os.path.exists(path) or os.path.getmtime(pickle_path) >= os.path.getmtime(path)):
+        with open(pickle_path, "rb") as f:
+            return UnitIndex(pickle.load(f))
+
+    with open(path, "r", encoding="utf-8") as f:
+        return UnitIndex(json.load(f))
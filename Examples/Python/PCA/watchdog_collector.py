@@ -0,0 +1,196 @@
+import os
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from tw_grpc import load_service
+
+# Collects the resources used by each runner (polling Watchdog.List()) for capacity planning.
+# Memory is fixed, regardless of the uptime: each runner has a ring buffer for each resolution in
+# ROLLUP_LEVELS, with the (factor, capacity) of each level. The first level keeps the raw samples,
+# each following level keeps the average of `factor` samples (counted at the poll interval). With the
+# defaults (and polling every 5 seconds) you have 1 hour of raw samples, 12 hours at 1 minute and
+# about 6 days at 12 minutes.
+# Example:
+#   collector = WatchdogCollector(factory.stub("Tinkwell.Watchdog", watchdog_pb2_grpc.WatchdogStub))
+#   collector.start()
+#   ...
+#   collector.export("watchdog.npz")
+POLL_INTERVAL_SEC = 5.0
+ROLLUP_LEVELS = [(1, 720), (12, 720), (144, 720)]
+FIELDS = ("cpu_utilization", "memory_usage", "peak_memory_usage", "thread_count", "handle_count")
+WATCHDOG_SERVICE_NAME = "Tinkwell.Watchdog"
+
+watchdog_pb2, watchdog_pb2_grpc = load_service("watchdog")
+
+class RingBuffer:
+    """Fixed size buffer of (time, values) rows, when it's full the oldest row is overwritten."""
+    def __init__(self, capacity, field_count):
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros((capacity, field_count), dtype=np.float32)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, values):
+        self._times[self._next] = timestamp
+        self._values[self._next] = values
+        self._next = (self._next + 1) % len(self._times)
+        self._count = min(self._count + 1, len(self._times))
+
+    def to_arrays(self):
+        """Returns (times, values) in chronological order (as copies)."""
+        if self._count < len(self._times):
+            return self._times[:self._count].copy(), self._values[:self._count].copy()
+        order = np.roll(np.arange(len(self._times)), -self._next)
+        return self._times[order], self._values[order]
+
+class RunnerSeries:
+    """Multi-resolution series of the resources used by a runner, see ROLLUP_LEVELS."""
+    def __init__(self, levels=ROLLUP_LEVELS):
+        self.levels = [RingBuffer(capacity, len(FIELDS)) for _, capacity in levels]
+        # Samples (from the previous level) to aggregate for each rollup
+        self._ratios = [current[0] // previous[0] for previous, current in zip(levels, levels[1:])]
+        self._sums = [np.zeros(len(FIELDS), dtype=np.float64) for _ in self._ratios]
+        self._counts = [0] * len(self._ratios)
+        self._start_times = [None] * len(self._ratios)
+
+    def append(self, timestamp, values):
+        self.levels[0].append(timestamp, values)
+        for i, ratio in enumerate(self._ratios):
+            if self._counts[i] == 0:
+                self._start_times[i] = timestamp
+            self._sums[i] += values
+            self._counts[i] += 1
+            if self._counts[i] < ratio:
+                break
+
+            # The rollup is complete: it's a new sample for the next level (and maybe for the next rollup)
+            values = self._sums[i] / self._counts[i]
+            timestamp = self._start_times[i]
+            self.levels[i + 1].append(timestamp, values)
+            self._sums[i] = np.zeros(len(FIELDS), dtype=np.float64)
+            self._counts[i] = 0
+
+class WatchdogCollector:
+    def __init__(self, watchdog, interval=POLL_INTERVAL_SEC, query=None, levels=ROLLUP_LEVELS):
+        self._watchdog = watchdog
+        self._interval = interval
+        self._query = query
+        self._levels = levels
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.runners = {} # runner name => RunnerSeries
+        self.polls = 0
+        self.failed_polls = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._polling_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout=self._interval * 2)
+            self._thread = None
+
+    def _polling_loop(self):
+        next_poll = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.failed_polls += 1
+                print(f"Could not read the status of the runners: {e}")
+
+            # Fixed rate (not fixed delay), a slow call does not shift all the following samples
+            next_poll += self._interval
+            self._stop_event.wait(max(0.0, next_poll - time.monotonic()))
+
+    def poll_once(self):
+        request = watchdog_pb2.WatchdogListRequest()
+        if self._query is not None:
+            request.query = self._query
+
+        reply = self._watchdog.List(request, timeout=self._interval)
+        now = time.time()
+        with self._lock:
+            for runner in reply.runners:
+                series = self.runners.get(runner.name)
+                if series is None:
+                    series = RunnerSeries(self._levels)
+                    self.runners[runner.name] = series
+
+                timestamp = runner.timestamp.ToNanoseconds() / 1e9 if runner.HasField("timestamp") else now
+                resources = runner.resources
+                series.append(timestamp, (resources.cpu_utilization, resources.memory_usage, resources.peak_memory_usage,
+                                          resources.thread_count, resources.handle_count))
+            self.polls += 1
+
+    def export(self, path):
+        """
+        Saves a (compressed) snapshot of all the series, see load_snapshot(). The file is written
+        to a temporary name and then renamed, readers never see a partial snapshot.
+        """
+        arrays = {"fields": np.array(FIELDS), "levels": np.array(self._levels)}
+        with self._lock:
+            names = sorted(self.runners.keys())
+            for i, name in enumerate(names):
+                for level, buffer in enumerate(self.runners[name].levels):
+                    times, values = buffer.to_arrays()
+                    arrays[f"r{i}_l{level}_times"] = times
+                    arrays[f"r{i}_l{level}_values"] = values
+        arrays["runners"] = np.array(names)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+
+def load_snapshot(path):
+    """
+    Loads a snapshot saved with WatchdogCollector.export(), returns a dictionary
+    runner name => list (one item for each level) of (times, values), and the names of the fields.
+    """
+    with np.load(path) as snapshot:
+        level_count = len(snapshot["levels"])
+        runners = {}
+        for i, name in enumerate(snapshot["runners"]):
+            runners[str(name)] = [(snapshot[f"r{i}_l{level}_times"], snapshot[f"r{i}_l{level}_values"]) for level in range(level_count)]
+        return runners, [str(field) for field in snapshot["fields"]]
+
+def main():
+    from tw_client import TinkwellClientFactory
+
+    parser = argparse.ArgumentParser(description="Collects the resources used by the runners for capacity planning.")
+    parser.add_argument("--discovery", help="Address of the Discovery service (default: TINKWELL_DISCOVERY_SERVICE_ADDRESS).")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SEC, help="Polling interval (seconds).")
+    parser.add_argument("--query", help="Collect only the runners whose name contains this text.")
+    parser.add_argument("--output", default="watchdog.npz", help="Path of the snapshot file.")
+    parser.add_argument("--export-every", type=float, default=60.0, help="How often the snapshot is saved (seconds).")
+    args = parser.parse_args()
+
+    with TinkwellClientFactory(args.discovery) as factory:
+        collector = WatchdogCollector(factory.stub(WATCHDOG_SERVICE_NAME, watchdog_pb2_grpc.WatchdogStub), args.interval, args.query)
+        collector.start()
+        print(f"Collecting runners resources every {args.interval} seconds (press Ctrl+C to exit)...")
+        try:
+            while True:
+                time.sleep(args.export_every)
+                collector.export(args.output)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.stop()
+            collector.export(args.output)
+            print(f"Saved {len(collector.runners)} runners to {args.output}")
+
+if __name__ == "__main__":
+    main()
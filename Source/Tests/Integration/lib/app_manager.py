@@ -1,12 +1,17 @@
 import subprocess
 import os
+import sys
+import signal
 import tempfile
+import threading
+import queue
 import uuid
 import time
 
 import socket
 
 from lib.tw_cli import TwCli
+from lib.test_staging import remove_tree
 from lib.colors import *
 from lib.settings import *
 
@@ -19,6 +24,8 @@ class TestContext:
         self.server_certificate_path = "" # Will be set by create_temp_tinkwell_env
         self.client_certificate_path = "" # Will be set by create_temp_tinkwell_env
         self.app_port = None # New: Store the dynamically assigned port
+        self.perf_results = {} # Metrics recorded by performance tests (see lib/perf.py)
+        self.resource_usage = {} # Summary of the resources used by the application (see lib/resource_sampler.py)
 
 def find_available_port():
     """Finds an available port on localhost, or defaults to DEFAULT_HOST_PORT if an error occurs."""
@@ -33,7 +40,8 @@ def find_available_port():
 def create_temp_tinkwell_env(context, test_name):
     """
     Creates a temporary directory for a Tinkwell test environment with required subfolders.
-    Updates the context with temp_dir and client_certificate_path.
+    Updates the context with temp_dir and app_port. Certificates are created with
+    create_tinkwell_certificates().
     """
     print(f"{COLOR_DARK_GRAY}Creating isolated environment...{COLOR_RESET}")
 
@@ -51,6 +59,11 @@ def create_temp_tinkwell_env(context, test_name):
     os.makedirs(os.path.join(context.temp_dir, "App"), exist_ok=True)
     os.makedirs(os.path.join(context.temp_dir, "Cert"), exist_ok=True)
 
+def create_tinkwell_certificates(context):
+    """
+    Creates the self-signed certificate for the environment created with create_temp_tinkwell_env().
+    Updates the context with server_certificate_path and client_certificate_path.
+    """
     print(f"{COLOR_DARK_GRAY}Creating self-signed certificate...{COLOR_RESET}")
     tw_cli = TwCli(context)
     tw_cli.create_cert(
@@ -91,31 +104,153 @@ def start_tinkwell_app(context, verbose=False):
     stdout_redirect = None if verbose else subprocess.PIPE
     stderr_redirect = None if verbose else subprocess.PIPE
 
-    process = subprocess.Popen(command, stdout=stdout_redirect, stderr=stderr_redirect, env=env, cwd=context.temp_dir)
+    # The supervisor runs in its own process group (all the runners it starts inherit it), this
+    # way we can terminate the whole process tree if it does not shutdown gracefully.
+    if sys.platform == "win32":
+        group_options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group_options = {"start_new_session": True}
+
+    process = subprocess.Popen(command, stdout=stdout_redirect, stderr=stderr_redirect, env=env, cwd=context.temp_dir, **group_options)
     print(f"{COLOR_DARK_GRAY}Application started with PID{COLOR_RESET} {process.pid}")
     return process
 
+def _signal_process_tree(process, force):
+    """
+    Sends SIGTERM (or SIGKILL when force is True) to the supervisor and all its child processes.
+    """
+    if sys.platform == "win32":
+        command = ["taskkill", "/PID", str(process.pid), "/T"] + (["/F"] if force else [])
+        subprocess.run(command, capture_output=True, check=False)
+        return
+
+    # With start_new_session the process group ID is the PID of the supervisor, it's still valid
+    # after the supervisor exited (and os.getpgid() would fail) as long as one of its runners is alive.
+    try:
+        os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except ProcessLookupError:
+        pass # Already gone
+
+def _process_group_alive(process):
+    try:
+        os.killpg(process.pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _stop_process_group(process):
+    """
+    Terminates the runners left behind by the supervisor (after it exited): SIGTERM to the whole
+    process group and then, if some of them are still alive, SIGKILL.
+    """
+    if sys.platform == "win32" or not _process_group_alive(process):
+        return
+
+    _signal_process_tree(process, force=False)
+    deadline = time.monotonic() + TERMINATE_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if not _process_group_alive(process):
+            return
+        time.sleep(0.1)
+
+    print(f"{COLOR_DARK_GRAY}Some processes started by the application (PID: {process.pid}) did not terminate, killing...{COLOR_RESET}")
+    _signal_process_tree(process, force=True)
+
+def _wait_for_exit(process, timeout):
+    try:
+        process.wait(timeout=timeout)
+        return True
+    except subprocess.TimeoutExpired:
+        return False
+
 def stop_tinkwell_app(process, context):
     """
     Stops the Tinkwell application subprocess, attempting graceful shutdown first.
+    If the application does not exit in time then we escalate to SIGTERM and then to SIGKILL,
+    sent to the whole process tree. When the supervisor exited, its process group is always
+    terminated too: no runner outlives the test.
     """
-    if process.poll() is None: # Check if the process is still running
-        try:
-            # Attempt graceful shutdown sending the shutdown command
-            tw_cli = TwCli(context)
-            tw_cli.send_shutdown()
-            time.sleep(GRACEFUL_SHUTDOWN_SECONDS) # Wait for graceful shutdown
-
-            if process.poll() is None: # Check if still running after graceful attempt
-                print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) did not terminate gracefully, killing...{COLOR_RESET}")
-                process.kill()
-                process.wait()
-            else:
-                print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) terminated gracefully.{COLOR_RESET}")
-
-        except Exception as e: # Catch general Exception for robustness
-            print(f"{COLOR_RED}Error during graceful shutdown attempt for PID {process.pid}: {e}. Forcing kill...{COLOR_RESET}")
-            process.kill()
-            process.wait()
-    else:
-        print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) was already stopped.{COLOR_RESET}")
\ No newline at end of file
+    try:
+        _stop_supervisor(process, context)
+    finally:
+        _stop_process_group(process)
+
+def _stop_supervisor(process, context):
+    if process.poll() is not None: # Check if the process is still running
+        print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) was already stopped.{COLOR_RESET}")
+        return
+
+    try:
+        # Attempt graceful shutdown sending the shutdown command
+        tw_cli = TwCli(context)
+        tw_cli.send_shutdown()
+        if _wait_for_exit(process, GRACEFUL_SHUTDOWN_SECONDS):
+            print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) terminated gracefully.{COLOR_RESET}")
+            return
+        print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) did not terminate gracefully, terminating...{COLOR_RESET}")
+    except Exception as e: # Catch general Exception for robustness
+        print(f"{COLOR_RED}Error during graceful shutdown attempt for PID {process.pid}: {e}. Terminating...{COLOR_RESET}")
+
+    _signal_process_tree(process, force=False)
+    if _wait_for_exit(process, TERMINATE_TIMEOUT_SECONDS):
+        print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) terminated.{COLOR_RESET}")
+        return
+
+    print(f"{COLOR_DARK_GRAY}Application (PID: {process.pid}) did not terminate, killing...{COLOR_RESET}")
+    _signal_process_tree(process, force=True)
+    process.wait()
+
+class _TempDirCleaner:
+    """
+    Deletes temporary directories in a background thread, we do not want to wait
+    for a (possibly big) directory tree to be deleted before running the next test.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, path):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put(path)
+
+    def wait(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                # Files might still be locked for a short time after the application exited (Windows)
+                for attempt in range(1, CLEANUP_RETRIES + 1):
+                    try:
+                        remove_tree(path)
+                        break
+                    except FileNotFoundError:
+                        break
+                    except OSError as e:
+                        if attempt == CLEANUP_RETRIES:
+                            print(f"{COLOR_YELLOW}Warning: could not delete {COLOR_BLUE}{path}{COLOR_YELLOW} ({e}).{COLOR_RESET}")
+                        else:
+                            time.sleep(CLEANUP_RETRY_WAIT_SECONDS)
+            finally:
+                self._queue.task_done()
+
+_temp_dir_cleaner = _TempDirCleaner()
+
+def delete_temp_tinkwell_env(context):
+    """
+    Schedules the deletion of the temporary directory created with create_temp_tinkwell_env().
+    """
+    _temp_dir_cleaner.schedule(context.temp_dir)
+
+def wait_for_pending_cleanups():
+    """
+    Waits until all the temporary directories scheduled for deletion have been deleted.
+    """
+    _temp_dir_cleaner.wait()
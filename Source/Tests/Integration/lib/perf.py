@@ -0,0 +1,219 @@
+import threading
+import time
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.colors import *
+
+# Helpers for performance/load tests (TRAIT = "perf"). Tests drive writes into the Store
+# with the CLI, observe changes with one or more 'tw measures subscribe' processes and
+# then check the results against the budgets declared in the test module, for example:
+#
+#   PERF_BUDGETS = {
+#       "propagation.p99_ms": 2000,     # Upper bound
+#       "writes.per_second": (5, None), # Lower bound
+#   }
+#
+# A budget is "metric": max or "metric": (min, max) where either bound can be None.
+# Metrics are the keys produced by summarize_latencies() and measure_throughput(),
+# prefixed with the name the test used when recording them with PerfResults.
+
+# Changes written to check that a subscription is established are written again after this interval
+PROBE_RETRY_SECONDS = 1.0
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize_latencies(latencies_sec):
+    """
+    Summarizes a list of latencies (in seconds).
+    Returns a dictionary with count, mean_ms, p50_ms, p95_ms, p99_ms and max_ms.
+    """
+    values = sorted(latencies_sec)
+    if not values:
+        return {"count": 0}
+
+    to_ms = lambda value: round(value * 1000, 3)
+    return {
+        "count": len(values),
+        "mean_ms": to_ms(sum(values) / len(values)),
+        "p50_ms": to_ms(percentile(values, 50)),
+        "p95_ms": to_ms(percentile(values, 95)),
+        "p99_ms": to_ms(percentile(values, 99)),
+        "max_ms": to_ms(values[-1]),
+    }
+
+def measure_throughput(count, elapsed_sec):
+    return {"count": count, "seconds": round(elapsed_sec, 3), "per_second": round(count / elapsed_sec, 3) if elapsed_sec > 0 else 0.0}
+
+class MeasureSubscription:
+    """
+    Runs 'tw measures subscribe' in background and records each change it receives
+    with the (monotonic) time it has been received. Use it as a context manager.
+    """
+    def __init__(self, tw_cli, measure_names):
+        self._tw_cli = tw_cli
+        self._measure_names = list(measure_names)
+        self._process = None
+        self._thread = None
+        self._condition = threading.Condition()
+        self._updates = [] # (received_at, name, value)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._process = self._tw_cli.start_command("measures", "subscribe", *self._measure_names, "--stdout-format=tooling")
+        self._thread = threading.Thread(target=self._read_stdout, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except Exception:
+                self._process.kill()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _read_stdout(self):
+        for line in self._process.stdout:
+            received_at = time.monotonic()
+            name, separator, value = line.strip().partition("=")
+            if not separator:
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            with self._condition:
+                self._updates.append((received_at, name, value))
+                self._condition.notify_all()
+
+    def wait_for(self, predicate, timeout):
+        """
+        Waits until an update (received_at, name, value) satisfies the predicate.
+        Returns the update or None if it timed out.
+        """
+        deadline = time.monotonic() + timeout
+        checked = 0
+        with self._condition:
+            while True:
+                for update in self._updates[checked:]:
+                    if predicate(*update):
+                        return update
+                checked = len(self._updates)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def wait_until_ready(self, timeout):
+        """
+        Waits for the initial values. Note that they're read before subscribing to the changes, a change
+        made right after could be missed: use wait_until_subscribed() before measuring anything.
+        Returns True if the initial values have been received.
+        """
+        return self.wait_for(lambda received_at, name, value: True, timeout) is not None
+
+    def updates(self, name=None):
+        with self._condition:
+            return [update for update in self._updates if name is None or update[1] == name]
+
+def wait_until_subscribed(subscriptions, probe, timeout, retry_interval=PROBE_RETRY_SECONDS):
+    """
+    Waits until all the subscriptions receive a change (not just the initial values, they're printed
+    before the subscription to the changes is established). probe(attempt) writes a value (a different
+    one for each attempt) and returns a predicate(received_at, name, value) for the change it causes,
+    it's called again until all the subscriptions observed one of the probes.
+    Returns True if all the subscriptions are ready.
+    """
+    deadline = time.monotonic() + timeout
+    predicates = []
+    matches_probe = lambda received_at, name, value: any(predicate(received_at, name, value) for predicate in predicates)
+    pending = list(subscriptions)
+    attempt = 0
+    while pending and time.monotonic() < deadline:
+        predicate = probe(attempt)
+        if predicate is not None:
+            predicates.append(predicate)
+        attempt += 1
+        wait_until = min(deadline, time.monotonic() + retry_interval)
+        pending = [subscription for subscription in pending
+                   if subscription.wait_for(matches_probe, max(0.0, wait_until - time.monotonic())) is None]
+    return not pending
+
+class TimedWrite:
+    def __init__(self, name, value, unit, started_at, completed_at, succeeded):
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.started_at = started_at
+        self.completed_at = completed_at
+        self.succeeded = succeeded
+
+def write_measure(tw_cli, name, value, unit=""):
+    """Writes a measure and returns a TimedWrite with the time the Store accepted it."""
+    started_at = time.monotonic()
+    value_with_unit = f"{value} {unit}" if unit else f"{value}"
+    result = tw_cli.run_command("measures", "write", name, value_with_unit, "--stdout-format=tooling")
+    return TimedWrite(name, value, unit, started_at, time.monotonic(), result["returncode"] == 0)
+
+def drive_writes(tw_cli, name, values, unit="", writes_per_second=10, concurrency=4):
+    """
+    Writes all the values to a measure trying to keep a sustained rate of writes_per_second
+    (each write is a separate CLI invocation, concurrency of them can be in-flight).
+    Returns (list of TimedWrite, elapsed seconds).
+    """
+    interval = 1.0 / writes_per_second
+    futures = []
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, value in enumerate(values):
+            # Pacing is relative to the start (not to the previous write) to avoid drifting
+            delay = start + index * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(write_measure, tw_cli, name, value, unit))
+        writes = [future.result() for future in futures]
+    return writes, time.monotonic() - start
+
+class PerfResults:
+    """Performance metrics recorded by a test, they're reported together with the functional results."""
+    def __init__(self, context):
+        self._metrics = context.perf_results
+
+    def record(self, prefix, metrics):
+        for key, value in metrics.items():
+            self._metrics[f"{prefix}.{key}"] = value
+
+    def check_budgets(self, budgets):
+        """
+        Checks the recorded metrics against the budgets.
+        Returns None if they're all satisfied, otherwise a failure message (suitable to be returned by run_test()).
+        """
+        failures = []
+        for metric, budget in budgets.items():
+            min_value, max_value = budget if isinstance(budget, (tuple, list)) else (None, budget)
+            value = self._metrics.get(metric)
+            if value is None:
+                failures.append(f"{metric} has not been measured")
+            elif min_value is not None and value < min_value:
+                failures.append(f"{metric} is {value} (minimum {min_value})")
+            elif max_value is not None and value > max_value:
+                failures.append(f"{metric} is {value} (maximum {max_value})")
+
+        for metric in sorted(self._metrics):
+            color = COLOR_RED if any(failure.startswith(f"{metric} ") for failure in failures) else COLOR_DARK_GRAY
+            print(f"{color}{metric}: {COLOR_RESET}{self._metrics[metric]}")
+
+        return "Performance budget exceeded: " + ", ".join(failures) if failures else None
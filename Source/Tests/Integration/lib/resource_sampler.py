@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import threading
+from lib.colors import *
+from lib.settings import *
+
+# Samples the resources used by the supervisor and all its child processes (runners) reading
+# /proc at a fixed interval. It's available only on Linux, elsewhere it does nothing.
+
+def is_supported():
+    return sys.platform.startswith("linux") and os.path.isdir("/proc")
+
+def _read_stat(pid):
+    """Returns (ppid, cpu_seconds, threads) for a process reading /proc/<pid>/stat."""
+    with open(f"/proc/{pid}/stat", "r") as f:
+        content = f.read()
+
+    # The process name (2nd field) is in parentheses and it can contain spaces
+    fields = content[content.rindex(")") + 2:].split()
+    ppid = int(fields[1])
+    cpu_ticks = int(fields[11]) + int(fields[12]) # utime + stime
+    threads = int(fields[17])
+    return ppid, cpu_ticks / _CLOCK_TICKS, threads
+
+def _read_rss(pid):
+    with open(f"/proc/{pid}/statm", "r") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+def _count_fds(pid):
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return 0 # Not allowed to read them (or the process is gone)
+
+if is_supported():
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def find_process_tree(root_pid):
+    """Returns the list of PIDs of root_pid and all its descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid = _read_stat(int(entry))[0]
+        except (OSError, ValueError, IndexError):
+            continue # The process exited while we were reading it
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree = []
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, []))
+    return tree
+
+class ResourceSample:
+    __slots__ = ("time", "processes", "rss", "cpu", "threads", "fds")
+
+    def __init__(self, time, processes, rss, cpu, threads, fds):
+        self.time = time
+        self.processes = processes
+        self.rss = rss
+        self.cpu = cpu
+        self.threads = threads
+        self.fds = fds
+
+class ResourceSampler:
+    """
+    Samples (in a background thread) RSS, CPU time, thread count and open file descriptors
+    of a process and all its descendants. Values are the totals for the whole process tree.
+    """
+    def __init__(self, pid, interval=RESOURCE_SAMPLING_INTERVAL_SECONDS):
+        self._pid = pid
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start = None
+        self.samples = []
+
+    def start(self):
+        if not is_supported():
+            print(f"{COLOR_DARK_GRAY}Resource sampling is not supported on this platform.{COLOR_RESET}")
+            return
+
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._sampling_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(timeout=self._interval * 2)
+            self._thread = None
+
+    def _sampling_loop(self):
+        while not self._stop_event.is_set():
+            sample = self._take_sample()
+            if sample is not None:
+                self.samples.append(sample)
+            self._stop_event.wait(self._interval)
+
+    def _take_sample(self):
+        rss = cpu = threads = fds = processes = 0
+        for pid in find_process_tree(self._pid):
+            try:
+                _, process_cpu, process_threads = _read_stat(pid)
+                rss += _read_rss(pid)
+                cpu += process_cpu
+                threads += process_threads
+                fds += _count_fds(pid)
+                processes += 1
+            except (OSError, ValueError, IndexError):
+                continue # The process exited while we were reading it
+
+        if processes == 0:
+            return None
+        return ResourceSample(time.monotonic() - self._start, processes, rss, cpu, threads, fds)
+
+    def summary(self):
+        """Returns peak and growth of the sampled values, an empty dictionary if there are no samples."""
+        if not self.samples:
+            return {}
+
+        first, last = self.samples[0], self.samples[-1]
+        to_mb = lambda value: round(value / (1024 * 1024), 2)
+        return {
+            "samples": len(self.samples),
+            "processes.peak": max(sample.processes for sample in self.samples),
+            "rss_mb.peak": to_mb(max(sample.rss for sample in self.samples)),
+            "rss_mb.growth": to_mb(last.rss - first.rss),
+            "cpu_seconds": round(last.cpu - first.cpu, 3),
+            "threads.peak": max(sample.threads for sample in self.samples),
+            "threads.growth": last.threads - first.threads,
+            "fds.peak": max(sample.fds for sample in self.samples),
+            "fds.growth": last.fds - first.fds,
+        }
+
+    def has_monotonic_memory_growth(self):
+        """
+        Checks whether memory keeps growing: the samples are split in SOAK_GROWTH_WINDOWS windows
+        and memory is growing if the average RSS never decreases from one window to the next one
+        and the total growth is at least SOAK_MIN_GROWTH_MB.
+        """
+        if len(self.samples) < SOAK_GROWTH_WINDOWS * 2:
+            return False
+
+        window_size = len(self.samples) // SOAK_GROWTH_WINDOWS
+        averages = []
+        for i in range(SOAK_GROWTH_WINDOWS):
+            window = self.samples[i * window_size:(i + 1) * window_size]
+            averages.append(sum(sample.rss for sample in window) / len(window))
+
+        never_decreasing = all(current >= previous for previous, current in zip(averages, averages[1:]))
+        return never_decreasing and (averages[-1] - averages[0]) >= SOAK_MIN_GROWTH_MB * 1024 * 1024
+
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("time,processes,rss,cpu,threads,fds\n")
+            for sample in self.samples:
+                f.write(f"{sample.time:.3f},{sample.processes},{sample.rss},{sample.cpu:.3f},{sample.threads},{sample.fds}\n")
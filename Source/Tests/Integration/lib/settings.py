@@ -11,8 +11,43 @@ DEFAULT_HOST_PORT = 5000
 INITIAL_WAIT_SECONDS = 5
 GRACEFUL_SHUTDOWN_SECONDS = 5
 
+# If the application does not exit after the shutdown command we send SIGTERM
+# to the whole process tree, waiting at most TERMINATE_TIMEOUT_SECONDS before
+# killing it.
+TERMINATE_TIMEOUT_SECONDS = 5
+
+# Temporary directories are deleted in background, files might still be locked
+# for a short time after the application exited.
+CLEANUP_RETRIES = 3
+CLEANUP_RETRY_WAIT_SECONDS = 1
+
 # The application might take longer to start, we ping
 # the supervisor to know if it's ready (at most MAX_PING_RETRIES,
 # waiting RETRY_WAIT_SECONDS between each attempt).
 RETRY_WAIT_SECONDS = 2
 MAX_PING_RETRIES = 5
+
+# Number of entries listed in the "slowest tests" and "slowest phases" sections of the report.
+REPORT_SLOWEST_COUNT = 5
+
+# When comparing with a baseline report (--compare) a test is flagged as a regression if it's
+# slower by more than REGRESSION_TOLERANCE_PERCENT and by at least REGRESSION_MIN_SECONDS
+# (short tests have a lot of noise).
+REGRESSION_TOLERANCE_PERCENT = 20
+REGRESSION_MIN_SECONDS = 1.0
+
+# Historical test durations (used to balance shards with --shard) are smoothed
+# with an exponential moving average, this is the weight of the latest run.
+TIMINGS_SMOOTHING_FACTOR = 0.5
+
+# Test data files the application might modify, they're cloned (or copied) into each test environment.
+# All the other files are hard links to a shared, read-only, template (unless --copy-test-data is used).
+STAGING_MUTABLE_FILE_PATTERNS = ["*.db", "*.db-*", "*.sqlite", "*.sqlite3", "*.json", "*.log"]
+
+# Interval between two samples of the resources used by the application (--resource-dir and --soak).
+RESOURCE_SAMPLING_INTERVAL_SECONDS = 1.0
+
+# In soak mode (--soak) memory is considered leaking if the average RSS never decreases across
+# SOAK_GROWTH_WINDOWS consecutive windows and it grew at least SOAK_MIN_GROWTH_MB in total.
+SOAK_GROWTH_WINDOWS = 10
+SOAK_MIN_GROWTH_MB = 10
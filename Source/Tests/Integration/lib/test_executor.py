@@ -1,11 +1,12 @@
 import os
 import time
-import shutil
-import importlib.util
-import sys
 
-from lib.app_manager import start_tinkwell_app, stop_tinkwell_app, create_temp_tinkwell_env
+from lib.app_manager import start_tinkwell_app, stop_tinkwell_app, create_temp_tinkwell_env, create_tinkwell_certificates, delete_temp_tinkwell_env
 from lib.tw_cli import TwCli, PingStatus
+from lib.test_scout import load_test_module
+from lib.test_staging import stage_test_data, verify_template
+from lib.resource_sampler import ResourceSampler
+from lib.test_timing import PhaseTimer, PHASE_ENVIRONMENT, PHASE_CERTIFICATE, PHASE_TEST_DATA, PHASE_STARTUP, PHASE_TEST, PHASE_SHUTDOWN, PHASE_CLEANUP
 from lib.colors import *
 from lib.formatting import calculate_elapsed_time
 from lib.settings import *
@@ -31,85 +32,128 @@ def wait_for_tinkwell_ready(tw_cli):
     print(f"  {COLOR_RED}Tinkwell supervisor did not become ready after {MAX_PING_RETRIES} attempts. Aborting test.{COLOR_RESET}")
     return False
 
-def execute_test(test_name, test_file_path, context, keep_temp_dir, verbose):
+def _run_test_logic(test_module, tw_cli, context):
+    test_result = test_module.run_test(tw_cli, context)
+
+    if isinstance(test_result, bool):
+        return test_result, None
+    elif isinstance(test_result, str):
+        return False, test_result
+    else:
+        return False, f"Invalid return type from run_test: {type(test_result)}"
+
+def execute_test(test_name, test_file_path, context, keep_temp_dir, verbose, resource_dir=None, soak_minutes=None, copy_test_data=False):
     """
     Executes a single integration test.
-    Returns a tuple (bool_passed, message). message can be None.
+    If resource_dir is specified then the resources used by the application are sampled and saved
+    in that directory (see lib/resource_sampler.py), their summary is stored in context.resource_usage.
+    If soak_minutes is specified then the test is executed repeatedly for that time and it fails
+    if the memory used by the application keeps growing.
+    With copy_test_data none of the test data files is a hard link to the shared template (see lib/test_staging.py).
+    Returns a tuple (bool_passed, message, timer). message can be None, timer is
+    the PhaseTimer with the time spent in each phase of the test.
     """
     app_process = None
+    sampler = None
     test_passed = False
     failure_message = None
+    timer = PhaseTimer()
+    staging_stats = None
 
     try:
-        start_time = time.time()
-
         # Create isolated environment
-        create_temp_tinkwell_env(context, test_name)
-
-        # Copy test-specific data if available
-        test_data_dir = os.path.join(os.path.dirname(test_file_path), test_name)
-        if os.path.isdir(test_data_dir):
-            print(f"{COLOR_DARK_GRAY}Copying test data from {COLOR_BLUE}.../{test_name}/{COLOR_DARK_GRAY} to {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
-            for item in os.listdir(test_data_dir):
-                s = os.path.join(test_data_dir, item)
-                d = os.path.join(context.temp_dir, item)
-                if os.path.isdir(s):
-                    shutil.copytree(s, d, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(s, d)
+        with timer.phase(PHASE_ENVIRONMENT):
+            create_temp_tinkwell_env(context, test_name)
+
+        with timer.phase(PHASE_CERTIFICATE):
+            create_tinkwell_certificates(context)
+
+        # Copy (stage) test-specific data if available
+        with timer.phase(PHASE_TEST_DATA):
+            test_data_dir = os.path.join(os.path.dirname(test_file_path), test_name)
+            if os.path.isdir(test_data_dir):
+                print(f"{COLOR_DARK_GRAY}Staging test data from {COLOR_BLUE}.../{test_name}/{COLOR_DARK_GRAY} to {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
+                staging_stats = stage_test_data(test_name, test_data_dir, context.temp_dir, link_files=not copy_test_data)
+                print(f"{COLOR_DARK_GRAY}Test data files: {COLOR_RESET}{staging_stats}")
 
         # Start the application and wait for it to be fully loaded
-        print(f"{COLOR_DARK_GRAY}Starting application {COLOR_BLUE}{context.app_dll_path}{COLOR_RESET}")
-        app_process = start_tinkwell_app(context, verbose)
-
-        tw_cli = TwCli(context)
-        if not wait_for_tinkwell_ready(tw_cli):
-            return False, "Tinkwell did not become ready for this test."
-
-        # Load and execute the individual test module
-        spec = importlib.util.spec_from_file_location(test_name, test_file_path)
-        test_module = importlib.util.module_from_spec(spec)
-        sys.modules[test_name] = test_module
-        spec.loader.exec_module(test_module)
-
-        if hasattr(test_module, 'run_test'):
-            print(f"Executing test logic for {COLOR_CYAN}{test_name}{COLOR_RESET}...")
-            # tw_cli is already initialized for health check, reuse it
-            test_result = test_module.run_test(tw_cli, context)
-            
-            if isinstance(test_result, bool):
-                test_passed = test_result
-            elif isinstance(test_result, str):
-                test_passed = False
-                failure_message = test_result
-            else:
-                test_passed = False
-                failure_message = f"Invalid return type from run_test: {type(test_result)}"
+        with timer.phase(PHASE_STARTUP):
+            print(f"{COLOR_DARK_GRAY}Starting application {COLOR_BLUE}{context.app_dll_path}{COLOR_RESET}")
+            app_process = start_tinkwell_app(context, verbose)
 
-        else:
-            test_passed = False
-            failure_message = f"Test file '{test_file_path}' does not contain a 'run_test' function."
+            if resource_dir or soak_minutes:
+                sampler = ResourceSampler(app_process.pid)
+                sampler.start()
+
+            tw_cli = TwCli(context)
+            is_ready = wait_for_tinkwell_ready(tw_cli)
 
-        if test_passed:
-            print(f"Result for {COLOR_CYAN}{test_name}{COLOR_RESET} is {COLOR_GREEN}PASSED{COLOR_RESET}")
+        if not is_ready:
+            failure_message = "Tinkwell did not become ready for this test."
         else:
-            print(f"Result for {COLOR_CYAN}{test_name}{COLOR_RESET} is {COLOR_RED}FAILED{COLOR_RESET}")
+            with timer.phase(PHASE_TEST):
+                # Load and execute the individual test module
+                test_module = load_test_module(test_name, test_file_path)
+
+                if hasattr(test_module, 'run_test'):
+                    print(f"Executing test logic for {COLOR_CYAN}{test_name}{COLOR_RESET}...")
+                    # tw_cli is already initialized for health check, reuse it
+                    test_passed, failure_message = _run_test_logic(test_module, tw_cli, context)
+
+                    # In soak mode we keep the application busy running the same test, until it fails or time is up
+                    if soak_minutes:
+                        print(f"{COLOR_DARK_GRAY}Soaking for {COLOR_RESET}{soak_minutes} minutes{COLOR_DARK_GRAY}...{COLOR_RESET}")
+                        soak_deadline = time.monotonic() + soak_minutes * 60
+                        while test_passed and time.monotonic() < soak_deadline:
+                            test_passed, failure_message = _run_test_logic(test_module, tw_cli, context)
+
+                else:
+                    test_passed = False
+                    failure_message = f"Test file '{test_file_path}' does not contain a 'run_test' function."
+
+            if sampler:
+                sampler.stop()
+                if soak_minutes and test_passed and sampler.has_monotonic_memory_growth():
+                    test_passed = False
+                    failure_message = "Memory of the application kept growing during the soak test."
+
+            if test_passed:
+                print(f"Result for {COLOR_CYAN}{test_name}{COLOR_RESET} is {COLOR_GREEN}PASSED{COLOR_RESET}")
+            else:
+                print(f"Result for {COLOR_CYAN}{test_name}{COLOR_RESET} is {COLOR_RED}FAILED{COLOR_RESET}")
     except Exception as e:
         test_passed = False
         failure_message = f"An unexpected error occurred: {e}"
         print(f"  {COLOR_RED}{failure_message}{COLOR_RESET}")
     finally:
         print(f"{COLOR_DARK_GRAY}Shutting down...{COLOR_RESET}")
-        if app_process:
-            print(f"{COLOR_DARK_GRAY}Stopping application...{COLOR_RESET}")
-            stop_tinkwell_app(app_process, context)
+        with timer.phase(PHASE_SHUTDOWN):
+            if sampler:
+                sampler.stop()
+                context.resource_usage = sampler.summary()
+                if resource_dir and sampler.samples:
+                    os.makedirs(resource_dir, exist_ok=True)
+                    resources_path = os.path.join(resource_dir, f"{test_name}.resources.csv")
+                    sampler.write_csv(resources_path)
+                    print(f"{COLOR_DARK_GRAY}Resource usage saved as {COLOR_BLUE}{resources_path}{COLOR_RESET}")
+
+            if app_process:
+                print(f"{COLOR_DARK_GRAY}Stopping application...{COLOR_RESET}")
+                stop_tinkwell_app(app_process, context)
+
+            # Linked files are shared with the template, the test must not have changed them
+            if staging_stats and staging_stats.linked and not verify_template(staging_stats.template_dir):
+                test_passed = False
+                failure_message = "The test modified linked test data files, add them to STAGING_MUTABLE_FILE_PATTERNS (or use --copy-test-data)."
 
         print(f"{COLOR_DARK_GRAY}Cleaning up...{COLOR_RESET}")
-        if context.temp_dir and os.path.exists(context.temp_dir) and not keep_temp_dir:
-            print(f"{COLOR_DARK_GRAY}Deleting temporary directory {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
-            shutil.rmtree(context.temp_dir)
-        elif context.temp_dir and keep_temp_dir:
-            print(f"{COLOR_DARK_GRAY}Keeping temporary directory {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
-
-    print(f"{COLOR_DARK_GRAY}Time: {COLOR_RESET}{calculate_elapsed_time(start_time, time.time())}")
-    return test_passed, failure_message
+        with timer.phase(PHASE_CLEANUP):
+            if context.temp_dir and os.path.exists(context.temp_dir) and not keep_temp_dir:
+                print(f"{COLOR_DARK_GRAY}Deleting temporary directory {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
+                delete_temp_tinkwell_env(context)
+            elif context.temp_dir and keep_temp_dir:
+                print(f"{COLOR_DARK_GRAY}Keeping temporary directory {COLOR_BLUE}{context.temp_dir}{COLOR_RESET}")
+
+    timer.stop()
+    print(f"{COLOR_DARK_GRAY}Time: {COLOR_RESET}{calculate_elapsed_time(0, timer.duration)}")
+    return test_passed, failure_message, timer
@@ -1,13 +1,135 @@
 import sys
 import time
+import json
+import datetime
+import xml.etree.ElementTree as ET
 from lib.colors import *
 from lib.formatting import calculate_elapsed_time
+from lib.settings import *
 
-def generate_report(results, start_time):
+REPORT_FORMAT_VERSION = 1
+
+def _print_slowest(results):
+    timed = [(test, data) for test, data in results.items() if "duration" in data]
+    if not timed:
+        return
+
+    print(f"\n{COLOR_YELLOW}SLOWEST TESTS{COLOR_RESET}")
+    for test, data in sorted(timed, key=lambda x: x[1]["duration"], reverse=True)[:REPORT_SLOWEST_COUNT]:
+        print(f"{COLOR_CYAN}{test}{COLOR_RESET}: {data['duration']:.2f}s")
+
+    # Total time spent in each phase (to see where the time goes overall) and the slowest
+    # single phases (to see which test is responsible for it).
+    phase_totals = {}
+    all_phases = []
+    for test, data in timed:
+        for phase, seconds in data.get("phases", {}).items():
+            phase_totals[phase] = phase_totals.get(phase, 0.0) + seconds
+            all_phases.append((seconds, test, phase))
+
+    if phase_totals:
+        print(f"\n{COLOR_YELLOW}TIME BY PHASE{COLOR_RESET}")
+        for phase, seconds in sorted(phase_totals.items(), key=lambda x: x[1], reverse=True):
+            print(f"{COLOR_CYAN}{phase}{COLOR_RESET}: {seconds:.2f}s")
+
+        print(f"\n{COLOR_YELLOW}SLOWEST PHASES{COLOR_RESET}")
+        for seconds, test, phase in sorted(all_phases, reverse=True)[:REPORT_SLOWEST_COUNT]:
+            print(f"{COLOR_CYAN}{test}{COLOR_RESET} ({phase}): {seconds:.2f}s")
+
+def _print_metrics(results, key, title):
+    measured = [(test, data[key]) for test, data in results.items() if data.get(key)]
+    if not measured:
+        return
+
+    print(f"\n{COLOR_YELLOW}{title}{COLOR_RESET}")
+    for test, metrics in measured:
+        print(f"{COLOR_CYAN}{test}{COLOR_RESET}")
+        for metric, value in metrics.items():
+            print(f"  {COLOR_DARK_GRAY}{metric}: {COLOR_RESET}{value}")
+
+def _build_report(results, duration):
+    tests = []
+    for test, data in results.items():
+        tests.append({
+            "name": test,
+            "test_name": data.get("test_name", test),
+            "status": data["status"],
+            "message": data["message"],
+            "duration": data.get("duration"),
+            "phases": data.get("phases", {}),
+            "perf": data.get("perf", {}),
+            "resources": data.get("resources", {}),
+        })
+
+    return {
+        "version": REPORT_FORMAT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "duration": duration,
+        "tests": tests,
+    }
+
+def write_json_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+def write_junit_report(report, path):
+    failures = sum(1 for test in report["tests"] if test["status"] != "PASSED")
+    testsuites = ET.Element("testsuites", tests=str(len(report["tests"])), failures=str(failures), time=f"{report['duration']:.3f}")
+    testsuite = ET.SubElement(testsuites, "testsuite", name="Tinkwell.IntegrationTests", tests=str(len(report["tests"])),
+                              failures=str(failures), errors="0", skipped="0", time=f"{report['duration']:.3f}",
+                              timestamp=report["created_at"])
+
+    for test in report["tests"]:
+        testcase = ET.SubElement(testsuite, "testcase", classname="Tinkwell.IntegrationTests", name=test["name"],
+                                 time=f"{test['duration'] or 0:.3f}")
+        if test["phases"] or test["perf"] or test["resources"]:
+            properties = ET.SubElement(testcase, "properties")
+            for phase, seconds in test["phases"].items():
+                ET.SubElement(properties, "property", name=f"phase.{phase}", value=f"{seconds:.3f}")
+            for metric, value in test["perf"].items():
+                ET.SubElement(properties, "property", name=f"perf.{metric}", value=str(value))
+            for metric, value in test["resources"].items():
+                ET.SubElement(properties, "property", name=f"resources.{metric}", value=str(value))
+        if test["status"] != "PASSED":
+            ET.SubElement(testcase, "failure", message=test["message"] or "Test failed")
+
+    tree = ET.ElementTree(testsuites)
+    ET.indent(tree)
+    tree.write(path, encoding="utf-8", xml_declaration=True)
+
+def compare_with_baseline(report, baseline_path):
+    """
+    Compares the duration of each test with a previous JSON report.
+    Returns a list of (test, baseline_duration, duration) for the tests which are slower
+    than REGRESSION_TOLERANCE_PERCENT (and at least REGRESSION_MIN_SECONDS).
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    # Entries we do not understand (from other tools or older versions) are ignored
+    baseline_durations = {
+        test.get("name"): test.get("duration")
+        for test in baseline.get("tests", []) if isinstance(test, dict) and test.get("name")
+    }
+    regressions = []
+    for test in report["tests"]:
+        baseline_duration = baseline_durations.get(test["name"])
+        duration = test["duration"]
+        if baseline_duration is None or duration is None:
+            continue
+
+        delta = duration - baseline_duration
+        if delta >= REGRESSION_MIN_SECONDS and delta > baseline_duration * REGRESSION_TOLERANCE_PERCENT / 100:
+            regressions.append((test["name"], baseline_duration, duration))
+    return regressions
+
+def generate_report(results, start_time, json_path=None, junit_path=None, baseline_path=None, fail_on_regression=False):
+    """Prints the results and exits, with 1 if a test failed (or, with fail_on_regression, if a test is slower than the baseline)."""
     overall_success = True
     passed_count = 0
     failed_count = 0
     total_count = len(results)
+    duration = time.monotonic() - start_time
 
     print(f"{COLOR_YELLOW}\nTEST RESULTS{COLOR_RESET}")
     for test, result_data in results.items():
@@ -24,12 +146,40 @@ def generate_report(results, start_time):
             overall_success = False
             failed_count += 1
 
+    _print_slowest(results)
+    _print_metrics(results, "perf", "PERFORMANCE")
+    _print_metrics(results, "resources", "RESOURCE USAGE")
+
+    report = _build_report(results, duration)
+    if json_path:
+        write_json_report(report, json_path)
+        print(f"\n{COLOR_DARK_GRAY}JSON report saved as {COLOR_BLUE}{json_path}{COLOR_RESET}")
+    if junit_path:
+        write_junit_report(report, junit_path)
+        print(f"{COLOR_DARK_GRAY}JUnit report saved as {COLOR_BLUE}{junit_path}{COLOR_RESET}")
+
+    if baseline_path:
+        try:
+            regressions = compare_with_baseline(report, baseline_path)
+            print(f"\n{COLOR_YELLOW}COMPARISON WITH {COLOR_BLUE}{baseline_path}{COLOR_RESET}")
+            if not regressions:
+                print(f"{COLOR_GREEN}No duration regressions.{COLOR_RESET}")
+            for test, baseline_duration, test_duration in regressions:
+                increase = f" (+{(test_duration / baseline_duration - 1) * 100:.0f}%)" if baseline_duration > 0 else ""
+                print(f"{COLOR_CYAN}{test}{COLOR_RESET}: {COLOR_RED}{baseline_duration:.2f}s -> {test_duration:.2f}s{increase}{COLOR_RESET}")
+            if regressions and fail_on_regression:
+                overall_success = False
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"{COLOR_RED}Error: cannot compare with baseline {baseline_path}: {e}{COLOR_RESET}")
+            if fail_on_regression:
+                overall_success = False
+
     print(f"\nTests: {COLOR_GREEN}{passed_count} passed{COLOR_RESET}, {COLOR_RED}{failed_count} failed{COLOR_RESET}, {total_count} total")
-    print(f"Time: {calculate_elapsed_time(start_time, time.time())}")
+    print(f"Time: {calculate_elapsed_time(0, duration)}")
 
     if overall_success:
         print(f"\n{COLOR_GREEN}All tests PASSED!{COLOR_RESET}")
         sys.exit(0)
     else:
-        print(f"\n{COLOR_RED}Some tests FAILED.{COLOR_RESET}")
-        sys.exit(1)
\ No newline at end of file
+        print(f"\n{COLOR_RED}Some tests FAILED{' (or are slower than the baseline)' if fail_on_regression else ''}.{COLOR_RESET}")
+        sys.exit(1)
@@ -1,19 +1,130 @@
 import os
 import sys
+import ast
+import json
 import importlib.util
 from lib.colors import *
 
+# Module level constants we read from each test file. We do not import the test
+# modules during discovery (they'd be imported again when executed and any side effect
+# would run twice), we read these values with a static analysis of the source code.
+TEST_CONSTANTS = ("TRAIT", "TEST_PRIORITY", "TEST_NAME")
+DEFAULT_TEST_PRIORITY = 100
+
+# Results of the static analysis are cached (per test directory) and invalidated
+# when the test file changes (we compare modification time and size).
+DISCOVERY_CACHE_FILE_NAME = os.path.join("__pycache__", "test_scout.json")
+DISCOVERY_CACHE_VERSION = 1
+
+def _collect_constants(statements, test_file_path, constants):
+    for node in statements:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+
+        for target in targets:
+            if isinstance(target, ast.Name) and target.id in TEST_CONSTANTS:
+                try:
+                    constants[target.id] = ast.literal_eval(node.value)
+                except (ValueError, TypeError, SyntaxError, RecursionError):
+                    print(f"{COLOR_YELLOW}Warning: {target.id} in '{test_file_path}' is not a literal value, ignored.{COLOR_RESET}")
+
+def read_test_constants(test_file_path):
+    """
+    Reads the TEST_CONSTANTS from a test file without importing it.
+    Only literal values assigned at module level are considered, anything else is ignored.
+    Returns a dictionary with the constants found in the file, None if the file cannot be parsed.
+    """
+    with open(test_file_path, "r", encoding="utf-8") as f:
+        source = f.read()
+
+    constants = {}
+    try:
+        _collect_constants(ast.parse(source, filename=test_file_path).body, test_file_path, constants)
+    except (SyntaxError, ValueError, RecursionError) as e:
+        # For example a syntax newer than the Python version running the tests: guessing
+        # its constants (e.g. its TRAIT) could run it when it was not selected.
+        print(f"{COLOR_RED}Error: cannot parse '{test_file_path}' ({e}), test skipped.{COLOR_RESET}")
+        return None
+    return constants
+
+class _DiscoveryCache:
+    def __init__(self, test_dir):
+        self._path = os.path.join(test_dir, DISCOVERY_CACHE_FILE_NAME)
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            if content.get("version") == DISCOVERY_CACHE_VERSION:
+                self._entries = content.get("entries", {})
+        except (OSError, ValueError):
+            pass # No cache (or a corrupted one), we simply start from scratch
+
+    def get_constants(self, test_file_path):
+        stat = os.stat(test_file_path)
+        key = os.path.basename(test_file_path)
+        entry = self._entries.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["constants"]
+
+        constants = read_test_constants(test_file_path)
+        if constants is None:
+            return None # Not cached, it's reported again in the next run
+        self._entries[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "constants": constants}
+        self._dirty = True
+        return constants
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, "w", encoding="utf-8") as f:
+                json.dump({"version": DISCOVERY_CACHE_VERSION, "entries": self._entries}, f)
+            self._dirty = False
+        except OSError as e:
+            print(f"{COLOR_YELLOW}Warning: could not save the test discovery cache ({e}).{COLOR_RESET}")
+
+def _describe_test(cache, test_name, test_path):
+    """Returns (priority, friendly name, trait), None if the test file cannot be parsed."""
+    constants = cache.get_constants(test_path)
+    if constants is None:
+        return None
+    priority = constants.get("TEST_PRIORITY", DEFAULT_TEST_PRIORITY)
+    friendly_name = constants.get("TEST_NAME", test_name.removeprefix("test_"))
+    return priority, friendly_name, constants.get("TRAIT")
+
+def load_test_module(test_name, test_file_path):
+    """
+    Imports a test module, this is the only place where test files are executed.
+    A module already imported from the same file is reused.
+    """
+    test_module = sys.modules.get(test_name)
+    if test_module is not None and getattr(test_module, "__file__", None) == test_file_path:
+        return test_module
+
+    spec = importlib.util.spec_from_file_location(test_name, test_file_path)
+    test_module = importlib.util.module_from_spec(spec)
+    sys.modules[test_name] = test_module
+    spec.loader.exec_module(test_module)
+    return test_module
+
 def find_tests(test_dir, trait=None, test_name=None):
     """
     Discovers test files based on specified criteria.
-    Returns a list of (priority, test_name, test_file_path) tuples, sorted by priority.
+    Returns a list of (priority, test_name, test_file_path, friendly_name) tuples, sorted by priority.
     """
     discovered_tests = []
+    cache = _DiscoveryCache(test_dir)
 
     if test_name:
         # Try exact match first (test_example.py for test_name='test_example')
         test_file_path_exact = os.path.join(test_dir, f"{test_name}.py")
-        
+
         # Try prepending 'test_' if exact match not found (test_example.py for test_name='example')
         test_file_path_prefixed = os.path.join(test_dir, f"test_{test_name}.py")
 
@@ -25,15 +136,13 @@ def find_tests(test_dir, trait=None, test_name=None):
             target_test_file = (test_name, test_file_path_exact)
         elif os.path.exists(test_file_path_prefixed):
             target_test_file = (f"test_{test_name}", test_file_path_prefixed)
-        
+
         if target_test_file:
             current_test_name, test_path = target_test_file
-            spec = importlib.util.spec_from_file_location(current_test_name, test_path)
-            test_module = importlib.util.module_from_spec(spec)
-            sys.modules[current_test_name] = test_module
-            spec.loader.exec_module(test_module)
-            priority = getattr(test_module, 'TEST_PRIORITY', 100)
-            discovered_tests.append((priority, current_test_name, test_path))
+            description = _describe_test(cache, current_test_name, test_path)
+            if description is not None:
+                priority, friendly_name, _ = description
+                discovered_tests.append((priority, current_test_name, test_path, friendly_name))
         else:
             print(f"{COLOR_RED}Error: Test file '{test_name}.py' or 'test_{test_name}.py' not found in '{test_dir}'.{COLOR_RESET}")
             sys.exit(1)
@@ -42,23 +151,20 @@ def find_tests(test_dir, trait=None, test_name=None):
         for tf in all_test_files:
             current_test_name = os.path.splitext(tf)[0]
             test_path = os.path.join(test_dir, tf)
-            
-            # Temporarily load module to check for TRAIT attribute and TEST_PRIORITY
-            spec = importlib.util.spec_from_file_location(current_test_name, test_path)
-            test_module = importlib.util.module_from_spec(spec)
-            sys.modules[current_test_name] = test_module
-            spec.loader.exec_module(test_module)
-            
-            priority = getattr(test_module, 'TEST_PRIORITY', 100)
-            friendly_name = getattr(test_module, 'TEST_NAME', current_test_name.removeprefix("test_"))
+            description = _describe_test(cache, current_test_name, test_path)
+            if description is None:
+                continue
+            priority, friendly_name, test_trait = description
 
             if trait:
-                if hasattr(test_module, 'TRAIT') and test_module.TRAIT == trait:
+                if test_trait == trait:
                     discovered_tests.append((priority, current_test_name, test_path, friendly_name))
             else:
                 discovered_tests.append((priority, current_test_name, test_path, friendly_name))
 
+    cache.save()
+
     # Sort tests by priority
     discovered_tests.sort(key=lambda x: x[0])
 
-    return discovered_tests
\ No newline at end of file
+    return discovered_tests
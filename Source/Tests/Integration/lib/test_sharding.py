@@ -0,0 +1,120 @@
+import os
+import glob
+import json
+import argparse
+import statistics
+from lib.colors import *
+from lib.settings import *
+
+# Historical durations of each test, updated after each run. A complete run updates the timings file,
+# each shard (--shard i/n) writes its own "<timings file>.shard-i.json" (shards can run in parallel) and
+# all of them are merged when the timings are loaded (the most recently updated file wins).
+# When running on multiple machines all of them must compute the same shards: share the directory
+# of the timings file (or pass a shared --timings-file), for example with the CI cache.
+TIMINGS_FILE_NAME = os.path.join("__pycache__", "test_timings.json")
+TIMINGS_FILE_VERSION = 1
+
+def parse_shard(text):
+    """
+    Parses a shard specification "i/n" (1 <= i <= n), it's meant to be used as an argparse type.
+    Returns the tuple (i, n).
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a valid shard, expected 'i/n' (e.g. '1/4').")
+
+    if count < 1 or index < 1 or index > count:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a valid shard, expected 1 <= i <= n.")
+    return index, count
+
+def default_timings_path(test_dir):
+    return os.path.join(test_dir, TIMINGS_FILE_NAME)
+
+def shard_timings_path(path, shard_index):
+    return f"{os.path.splitext(path)[0]}.shard-{shard_index}.json"
+
+def load_merged_timings(path):
+    """Same as load_timings(), with the timings written by the shards (see shard_timings_path()) too."""
+    paths = [path] + glob.glob(glob.escape(os.path.splitext(path)[0]) + ".shard-*.json")
+    durations = {}
+    for timings_path in sorted(paths, key=_modification_time):
+        durations.update(load_timings(timings_path))
+    return durations
+
+def _modification_time(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+def load_timings(path):
+    """Returns a dictionary test_name => duration (seconds), empty if there is no history."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        if content.get("version") == TIMINGS_FILE_VERSION:
+            return content.get("durations", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def update_timings(path, results, history=None):
+    """
+    Updates the timings file with the durations of the tests we just executed. Durations are
+    smoothed (exponential moving average) to avoid reacting to a single slow run, with the
+    previous duration in history (e.g. the merged timings) or, if it's not there, in the file.
+    """
+    durations = load_timings(path)
+    history = history or {}
+    for result in results.values():
+        test_name = result.get("test_name")
+        duration = result.get("duration")
+        if test_name is None or duration is None:
+            continue
+
+        previous = history.get(test_name, durations.get(test_name))
+        if previous is None:
+            durations[test_name] = duration
+        else:
+            durations[test_name] = previous + TIMINGS_SMOOTHING_FACTOR * (duration - previous)
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": TIMINGS_FILE_VERSION, "durations": durations}, f, indent=2, sort_keys=True)
+    except OSError as e:
+        print(f"{COLOR_YELLOW}Warning: could not save test timings to {path} ({e}).{COLOR_RESET}")
+
+def select_shard(tests, shard_index, shard_count, timings):
+    """
+    Splits the tests (as returned by find_tests()) into shard_count groups and returns the
+    shard_index-th (1-based) one, sorted by priority.
+    Groups are balanced using the historical durations (longest test first, to the group
+    with the smallest total). Tests without history are assumed to take the median duration
+    and when there is no history at all we fall back to round-robin.
+    The result depends only on the tests and on the timings, every machine computes the same shards.
+    """
+    # Stable order, regardless of how tests have been discovered
+    tests = sorted(tests, key=lambda test: (test[0], test[1]))
+
+    known = [timings[test[1]] for test in tests if test[1] in timings]
+    if not known:
+        shard = tests[shard_index - 1::shard_count]
+    else:
+        default_duration = statistics.median(known)
+        totals = [0.0] * shard_count
+        shards = [[] for _ in range(shard_count)]
+        for test in sorted(tests, key=lambda test: (-timings.get(test[1], default_duration), test[1])):
+            target = min(range(shard_count), key=lambda i: (totals[i], i))
+            shards[target].append(test)
+            totals[target] += timings.get(test[1], default_duration)
+        shard = shards[shard_index - 1]
+
+    shard.sort(key=lambda test: (test[0], test[1]))
+    return shard
+
+def estimate_duration(tests, timings):
+    """Returns the expected duration of the tests, None if there is no history for some of them."""
+    durations = [timings.get(test[1]) for test in tests]
+    return None if None in durations else sum(durations)
@@ -0,0 +1,215 @@
+import os
+import sys
+import stat
+import shutil
+import fnmatch
+import hashlib
+import tempfile
+import time
+import uuid
+from lib.colors import *
+from lib.settings import *
+
+# Test data (tests/<test_name>/) is not copied from the source tree into each environment. We prepare
+# a template directory once per test-data set (it's reused until the test data changes) and each
+# environment is materialized from it (empty directories included):
+#  * Files the application might modify (STAGING_MUTABLE_FILE_PATTERNS) are cloned with a
+#    reflink when the file system supports it (copy-on-write), otherwise copied.
+#  * All the other files are hard links to the template: setup cost depends on the number of files,
+#    not on their size. With --copy-test-data they're cloned (or copied) too.
+# Read-only permissions do not stop a test running as root: after each test verify_template() checks
+# (sizes and modification times) that the template has not been modified through a link, a modified
+# template is discarded (and the test fails).
+# Templates are versioned (by the fingerprint of the test data) and a template is deleted only when it has
+# not been used for STAGING_TEMPLATE_MAX_IDLE_SECONDS: a concurrent run could still be staging from it.
+STAGING_DIR_NAME = "Tinkwell.IntegrationTests.Staging"
+STAGING_TEMPLATE_MAX_IDLE_SECONDS = 24 * 60 * 60
+
+# A template contains the test data (TEMPLATE_DATA_DIR_NAME) and its fingerprint when it has been created
+TEMPLATE_DATA_DIR_NAME = "data"
+TEMPLATE_FINGERPRINT_FILE_NAME = "fingerprint"
+TEMPLATE_LAYOUT_VERSION = 2
+
+# ioctl to clone a file on Linux (btrfs, XFS, ...), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+class StagingStats:
+    def __init__(self):
+        self.linked = 0
+        self.cloned = 0
+        self.copied = 0
+        self.directories = 0
+        self.template_dir = None
+
+    def __str__(self):
+        return f"{self.linked} linked, {self.cloned} cloned, {self.copied} copied ({self.directories} directories)"
+
+def remove_read_only(function, path, exc_info):
+    """
+    Error handler for shutil.rmtree() (both onerror and onexc), files from a template are read-only
+    and on Windows they cannot be deleted without clearing that attribute.
+    """
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        function(path)
+    except OSError:
+        pass
+
+def remove_tree(path):
+    """Deletes a directory tree, read-only files included."""
+    # onerror is deprecated since Python 3.12
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=remove_read_only)
+    else:
+        shutil.rmtree(path, onerror=remove_read_only)
+
+def _is_mutable(relative_path):
+    name = os.path.basename(relative_path)
+    return any(fnmatch.fnmatch(name, pattern) for pattern in STAGING_MUTABLE_FILE_PATTERNS)
+
+def _list_files(root):
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            full_path = os.path.join(dir_path, file_name)
+            yield os.path.relpath(full_path, root), full_path
+
+def _list_directories(root):
+    for dir_path, dir_names, _ in os.walk(root):
+        for dir_name in dir_names:
+            full_path = os.path.join(dir_path, dir_name)
+            yield os.path.relpath(full_path, root), full_path
+
+def _fingerprint(test_data_dir):
+    """Hash of the structure of the test data (paths, sizes and modification times, not the content)."""
+    digest = hashlib.sha1(f"{TEMPLATE_LAYOUT_VERSION}\n".encode("utf-8"))
+    for relative_path, full_path in sorted(_list_files(test_data_dir)):
+        file_stat = os.stat(full_path)
+        digest.update(f"{relative_path}|{file_stat.st_size}|{file_stat.st_mtime_ns}\n".encode("utf-8"))
+    for relative_path, _ in sorted(_list_directories(test_data_dir)):
+        digest.update(f"{relative_path}/\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def _try_reflink(source, destination):
+    if not sys.platform.startswith("linux"):
+        return False
+
+    import fcntl
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+        return True
+    except OSError:
+        if os.path.exists(destination):
+            os.remove(destination)
+        return False
+
+def _mark_used(template_dir):
+    try:
+        os.utime(template_dir)
+    except OSError:
+        pass
+
+def _remove_idle_templates(test_name, staging_root, current_template_dir):
+    # Templates for older versions of the same test data, unless another run could still be using them
+    now = time.time()
+    for entry in os.listdir(staging_root):
+        path = os.path.join(staging_root, entry)
+        if not entry.startswith(f"{test_name}.") or path == current_template_dir:
+            continue
+        try:
+            if now - os.stat(path).st_mtime >= STAGING_TEMPLATE_MAX_IDLE_SECONDS:
+                remove_tree(path)
+        except OSError:
+            pass # Deleted by someone else
+
+def _build_template(test_name, test_data_dir, staging_root):
+    """Returns the path of the template for the test data, creating it if it does not exist yet."""
+    template_dir = os.path.join(staging_root, f"{test_name}.{_fingerprint(test_data_dir)}")
+    if os.path.isdir(template_dir):
+        _mark_used(template_dir)
+        return template_dir
+
+    print(f"{COLOR_DARK_GRAY}Preparing test data template {COLOR_BLUE}{template_dir}{COLOR_RESET}")
+    _remove_idle_templates(test_name, staging_root, template_dir)
+
+    # Build it in a separate directory and then rename it, multiple runs could share
+    # the same staging directory and they must never see a partially created template.
+    building_dir = os.path.join(staging_root, f".{test_name}.{uuid.uuid4().hex[:8]}")
+    data_dir = os.path.join(building_dir, TEMPLATE_DATA_DIR_NAME)
+    shutil.copytree(test_data_dir, data_dir)
+    for _, full_path in _list_files(data_dir):
+        os.chmod(full_path, 0o444)
+    with open(os.path.join(building_dir, TEMPLATE_FINGERPRINT_FILE_NAME), "w", encoding="utf-8") as f:
+        f.write(_fingerprint(data_dir))
+
+    try:
+        os.rename(building_dir, template_dir)
+    except OSError:
+        # Someone else created it in the meantime
+        remove_tree(building_dir)
+        _mark_used(template_dir)
+    return template_dir
+
+def verify_template(template_dir):
+    """
+    Checks that the files of a template have not been modified (through a hard link), if they have
+    then the template is discarded (it'll be created again). Returns True if it's unchanged.
+    """
+    try:
+        with open(os.path.join(template_dir, TEMPLATE_FINGERPRINT_FILE_NAME), "r", encoding="utf-8") as f:
+            expected_fingerprint = f.read().strip()
+        if _fingerprint(os.path.join(template_dir, TEMPLATE_DATA_DIR_NAME)) == expected_fingerprint:
+            return True
+    except OSError:
+        pass
+
+    print(f"{COLOR_RED}Test data template {COLOR_BLUE}{template_dir}{COLOR_RED} has been modified, it's discarded.{COLOR_RESET}")
+    discarded_dir = os.path.join(os.path.dirname(template_dir), f".discarded.{uuid.uuid4().hex[:8]}")
+    try:
+        # Renamed first: nobody can stage from it while it's being deleted
+        os.rename(template_dir, discarded_dir)
+        remove_tree(discarded_dir)
+    except OSError:
+        pass # Already discarded by someone else
+    return False
+
+def stage_test_data(test_name, test_data_dir, destination_dir, staging_root=None, link_files=True):
+    """
+    Materializes the content of test_data_dir into destination_dir (which already exists).
+    Mutable files are cloned or copied, the others are hard links to the template (unless link_files is False).
+    Returns a StagingStats with the number of files linked, cloned and copied and the template used
+    (check it with verify_template() when the test is done).
+    """
+    staging_root = staging_root or os.path.join(tempfile.gettempdir(), STAGING_DIR_NAME)
+    os.makedirs(staging_root, exist_ok=True)
+    stats = StagingStats()
+    stats.template_dir = _build_template(test_name, test_data_dir, staging_root)
+    template_dir = os.path.join(stats.template_dir, TEMPLATE_DATA_DIR_NAME)
+
+    for relative_path, _ in _list_directories(template_dir):
+        os.makedirs(os.path.join(destination_dir, relative_path), exist_ok=True)
+        stats.directories += 1
+
+    for relative_path, template_path in _list_files(template_dir):
+        destination = os.path.join(destination_dir, relative_path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+
+        if not link_files or _is_mutable(relative_path):
+            if _try_reflink(template_path, destination):
+                stats.cloned += 1
+            else:
+                shutil.copy2(template_path, destination)
+                stats.copied += 1
+            os.chmod(destination, 0o644)
+        else:
+            try:
+                os.link(template_path, destination)
+                stats.linked += 1
+            except OSError:
+                # For example when the template is on a different file system
+                shutil.copy2(template_path, destination)
+                stats.copied += 1
+    return stats
@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+
+# Phases of a test execution, in the order they happen. They're used to
+# keep the report in a stable order (a test might not go through all of them).
+PHASE_ENVIRONMENT = "environment"
+PHASE_CERTIFICATE = "certificate"
+PHASE_TEST_DATA = "test_data"
+PHASE_STARTUP = "startup"
+PHASE_TEST = "test"
+PHASE_SHUTDOWN = "shutdown"
+PHASE_CLEANUP = "cleanup"
+
+PHASES = [PHASE_ENVIRONMENT, PHASE_CERTIFICATE, PHASE_TEST_DATA, PHASE_STARTUP, PHASE_TEST, PHASE_SHUTDOWN, PHASE_CLEANUP]
+
+class PhaseTimer:
+    """
+    Measures the time spent in each phase of a test using a monotonic clock.
+    Usage:
+        timer = PhaseTimer()
+        with timer.phase(PHASE_STARTUP):
+            ...
+    """
+    def __init__(self):
+        self._start = time.monotonic()
+        self._end = None
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        phase_start = time.monotonic()
+        try:
+            yield
+        finally:
+            # The same phase could be entered more than once, we sum them
+            self.phases[name] = self.phases.get(name, 0.0) + (time.monotonic() - phase_start)
+
+    def stop(self):
+        if self._end is None:
+            self._end = time.monotonic()
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def duration(self):
+        end = self._end if self._end is not None else time.monotonic()
+        return end - self._start
+
+    def ordered_phases(self):
+        """Returns the list of (phase, seconds), known phases first and in their natural order."""
+        known = [(name, self.phases[name]) for name in PHASES if name in self.phases]
+        others = [(name, seconds) for name, seconds in self.phases.items() if name not in PHASES]
+        return known + others
@@ -11,17 +11,38 @@ class TwCli:
     def __init__(self, context):
         self.context = context
 
+    def _build_command(self, args):
+        return ["dotnet", self.context.cli_tool_dll_path] + list(args)
+
+    def _build_environment(self):
+        env = os.environ.copy()
+        if self.context.client_certificate_path:
+            env["TINKWELL_CLIENT_CERT_PATH"] = self.context.client_certificate_path
+        return env
+
+    def start_command(self, *args):
+        """
+        Starts a long running command (for example 'measures subscribe') using the Tinkwell CLI tool
+        without waiting for it to complete. stdout is a text pipe the caller is responsible to read.
+        Returns the subprocess Popen object.
+        """
+        return subprocess.Popen(
+            self._build_command(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            env=self._build_environment()
+        )
+
     def run_command(self, *args, input_data=None):
         """
         Runs a command using the Tinkwell CLI tool (tw.dll) and captures its output.
         Returns a dictionary with 'stdout', 'stderr', and 'returncode'.
         'input_data' can be a string to send to the command's stdin.
         """
-        command = ["dotnet", self.context.cli_tool_dll_path] + list(args)
-        
-        env = os.environ.copy()
-        if self.context.client_certificate_path:
-            env["TINKWELL_CLIENT_CERT_PATH"] = self.context.client_certificate_path
+        command = self._build_command(args)
+        env = self._build_environment()
 
         try:
             result = subprocess.run(
@@ -6,18 +6,31 @@ import time
 from lib.test_scout import find_tests
 from lib.test_executor import execute_test
 from lib.test_reporter import generate_report
+from lib.test_sharding import parse_shard, default_timings_path, shard_timings_path, load_merged_timings, update_timings, select_shard, estimate_duration
 from lib.colors import *
-from lib.app_manager import TestContext
+from lib.app_manager import TestContext, wait_for_pending_cleanups
 
 def main():
     parser = argparse.ArgumentParser(description="Run integration tests for Tinkwell application.")
     parser.add_argument("--app-path", required=True, help="Path to the directory containing Tinkwell.Supervisor.dll and tw.dll.")
     parser.add_argument("--test-dir", default=os.path.join(os.path.dirname(__file__), "tests"), help="Directory containing test files (e.g., 'tests/').")
-    parser.add_argument("--trait", help="Only run tests with this trait (e.g., 'smoke', 'integration').")
+    parser.add_argument("--trait", help="Only run tests with this trait (e.g., 'smoke', 'integration', 'perf').")
     parser.add_argument("--test-name", help="Run only a single test file (e.g., 'test_feature_a').")
     parser.add_argument("--keep-temp-dir", action="store_true", help="Do not delete the temporary directory after tests.")
     parser.add_argument("--verbose", action="store_true", help="Show verbose output from the Tinkwell application.")
+    parser.add_argument("--report-json", help="Save the results (with the time spent in each phase) as JSON to this file.")
+    parser.add_argument("--report-junit", help="Save the results as JUnit XML to this file.")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Compare test durations with a previous JSON report and flag regressions.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="With --compare, exit with an error if a test is slower than in the baseline (or the baseline cannot be read).")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="Run only the I-th of N groups of tests, balanced by their historical duration (e.g., '1/4').")
+    parser.add_argument("--timings-file", help="File with the historical duration of each test, updated after each run (defaults to a file in the test directory). Each shard writes its own file next to it, see lib/test_sharding.py.")
+    parser.add_argument("--resource-dir", help="Sample the resources used by the application and save them (one CSV file for each test) in this directory.")
+    parser.add_argument("--copy-test-data", action="store_true", help="Copy all the test data files, instead of hard linking those which are not modified by the application to a shared template.")
+    parser.add_argument("--soak", type=float, metavar="MINUTES", help="Keep running each test for the specified minutes and flag monotonic memory growth.")
     args = parser.parse_args()
+    if args.fail_on_regression and not args.compare:
+        parser.error("--fail-on-regression requires --compare.")
+    timings_path = args.timings_file or default_timings_path(args.test_dir)
 
     # Construct full paths to the DLLs
     print(f"{COLOR_DARK_GRAY}Compiling regret from previous deploys...{COLOR_RESET}")
@@ -35,13 +48,23 @@ def main():
     print(f"{COLOR_DARK_GRAY}Herding test cases into formation from {COLOR_BLUE}{args.test_dir}{COLOR_DARK_GRAY}...{COLOR_RESET}")
     tests_to_run = find_tests(args.test_dir, args.trait, args.test_name)
 
+    if args.shard:
+        shard_index, shard_count = args.shard
+        timings = load_merged_timings(timings_path)
+        if not timings:
+            print(f"{COLOR_DARK_GRAY}No test timings in {COLOR_BLUE}{timings_path}{COLOR_DARK_GRAY}, tests are split round-robin{COLOR_RESET}")
+        tests_to_run = select_shard(tests_to_run, shard_index, shard_count, timings)
+        estimated_duration = estimate_duration(tests_to_run, timings)
+        estimate = f" (estimated {estimated_duration:.0f} seconds)" if estimated_duration is not None else ""
+        print(f"{COLOR_DARK_GRAY}Shard {COLOR_RESET}{shard_index} of {shard_count}{COLOR_DARK_GRAY}: {COLOR_RESET}{len(tests_to_run)} tests{COLOR_DARK_GRAY}{estimate}{COLOR_RESET}")
+
     if not tests_to_run:
         print("No tests found matching the criteria.")
         sys.exit(0)
 
     # Run tests
     results = {}
-    start_time = time.time()
+    start_time = time.monotonic()
     test_count = len(tests_to_run)
 
     for test_index, (priority, test_name, test_file_path, friendly_name) in enumerate(tests_to_run, 1):
@@ -50,11 +73,29 @@ def main():
         
         context = TestContext(app_path=args.app_path, app_dll_path=tinkwell_supervisor_dll_path, cli_tool_dll_path=tw_cli_dll_path)
 
-        test_passed, failure_message = execute_test(test_name, test_file_path, context, args.keep_temp_dir, args.verbose)
-        results[friendly_name] = {"status": "PASSED" if test_passed else "FAILED", "message": failure_message}
+        test_passed, failure_message, timer = execute_test(test_name, test_file_path, context, args.keep_temp_dir, args.verbose, args.resource_dir, args.soak, args.copy_test_data)
+        results[friendly_name] = {
+            "status": "PASSED" if test_passed else "FAILED",
+            "message": failure_message,
+            "test_name": test_name,
+            "duration": timer.duration,
+            "phases": dict(timer.ordered_phases()),
+            "perf": context.perf_results,
+            "resources": context.resource_usage
+        }
+
+    # Temporary directories are deleted in background, be sure we're done
+    wait_for_pending_cleanups()
+
+    # In soak mode durations are the soak time, not the time to run the test once
+    if not args.soak:
+        if args.shard:
+            update_timings(shard_timings_path(timings_path, args.shard[0]), results, load_merged_timings(timings_path))
+        else:
+            update_timings(timings_path, results, load_merged_timings(timings_path))
 
     # Results
-    generate_report(results, start_time)
+    generate_report(results, start_time, args.report_json, args.report_junit, args.compare, args.fail_on_regression)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
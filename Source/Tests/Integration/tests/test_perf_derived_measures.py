@@ -0,0 +1,92 @@
+from lib.perf import MeasureSubscription, PerfResults, drive_writes, write_measure, wait_until_subscribed, summarize_latencies, measure_throughput
+
+TRAIT = "perf"
+TEST_PRIORITY = 200 # Slow, run it after the functional tests
+
+# Sustained load: each write is a separate CLI invocation, we keep a few of them in-flight
+WRITES_PER_SECOND = 10
+WRITE_COUNT = 100
+WRITE_CONCURRENCY = 4
+
+# Fan-out: how many independent subscribers watch the same measure
+FANOUT_SUBSCRIBERS = 4
+FANOUT_WRITE_COUNT = 20
+
+# Time to wait for a subscription to be established and for a change to be observed
+SUBSCRIPTION_TIMEOUT_SECONDS = 30
+PROPAGATION_TIMEOUT_SECONDS = 10
+
+CURRENT = 2
+
+# Values written to check that subscriptions are established, they never collide with the measured ones
+PROBE_VOLTAGE = 10
+
+# Latencies are measured from the moment the write started: the CLI might return after the change has
+# already been observed. The time to write (CLI startup included) is reported separately as "write_latency".
+PERF_BUDGETS = {
+    "writes.per_second": (WRITES_PER_SECOND / 2, None),
+    "propagation.p99_ms": 3000,
+    "propagation.count": (WRITE_COUNT * 0.9, None), # Close updates might be coalesced
+    "fanout.p99_ms": 2000,
+}
+
+def probe_voltage(tw_cli, expected_value):
+    """Returns a probe for wait_until_subscribed(): it writes a voltage, expected_value(voltage) is what we should observe."""
+    def probe(attempt):
+        voltage = PROBE_VOLTAGE + attempt
+        if not write_measure(tw_cli, "voltage", voltage, "V").succeeded:
+            return None
+        return lambda received_at, name, value: value == expected_value(voltage)
+    return probe
+
+def run_test(tw_cli, context):
+    perf = PerfResults(context)
+
+    if not write_measure(tw_cli, "current", CURRENT, "A").succeeded:
+        return "Cannot update a constant measure"
+
+    # How long it takes for a derived measure to be updated under a sustained write rate.
+    # Each write has a unique value, then we can match it with the derived one.
+    with MeasureSubscription(tw_cli, ["power"]) as subscription:
+        if not wait_until_subscribed([subscription], probe_voltage(tw_cli, lambda voltage: voltage * CURRENT), SUBSCRIPTION_TIMEOUT_SECONDS):
+            return "Cannot subscribe to a derived measure"
+
+        voltages = [100 + i for i in range(WRITE_COUNT)]
+        writes, elapsed = drive_writes(tw_cli, "voltage", voltages, "V", WRITES_PER_SECOND, WRITE_CONCURRENCY)
+        if not all(write.succeeded for write in writes):
+            return "Cannot update a constant measure"
+        perf.record("writes", measure_throughput(len(writes), elapsed))
+        perf.record("write_latency", summarize_latencies([write.completed_at - write.started_at for write in writes]))
+
+        latencies = []
+        for write in writes:
+            expected_power = write.value * CURRENT
+            update = subscription.wait_for(lambda received_at, name, value: value == expected_power, PROPAGATION_TIMEOUT_SECONDS)
+            if update is not None:
+                latencies.append(update[0] - write.started_at)
+        perf.record("propagation", summarize_latencies(latencies))
+
+    # How long it takes for a change to reach all the subscribers of the same measure
+    subscriptions = [MeasureSubscription(tw_cli, ["voltage"]) for _ in range(FANOUT_SUBSCRIBERS)]
+    try:
+        for subscription in subscriptions:
+            subscription.start()
+        if not wait_until_subscribed(subscriptions, probe_voltage(tw_cli, lambda voltage: voltage), SUBSCRIPTION_TIMEOUT_SECONDS):
+            return "Cannot subscribe to a measure"
+
+        latencies = []
+        for i in range(FANOUT_WRITE_COUNT):
+            write = write_measure(tw_cli, "voltage", 1000 + i, "V")
+            if not write.succeeded:
+                return "Cannot update a constant measure"
+            for subscription in subscriptions:
+                update = subscription.wait_for(lambda received_at, name, value: value == write.value, PROPAGATION_TIMEOUT_SECONDS)
+                if update is not None:
+                    latencies.append(update[0] - write.started_at)
+        perf.record("fanout", summarize_latencies(latencies))
+    finally:
+        for subscription in subscriptions:
+            subscription.stop()
+
+    failure = perf.check_budgets(PERF_BUDGETS)
+    return failure if failure else True
@@ -1,7 +1,13 @@
 import json
 import re
+import hashlib
+import pickle
 import requests
+import requests.adapters
 import os
+import argparse
+import threading
+import concurrent.futures
 
 # Function to split PascalCase into Title Case
 def split_pascal_case(name):
@@ -71,18 +77,113 @@ UNIT_DEFINITION_BASE_URL = 'https://raw.githubusercontent.com/angularsen/UnitsNe
 LOCAL_UNITS_JSON_PATH = 'Units.json' 
 OUTPUT_MD_PATH = 'Units.md' 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Always next to this script (regardless of the working directory), that's where tw_units.py looks for it
+OUTPUT_INDEX_JSON_PATH = os.path.join(SCRIPT_DIR, 'Units.index.json')
+OUTPUT_INDEX_PICKLE_PATH = os.path.join(SCRIPT_DIR, 'Units.index.pickle')
 SCRIPT_NAME = 'generate_units_doc.py'
 
+# Downloaded files are cached (and revalidated with ETag/Last-Modified). The cache has the same layout
+# of the UnitsNet Common/ directory then it can also be used as a mirror for --offline.
+UNITS_JSON_FILE_NAME = 'UnitEnumValues.g.json'
+UNIT_DEFINITIONS_DIR_NAME = 'UnitDefinitions'
+DEFAULT_CACHE_DIR = os.path.join(SCRIPT_DIR, '__pycache__', 'units')
+MAX_CONCURRENT_DOWNLOADS = 16
+DOWNLOAD_TIMEOUT_SEC = 30
+
+parser = argparse.ArgumentParser(description="Generate the list of supported units of measure from UnitsNet definitions.")
+parser.add_argument("--offline", metavar="DIR", help=f"Read the definitions from a local mirror (with {UNITS_JSON_FILE_NAME} and {UNIT_DEFINITIONS_DIR_NAME}/) instead of downloading them.")
+parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory where downloaded definitions are cached.")
+parser.add_argument("--jobs", type=int, default=MAX_CONCURRENT_DOWNLOADS, help="Maximum number of concurrent downloads.")
+args = parser.parse_args()
+
+class DefinitionSource:
+    """
+    Reads the UnitsNet definitions from the network (using a single pooled session and an on-disk cache)
+    or from a local mirror when offline.
+    """
+    def __init__(self, cache_dir, offline_dir=None, max_connections=MAX_CONCURRENT_DOWNLOADS):
+        self.offline_dir = offline_dir
+        self.cache_dir = cache_dir
+        self.downloaded = 0
+        self.revalidated = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._session = None
+        if not offline_dir:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+            self._session.mount('https://', adapter)
+
+    def close(self):
+        if self._session:
+            self._session.close()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def read(self, url, relative_path):
+        """Returns the content of the file (as text) or raises requests.RequestException/OSError."""
+        if self.offline_dir:
+            with open(os.path.join(self.offline_dir, relative_path), 'r', encoding='utf-8-sig') as f:
+                return f.read()
+
+        cached_path = os.path.join(self.cache_dir, relative_path)
+        metadata_path = cached_path + '.meta.json'
+        headers = {}
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if os.path.exists(cached_path):
+                if metadata.get('etag'):
+                    headers['If-None-Match'] = metadata['etag']
+                if metadata.get('last_modified'):
+                    headers['If-Modified-Since'] = metadata['last_modified']
+        except (OSError, ValueError):
+            pass
+
+        response = self._session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT_SEC)
+        if response.status_code == 304:
+            self._count('revalidated')
+            with open(cached_path, 'r', encoding='utf-8-sig') as f:
+                return f.read()
+
+        response.raise_for_status()
+        content = response.content.decode('utf-8-sig')
+        self._count('downloaded')
+
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        with open(cached_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump({'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}, f)
+        return content
+
+    def read_unit_definition(self, quantity_name):
+        """Returns the parsed definition of a quantity, with an empty list of units if it cannot be read."""
+        try:
+            url = f'{UNIT_DEFINITION_BASE_URL}{quantity_name}.json'
+            return json.loads(self.read(url, os.path.join(UNIT_DEFINITIONS_DIR_NAME, f'{quantity_name}.json')))
+        except (requests.RequestException, OSError, json.JSONDecodeError) as e:
+            self._count('failed')
+            print(f"\033[33mFailed ({e.__class__.__name__}) to gather additional information for \033[36m{quantity_name}\033[0m")
+            return {
+                "Units": {}
+            }
+
 print(f"Generating \033[36m{OUTPUT_MD_PATH}\033[0m with the list of supported units of measure")
-print(f"Source of truth: \033[36m{UNITS_JSON_URL}\033[0m")
-print(f"Source of truth: \033[36m{UNIT_DEFINITION_BASE_URL}\033[0m\n\n")
+if args.offline:
+    print(f"Source of truth: \033[36m{args.offline}\033[0m (offline)\n\n")
+else:
+    print(f"Source of truth: \033[36m{UNITS_JSON_URL}\033[0m")
+    print(f"Source of truth: \033[36m{UNIT_DEFINITION_BASE_URL}\033[0m\n\n")
+
+source = DefinitionSource(args.cache_dir, args.offline, args.jobs)
 
 # Download Units.json
 print(f"Downloading and processing the list...")
-response = requests.get(UNITS_JSON_URL)
-response.raise_for_status()
 with open(LOCAL_UNITS_JSON_PATH, 'w', encoding='utf-8') as f:
-    f.write(response.text)
+    f.write(source.read(UNITS_JSON_URL, UNITS_JSON_FILE_NAME))
 
 # Read the local Units.json file
 with open(LOCAL_UNITS_JSON_PATH, 'r', encoding='utf-8') as f:
@@ -108,71 +209,156 @@ if uncategorized_quantities:
         quantity_groups["Other"] = []
     quantity_groups["Other"].extend(sorted(uncategorized_quantities))
 
+# Download all the definitions we need (concurrently, they're independent)
+all_quantities = sorted({quantity_name for quantities_in_group in quantity_groups.values() for quantity_name in quantities_in_group})
+print(f"Downloading units data for \033[36m{len(all_quantities)}\033[0m quantities from \033[36mhttps://raw.githubusercontent.com/.../{UNIT_DEFINITIONS_DIR_NAME}/\033[0m...")
+with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+    unit_definitions = dict(zip(all_quantities, executor.map(source.read_unit_definition, all_quantities)))
+source.close()
+if not args.offline:
+    print(f"Downloaded \033[36m{source.downloaded}\033[0m, not modified \033[36m{source.revalidated}\033[0m, failed \033[36m{source.failed}\033[0m")
+
+# Rendering a quantity depends only on its definition: we keep a manifest with the hash of each definition
+# and the fragment we rendered for it, unchanged quantities are not rendered again.
+# Increase RENDER_FORMAT_VERSION when changing render_quantity() to invalidate all the cached fragments.
+RENDER_FORMAT_VERSION = 1
+RENDER_MANIFEST_PATH = os.path.join(args.cache_dir, 'rendered', 'manifest.json')
+
+def render_quantity(quantity_name, unit_def):
+    parts = [f'### {split_pascal_case(quantity_name)}\n`{quantity_name}`\n\n']
+    if unit_def.get('XmlDocSummary'):
+        parts.append(f'{unit_def["XmlDocSummary"]}\n\n')
+    if unit_def.get('BaseUnit'):
+        parts.append(f'**Default Unit**: {unit_def["BaseUnit"]}\n\n')
+
+    parts.append('**Units**:\n\n')
+    for unit in unit_def['Units']:
+        unit_name = unit['SingularName']
+        
+        en_us_abbrs = []
+        if 'Localization' in unit:
+            for loc_entry in unit['Localization']:
+                if 'Culture' in loc_entry and loc_entry['Culture'] == 'en-US':
+                    if 'Abbreviations' in loc_entry:
+                        en_us_abbrs.extend(loc_entry['Abbreviations'])
+                    break
+        
+        abbr_str = ', '.join(en_us_abbrs)
+
+        parts.append(f'- {split_pascal_case(unit_name)} (`{unit_name}`)')
+        if abbr_str:
+            parts.append(f'.\n\n  Abbreviation(s): {abbr_str}')
+        if unit.get('XmlDocSummary'):
+            parts.append(f'\n\n  {unit["XmlDocSummary"]}')
+        parts.append('\n')
+    parts.append('\n')
+    return ''.join(parts)
+
+def definition_hash(unit_def):
+    content = json.dumps(unit_def, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f'{RENDER_FORMAT_VERSION}\n{content}'.encode('utf-8')).hexdigest()
+
+def load_render_manifest():
+    try:
+        with open(RENDER_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == RENDER_FORMAT_VERSION:
+            return manifest.get('quantities', {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
 # Generate the Markdown content
 print(f"Starting to generate \033[36m{OUTPUT_MD_PATH}\033[0m...")
+previous_fragments = load_render_manifest()
+fragments = {}
+rendered_count = 0
+reused_count = 0
+
+output = []
+output.append('# Supported Units\n\n')
+output.append('This document lists all the quantity types and their corresponding units of measurement. It is generated from UnitsNet package JSON data.\n\n')
+
+print("Rendering table of contents...")
+output.append('## Table of Contents\n\n')
+for group_name in quantity_groups.keys():
+    output.append(f'- [{group_name}](#{slugify(group_name)})\n')
+    for quantity_name in sorted(quantity_groups[group_name]):
+        output.append(f'  - [{split_pascal_case(quantity_name)}](#{slugify(split_pascal_case(quantity_name))})\n')
+output.append('\n')
+
+for group_name, quantities_in_group in quantity_groups.items():
+    print(f"Rendering group \033[36m{group_name}\033[0m...")
+    output.append(f'## {group_name}\n\n')
+    for quantity_name in sorted(quantities_in_group):
+        try:
+            unit_def = unit_definitions[quantity_name]
+            content_hash = definition_hash(unit_def)
+
+            previous = previous_fragments.get(quantity_name)
+            if previous and previous.get('hash') == content_hash:
+                fragment = previous['fragment']
+                reused_count += 1
+            else:
+                fragment = render_quantity(quantity_name, unit_def)
+                rendered_count += 1
+
+            fragments[quantity_name] = {'hash': content_hash, 'fragment': fragment}
+            output.append(fragment)
+        except (KeyError, TypeError) as e:
+            print(f"\033[33mCould not process \033[36m{quantity_name}\033[0m: {e}")
+
 with open(OUTPUT_MD_PATH, 'w', encoding='utf-8') as f:
-    f.write('# Supported Units\n\n')
-    f.write('This document lists all the quantity types and their corresponding units of measurement. It is generated from UnitsNet package JSON data.\n\n')
-    
-    print("Rendering table of contents...")
-    f.write('## Table of Contents\n\n')
-    for group_name in quantity_groups.keys():
-        f.write(f'- [{group_name}](#{slugify(group_name)})\n')
-        for quantity_name in sorted(quantity_groups[group_name]):
-            f.write(f'  - [{split_pascal_case(quantity_name)}](#{slugify(split_pascal_case(quantity_name))})\n')
-    f.write('\n')
-
-    for group_name, quantities_in_group in quantity_groups.items():
-        print(f"Rendering group \033[36m{group_name}\033[0m...")
-        f.write(f'## {group_name}\n\n')
-        for quantity_name in sorted(quantities_in_group):
-            try:
-                try:
-                    url = f'{UNIT_DEFINITION_BASE_URL}{quantity_name}.json'
-                    print(f"Downloading units data from \033[36mhttps://raw.githubusercontent.com/.../{quantity_name}.json\033[0m...")
-                    response = requests.get(url)
-                    response.raise_for_status()
-                    unit_def = json.loads(response.content.decode('utf-8-sig'))
-                except requests.RequestException as e:
-                    print(f"\033[33mFailed ({e.__class__.__name__}) to gather additional information for \033[36m{quantity_name}\033[0m")
-                    unit_def = {
-                        "Units": {}
-                    }
-
-                f.write(f'### {split_pascal_case(quantity_name)}\n`{quantity_name}`\n\n')
-                if unit_def.get('XmlDocSummary'):
-                    f.write(f'{unit_def["XmlDocSummary"]}\n\n')
-                if unit_def.get('BaseUnit'):
-                    f.write(f'**Default Unit**: {unit_def["BaseUnit"]}\n\n')
-
-                f.write('**Units**:\n\n')
-                for unit in unit_def['Units']:
-                    unit_name = unit['SingularName']
-                    
-                    en_us_abbrs = []
-                    if 'Localization' in unit:
-                        for loc_entry in unit['Localization']:
-                            if 'Culture' in loc_entry and loc_entry['Culture'] == 'en-US':
-                                if 'Abbreviations' in loc_entry:
-                                    en_us_abbrs.extend(loc_entry['Abbreviations'])
-                                break
-                    
-                    abbr_str = ', '.join(en_us_abbrs)
-
-                    f.write(f'- {split_pascal_case(unit_name)} (`{unit_name}`)')
-                    if abbr_str:
-                        f.write(f'.\n\n  Abbreviation(s): {abbr_str}')
-                    if unit.get('XmlDocSummary'):
-                        f.write(f'\n\n  {unit["XmlDocSummary"]}')
-                    f.write('\n')
-                f.write('\n')
-            except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-                print(f"\033[33mCould not process \033[36m{quantity_name}\033[0m: {e}")
+    f.write(''.join(output))
+
+try:
+    os.makedirs(os.path.dirname(RENDER_MANIFEST_PATH), exist_ok=True)
+    with open(RENDER_MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'version': RENDER_FORMAT_VERSION, 'quantities': fragments}, f, ensure_ascii=False)
+except OSError as e:
+    print(f"\033[33mCould not save the rendering manifest: {e}\033[0m")
+
+# Compact index of quantities, units and (en-US) abbreviations for clients (see Examples/Python/PCA/tw_units.py).
+# The pickle contains exactly the same data, it's just faster to load.
+def get_en_us_abbreviations(unit):
+    for loc_entry in unit.get('Localization', []):
+        if loc_entry.get('Culture') == 'en-US':
+            return list(loc_entry.get('Abbreviations', []))
+    return []
+
+def build_unit_index():
+    quantities = {}
+    abbreviations = {}
+    for quantity_name in sorted(unit_definitions):
+        unit_def = unit_definitions[quantity_name]
+        units = {}
+        for unit in unit_def.get('Units', []):
+            unit_name = unit['SingularName']
+            unit_abbrs = get_en_us_abbreviations(unit)
+            units[unit_name] = {
+                'abbreviations': unit_abbrs,
+                'to_base': unit.get('FromUnitToBaseFunc'),
+                'from_base': unit.get('FromBaseToUnitFunc'),
+            }
+            for abbr in unit_abbrs:
+                abbreviations.setdefault(abbr, []).append([quantity_name, unit_name])
+        quantities[quantity_name] = {'base_unit': unit_def.get('BaseUnit'), 'units': units}
+    return {'version': 1, 'quantities': quantities, 'abbreviations': abbreviations}
+
+print(f"Writing the units index \033[36m{OUTPUT_INDEX_JSON_PATH}\033[0m...")
+unit_index = build_unit_index()
+with open(OUTPUT_INDEX_JSON_PATH, 'w', encoding='utf-8') as f:
+    json.dump(unit_index, f, ensure_ascii=False, separators=(',', ':'))
+with open(OUTPUT_INDEX_PICKLE_PATH, 'wb') as f:
+    pickle.dump(unit_index, f, protocol=pickle.HIGHEST_PROTOCOL)
 
+print(f"Rendered \033[36m{rendered_count}\033[0m quantities, reused \033[36m{reused_count}\033[0m unchanged ones")
 print(f"\033[32mSuccessfully generated \033[36m{OUTPUT_MD_PATH}\033[0m")
 
 # Instructions for use:
 # 1. Make sure you have Python installed.
 # 2. Install the 'requests' library: pip install requests
 # 3. Run this script from your terminal: python generate_units_doc.py
-# 4. The Units.md file will be generated in the same directory as this script.
\ No newline at end of file
+#    Use --offline DIR to read the definitions from a local mirror (for example the cache directory
+#    of a previous run, see DEFAULT_CACHE_DIR) without accessing the network.
+# 4. The Units.md file (and the Units.index.json/Units.index.pickle index) will be generated in the same directory as this script.
\ No newline at end of file